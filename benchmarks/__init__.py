@@ -0,0 +1,4 @@
+"""
+本地基準測試工具
+以模擬 JavDB 伺服器與固定頁面語料量測爬取與解析效能，不需連線到真實網站
+"""
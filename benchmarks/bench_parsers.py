@@ -0,0 +1,161 @@
+"""
+解析器微基準測試
+對 benchmarks/corpus 內的頁面逐一計時各解析入口（_parse_rankings_page、_parse_movie_item、
+_parse_magnet_links_page、_parse_magnet_item），並以 tracemalloc 記錄記憶體峰值；
+結果存為 JSON 基準，之後可與基準比較解析器改動的影響
+
+用法:
+  python -m benchmarks.bench_parsers                     # 計時並與預設基準比較
+  python -m benchmarks.bench_parsers --update-baseline   # 更新 benchmarks/baselines/parsers.json
+  python -m benchmarks.bench_parsers --repeat 20 --output new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import bs4  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baselines', 'parsers.json')
+
+
+def _load_corpus(corpus_dir: str) -> Dict[str, str]:
+    corpus = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith('.html'):
+            with open(os.path.join(corpus_dir, name), 'r', encoding='utf-8') as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """執行 repeat 次取時間中位數與最小值，再單獨執行一次量測記憶體峰值"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _magnet_items(html: str) -> List[Any]:
+    soup = BeautifulSoup(html, 'html.parser')
+    section = soup.select_one('div.magnet-links')
+    return section.select('div[class*="item"]') if section else []
+
+
+def build_cases(crawler, corpus: Dict[str, str]) -> List[Tuple[str, str, int, Callable[[], Any]]]:
+    """依檔名前綴建立 (解析入口, 檔名, 項目數, 呼叫函式) 列表"""
+    cases = []
+    for name, html in corpus.items():
+        if name.startswith(('rankings_', 'search_')):
+            cases.append(('_parse_rankings_page', name, 1,
+                          lambda html=html: crawler._parse_rankings_page(html, 1000)))
+            items = BeautifulSoup(html, 'html.parser').find_all('div', class_='item')
+            if items:
+                cases.append(('_parse_movie_item', name, len(items),
+                              lambda items=items: [crawler._parse_movie_item(item, i) for i, item in enumerate(items, 1)]))
+        elif name.startswith(('detail_', 'error_')):
+            cases.append(('_parse_magnet_links_page', name, 1,
+                          lambda html=html: crawler._parse_magnet_links_page(html, 'https://javdb.com/v/bench')))
+            items = _magnet_items(html)
+            if items:
+                cases.append(('_parse_magnet_item', name, len(items),
+                              lambda items=items: [crawler._parse_magnet_item(item) for item in items]))
+    return cases
+
+
+def run(repeat: int, corpus_dir: str) -> Dict[str, Any]:
+    from javdb_magnet_crawler import JavDBMagnetCrawler
+
+    crawler = JavDBMagnetCrawler()
+    # 不比對版面指紋：錯誤頁語料會連續觸發版面異常
+    crawler.layout_monitor = None
+    # 只量測解析本身，關閉逐項日誌（錯誤頁語料會觸發大量預期中的警告）
+    logging.getLogger("bt_crawler").setLevel(logging.ERROR)
+
+    results = {}
+    for entry, name, items, func in build_cases(crawler, _load_corpus(corpus_dir)):
+        measured = _measure(func, repeat)
+        measured['items'] = items
+        measured['us_per_item'] = round(measured['median_ms'] * 1000 / items, 1)
+        results[f"{entry}::{name}"] = measured
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'beautifulsoup4': bs4.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    base_results = (baseline or {}).get('results', {})
+    header = f"{'解析入口::語料':<58}{'中位數(ms)':>12}{'峰值(KB)':>10}{'μs/項':>9}"
+    if base_results:
+        header += f"{'對比基準':>10}"
+    print(header)
+    print("-" * len(header))
+    for key, r in report['results'].items():
+        line = f"{key:<58}{r['median_ms']:>12.3f}{r['peak_kb']:>10.1f}{r['us_per_item']:>9.1f}"
+        base = base_results.get(key)
+        if base and base.get('median_ms'):
+            change = (r['median_ms'] - base['median_ms']) / base['median_ms'] * 100
+            line += f"{change:>+9.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析器微基準測試")
+    parser.add_argument('--repeat', type=int, default=10, help='每個案例的重複次數')
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='語料目錄')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='比較用的基準 JSON')
+    parser.add_argument('--update-baseline', action='store_true', help='將結果寫入基準文件')
+    parser.add_argument('--output', '-o', help='另存結果 JSON')
+    args = parser.parse_args()
+
+    report = run(args.repeat, args.corpus)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    targets = [args.output] if args.output else []
+    if args.update_baseline:
+        targets.append(args.baseline)
+    for path in targets:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+產生解析器基準測試語料（benchmarks/corpus/*.html）
+語料以 mock_pages 產生，內容固定（相同 seed 產生相同頁面），可重新產生後提交；
+也可將實際保存的 JavDB 頁面放入 corpus 目錄，依檔名前綴（rankings_/search_/detail_/error_）歸類
+
+用法:
+  python -m benchmarks.build_parser_corpus
+"""
+import os
+
+from benchmarks import mock_pages
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def _detail_regex_only(code: str = "REGEX-001", magnets: int = 4) -> str:
+    """沒有磁力容器也沒有「複製」按鈕，只能靠整頁正則回退的頁面"""
+    links = ",".join(
+        f'"magnet:?xt=urn:btih:{i:040x}&dn=[javdb.com]{code}"' for i in range(1, magnets + 1)
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"></head><body>"
+        f"<h2>{code}</h2><script>window.__MAGNETS__ = [{links}];</script></body></html>"
+    )
+
+
+def build_corpus() -> dict:
+    """產生所有語料頁面，回傳 {檔名: 內容}"""
+    return {
+        'rankings_large.html': mock_pages.rankings_page(100, seed=1, padding_kb=120),
+        'rankings_small.html': mock_pages.rankings_page(10, seed=2),
+        'search_single.html': mock_pages.search_page('SSIS-886', seed=3),
+        'search_multi.html': mock_pages.search_page('MIDA-348', seed=4, results=20, padding_kb=40),
+        'detail_large.html': mock_pages.detail_page('Lg001', code='SSIS-886', magnets=60, padding_kb=120),
+        'detail_small.html': mock_pages.detail_page('Sm001', code='JUR-496', magnets=2),
+        'detail_legacy_table.html': mock_pages.detail_page_legacy('Tb001', code='ABF-101', magnets=8),
+        'detail_regex_only.html': _detail_regex_only(),
+        'error_rate_limit.html': mock_pages.error_page('rate_limit'),
+        'error_login.html': mock_pages.error_page('login'),
+        'error_cloudflare.html': mock_pages.error_page('cloudflare'),
+    }
+
+
+def main():
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    for name, html in build_corpus().items():
+        path = os.path.join(CORPUS_DIR, name)
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(html)
+        print(f"{name:<28}{len(html.encode('utf-8')) / 1024:>8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+本地模擬 JavDB 伺服器
+提供 /rankings/movies、/search、/v/<id> 頁面，可設定延遲、403 注入比例與頁面大小；
+若指定 --fixtures 目錄，優先回傳錄製的頁面（rankings.html、search.html、v/<id>.html）
+
+用法:
+  python -m benchmarks.mock_javdb_server --port 8765 --latency-ms 120 --error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks import mock_pages
+
+
+class MockConfig:
+    """模擬伺服器設定"""
+
+    def __init__(self, latency_ms: float = 100.0, jitter_ms: float = 50.0, error_rate: float = 0.0,
+                 rankings_size: int = 30, magnets_per_page: int = 5, padding_kb: int = 20,
+                 fixtures: Optional[str] = None, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rankings_size = rankings_size
+        self.magnets_per_page = magnets_per_page
+        self.padding_kb = padding_kb
+        self.fixtures = fixtures
+        self.seed = seed
+
+
+class MockStats:
+    """伺服器端請求統計（執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.forbidden = 0
+        self.bytes_sent = 0
+        self.by_endpoint: Dict[str, int] = {}
+
+    def record(self, endpoint: str, status: int, size: int):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+            self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+            if status == 403:
+                self.forbidden += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'forbidden': self.forbidden,
+                'bytes_sent': self.bytes_sent,
+                'by_endpoint': dict(self.by_endpoint)
+            }
+
+
+def _read_fixture(config: MockConfig, relative_path: str) -> Optional[str]:
+    if not config.fixtures:
+        return None
+    path = os.path.join(config.fixtures, relative_path)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def make_handler(config: MockConfig, stats: MockStats):
+    """建立綁定設定與統計的請求處理類別"""
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+
+    class MockJavDBHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: str, endpoint: str, content_type: str = "text/html; charset=utf-8"):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            stats.record(endpoint, status, len(data))
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            path = parsed.path
+
+            if path == "/__stats":
+                self._send(200, json.dumps(stats.snapshot()), "stats", "application/json")
+                return
+
+            with rng_lock:
+                delay = max(0.0, rng.gauss(config.latency_ms, config.jitter_ms)) / 1000
+                forbidden = rng.random() < config.error_rate
+            time.sleep(delay)
+
+            if path.startswith("/rankings"):
+                endpoint = "rankings"
+            elif path.startswith("/search"):
+                endpoint = "search"
+            elif path.startswith("/v/"):
+                endpoint = "detail"
+            else:
+                self._send(404, mock_pages.error_page("login"), "other")
+                return
+
+            if forbidden:
+                self._send(403, mock_pages.error_page("cloudflare"), endpoint)
+                return
+
+            if endpoint == "rankings":
+                body = _read_fixture(config, "rankings.html") or mock_pages.rankings_page(
+                    config.rankings_size, config.seed, config.padding_kb)
+            elif endpoint == "search":
+                q = (query.get("q") or [""])[0]
+                body = _read_fixture(config, "search.html") or mock_pages.search_page(
+                    q, config.seed, padding_kb=config.padding_kb)
+            else:
+                vid = path[len("/v/"):].strip("/")
+                body = _read_fixture(config, os.path.join("v", f"{vid}.html")) or mock_pages.detail_page(
+                    vid, magnets=config.magnets_per_page, padding_kb=config.padding_kb)
+            self._send(200, body, endpoint)
+
+    return MockJavDBHandler
+
+
+def start_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """在背景執行緒啟動伺服器，回傳 (server, stats)；port=0 時自動選擇可用埠"""
+    stats = MockStats()
+    server = ThreadingHTTPServer((host, port), make_handler(config, stats))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模擬 JavDB 伺服器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='平均回應延遲（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=50.0, help='延遲標準差（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 403 的比例（0~1）')
+    parser.add_argument('--rankings-size', type=int, default=30, help='排行榜影片數')
+    parser.add_argument('--magnets', type=int, default=5, help='每個詳情頁的磁力鏈接數')
+    parser.add_argument('--padding-kb', type=int, default=20, help='每頁額外填充的大小（KB）')
+    parser.add_argument('--fixtures', help='錄製頁面目錄（rankings.html、search.html、v/<id>.html）')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rankings_size=args.rankings_size, magnets_per_page=args.magnets,
+        padding_kb=args.padding_kb, fixtures=args.fixtures, seed=args.seed
+    )
+    server, _ = start_server(config, args.host, args.port)
+    print(f"模擬 JavDB 伺服器已啟動: http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+模擬頁面產生器
+產生與 JavDB 結構相近的排行榜、搜索、詳情頁與錯誤頁 HTML，供模擬伺服器與解析器語料使用
+"""
+import hashlib
+import random
+from typing import List, Optional
+
+_PREFIXES = ['SSIS', 'MIDA', 'JUR', 'ABF', 'IPZZ', 'STARS', 'SONE', 'ADN', 'MEYD', 'PRED']
+_TAG_SETS = [['高清', '字幕'], ['高清'], ['字幕'], []]
+
+
+def movie_id(rank: int, seed: int = 0) -> str:
+    """排名對應的 JavDB 短代碼（如 /v/AbC12）"""
+    digest = hashlib.md5(f"{seed}-{rank}".encode()).hexdigest()
+    return digest[:5]
+
+
+def movie_code(rank: int, seed: int = 0) -> str:
+    """排名對應的番號"""
+    rng = random.Random(seed * 100003 + rank)
+    return f"{rng.choice(_PREFIXES)}-{rng.randint(100, 999)}"
+
+
+def _padding(kb: int) -> str:
+    """增加頁面大小用的無關內容（模擬導覽列、腳本等）"""
+    if kb <= 0:
+        return ""
+    block = '<div class="navbar-item"><a href="/tags?c1=1">類別</a></div>\n'
+    return block * max(1, kb * 1024 // len(block))
+
+
+def _page(body: str, title: str, padding_kb: int = 0) -> str:
+    return (
+        "<!DOCTYPE html>\n<html lang=\"zh-TW\">\n<head><meta charset=\"utf-8\">"
+        f"<title>{title} | JavDB</title></head>\n<body>\n"
+        f"<nav class=\"navbar\">{_padding(padding_kb)}</nav>\n"
+        f"<section class=\"section\"><div class=\"container\">\n{body}\n</div></section>\n"
+        "<footer class=\"footer\">JavDB</footer>\n</body>\n</html>\n"
+    )
+
+
+def _movie_item(rank: int, seed: int, code: Optional[str] = None) -> str:
+    vid = movie_id(rank, seed)
+    code = code or movie_code(rank, seed)
+    score = 3.5 + (rank * 7 % 15) / 10
+    return (
+        '<div class="item">\n'
+        f'  <a href="/v/{vid}" class="box" title="{code} 模擬影片 {rank}">\n'
+        f'    <div class="cover"><img loading="lazy" src="https://c0.jdbstatic.com/covers/{vid}.jpg"></div>\n'
+        f'    <div class="video-title"><strong>{code}</strong> 模擬影片標題 {rank}</div>\n'
+        f'    <div class="score"><span class="value">{score:.2f}分, 由{100 + rank}人評價</span></div>\n'
+        '    <div class="meta">2026-10-01</div>\n'
+        '  </a>\n'
+        '</div>'
+    )
+
+
+def rankings_page(count: int = 30, seed: int = 0, padding_kb: int = 0) -> str:
+    """排行榜頁（div.movie-list 內含 count 個 div.item）"""
+    items = "\n".join(_movie_item(rank, seed) for rank in range(1, count + 1))
+    return _page(f'<div class="movie-list h cols-4 vcols-8">\n{items}\n</div>', "有碼月榜", padding_kb)
+
+
+def search_page(query: str, seed: int = 0, results: int = 1, padding_kb: int = 0) -> str:
+    """搜索結果頁：第一筆的番號即為查詢字串"""
+    rank = int(hashlib.md5(query.encode()).hexdigest()[:6], 16) % 100000 + 1000
+    items = [_movie_item(rank, seed, code=query.upper())]
+    items += [_movie_item(rank + i, seed) for i in range(1, results)]
+    return _page(f'<div class="movie-list h cols-4 vcols-8">\n{"".join(items)}\n</div>', f"搜索 {query}", padding_kb)
+
+
+def _magnet_item(code: str, index: int, tags: List[str]) -> str:
+    infohash = hashlib.sha1(f"{code}-{index}".encode()).hexdigest()
+    suffix = "-C" if '字幕' in tags else ""
+    magnet = f"magnet:?xt=urn:btih:{infohash}&dn=[javdb.com]{code}{suffix}"
+    tag_html = "".join(f'<span class="tag is-primary is-small is-light">{tag}</span>' for tag in tags)
+    size = 2.5 + index * 1.3
+    return (
+        f'<div class="item columns is-desktop {"odd" if index % 2 else ""}">\n'
+        '  <div class="magnet-name column is-four-fifths">\n'
+        f'    <a href="{magnet}" title="右鍵複製"><span class="name">{code}{suffix}</span><br>\n'
+        f'      <span class="meta">{size:.2f}GB, {1 + index % 3}個文件</span><br>\n'
+        f'      <div class="tags">{tag_html}</div></a>\n'
+        '  </div>\n'
+        '  <div class="buttons column">\n'
+        f'    <a class="button is-info is-small copy-to-clipboard" data-clipboard-text="{magnet}">複製</a>\n'
+        '  </div>\n'
+        f'  <div class="date column"><span class="time">2026-10-{1 + index % 28:02d}</span></div>\n'
+        '</div>'
+    )
+
+
+def detail_page(vid: str, code: Optional[str] = None, magnets: int = 5, padding_kb: int = 0) -> str:
+    """詳情頁（div#magnets-content.magnet-links 內含 magnets 個磁力項目）"""
+    code = code or f"MOCK-{int(hashlib.md5(vid.encode()).hexdigest()[:4], 16) % 900 + 100}"
+    items = "\n".join(_magnet_item(code, i, _TAG_SETS[i % len(_TAG_SETS)]) for i in range(magnets))
+    body = (
+        f'<h2 class="title is-4"><strong>{code}</strong> 模擬影片</h2>\n'
+        '<div class="video-meta-panel">演員: 模擬演員</div>\n'
+        f'<div id="magnets-content" class="magnet-links">\n{items}\n</div>'
+    )
+    return _page(body, code, padding_kb)
+
+
+def detail_page_legacy(vid: str, code: Optional[str] = None, magnets: int = 5) -> str:
+    """舊版表格型詳情頁（無 magnet-links 容器，走「複製」按鈕的解析路徑）"""
+    code = code or f"OLD-{int(hashlib.md5(vid.encode()).hexdigest()[:4], 16) % 900 + 100}"
+    rows = []
+    for i in range(magnets):
+        infohash = hashlib.sha1(f"{code}-legacy-{i}".encode()).hexdigest()
+        rows.append(
+            f'<tr><td class="title">{code}</td><td class="size">{1.5 + i:.1f}GB</td>'
+            f'<td><div><a href="magnet:?xt=urn:btih:{infohash}">複製</a> <span class="tag">高清</span></div></td></tr>'
+        )
+    return _page(f'<table class="table">{"".join(rows)}</table>', code)
+
+
+def error_page(kind: str = "rate_limit") -> str:
+    """錯誤頁：rate_limit（訪問過於頻繁）、login（需要登錄）、cloudflare（驗證頁）"""
+    if kind == "login":
+        body = '<div class="message is-warning">請登入後查看磁力鏈接，需要登錄。</div>'
+    elif kind == "cloudflare":
+        body = '<div id="cf-wrapper"><h1>Checking your browser before accessing javdb.com</h1><div class="cf-captcha">captcha</div></div>'
+    else:
+        body = '<div class="message is-danger">訪問過於頻繁，請稍後再試。</div>'
+    return _page(body, "錯誤")
@@ -0,0 +1,187 @@
+"""
+端對端吞吐量基準測試
+啟動本地模擬伺服器（獨立子程序，避免伺服器 CPU 計入爬蟲），以 JavDBMagnetManager 依各爬取模式執行，
+報告 movies/sec、requests/sec、p95 延遲與每頁 CPU 時間
+
+用法:
+  python -m benchmarks.run_benchmark --modes top30,top30-nodedup,codes --limit 30 --latency-ms 100
+  python -m benchmarks.run_benchmark --error-rate 0.05 --delay-scale 0 --output bench.json
+  python -m benchmarks.run_benchmark --virtual-clock --delay-scale 1 --request-rate 0.5   # 免睡眠模擬，報告預估耗時
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import mock_pages  # noqa: E402
+
+MODES = ['top30', 'top30-nodedup', 'codes']
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _server_stats(base_url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=5) as resp:
+        return json.loads(resp.read().decode('utf-8'))
+
+
+def start_mock_server(args) -> (subprocess.Popen, str):
+    """以子程序啟動模擬伺服器並等待就緒"""
+    port = _free_port()
+    cmd = [
+        sys.executable, '-m', 'benchmarks.mock_javdb_server',
+        '--port', str(port),
+        '--latency-ms', str(args.latency_ms),
+        '--jitter-ms', str(args.jitter_ms),
+        '--error-rate', str(args.error_rate),
+        '--rankings-size', str(max(args.limit, 30)),
+        '--magnets', str(args.magnets),
+        '--padding-kb', str(args.padding_kb),
+    ]
+    if args.fixtures:
+        cmd += ['--fixtures', os.path.abspath(args.fixtures)]
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            _server_stats(base_url)
+            return proc, base_url
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError("模擬伺服器啟動失敗")
+
+
+def run_mode(mode: str, base_url: str, args) -> Dict[str, Any]:
+    """在暫存目錄中執行一種爬取模式並收集指標"""
+    from javdb_magnet_crawler import JavDBMagnetManager
+    from clock import VirtualClock, set_clock
+
+    clock = set_clock(VirtualClock() if args.virtual_clock else None)
+    workdir = tempfile.mkdtemp(prefix=f"javdb_bench_{mode}_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        manager = JavDBMagnetManager()
+        logging.getLogger("bt_crawler").setLevel(logging.WARNING)
+
+        before = _server_stats(base_url)
+        wall_start = time.perf_counter()
+        projected_start = clock.monotonic()
+        cpu_start = time.process_time()
+
+        if mode == 'top30':
+            results = manager.get_top30_magnets(limit=args.limit)
+            movies = len(results)
+        elif mode == 'top30-nodedup':
+            results = manager.get_top30_magnets(skip_duplicates=False, limit=args.limit)
+            movies = len(results)
+        else:
+            codes = [mock_pages.movie_code(rank) for rank in range(1, args.limit + 1)]
+            results = manager.get_magnets_by_codes(manager.normalize_codes(codes), max_workers=args.workers)
+            movies = len(results)
+
+        wall = time.perf_counter() - wall_start
+        projected = clock.monotonic() - projected_start
+        cpu = time.process_time() - cpu_start
+        after = _server_stats(base_url)
+    finally:
+        os.chdir(cwd)
+        set_clock(None)
+
+    requests_made = after['requests'] - before['requests']
+    forbidden = after['forbidden'] - before['forbidden']
+    latency = manager.crawler.latency
+    return {
+        'mode': mode,
+        'movies': movies,
+        'requests': requests_made,
+        'forbidden': forbidden,
+        'wall_seconds': round(wall, 3),
+        # 虛擬時鐘下為「實際耗時 + 所有延遲」的預估耗時，否則與 wall_seconds 相同
+        'projected_wall_seconds': round(projected, 3),
+        'projected_movies_per_sec': round(movies / projected, 3) if projected > 0 else 0.0,
+        'cpu_seconds': round(cpu, 3),
+        'movies_per_sec': round(movies / wall, 3) if wall > 0 else 0.0,
+        'requests_per_sec': round(requests_made / wall, 3) if wall > 0 else 0.0,
+        'p95_latency_ms': round((latency.overall_percentile(95) or 0.0) * 1000, 1),
+        'p95_by_endpoint_ms': {ep: round(v['p95'] * 1000, 1) for ep, v in latency.summary().items()},
+        'cpu_ms_per_page': round(cpu * 1000 / requests_made, 2) if requests_made else 0.0,
+    }
+
+
+def print_report(reports: List[Dict[str, Any]]):
+    header = (f"{'模式':<16}{'影片':>6}{'請求':>7}{'403':>6}{'movies/s':>10}{'req/s':>9}{'p95(ms)':>10}"
+              f"{'CPU/頁(ms)':>12}{'實際(s)':>10}{'預估(s)':>10}")
+    print(header)
+    print("-" * len(header))
+    for r in reports:
+        print(f"{r['mode']:<16}{r['movies']:>6}{r['requests']:>7}{r['forbidden']:>6}"
+              f"{r['movies_per_sec']:>10.2f}{r['requests_per_sec']:>9.2f}"
+              f"{r['p95_latency_ms']:>10.1f}{r['cpu_ms_per_page']:>12.2f}"
+              f"{r['wall_seconds']:>10.2f}{r['projected_wall_seconds']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JavDB 爬蟲端對端吞吐量基準測試（使用本地模擬伺服器）")
+    parser.add_argument('--modes', default=','.join(MODES), help=f"爬取模式（逗號分隔）: {', '.join(MODES)}")
+    parser.add_argument('--limit', type=int, default=30, help='每種模式處理的影片數')
+    parser.add_argument('--workers', type=int, default=4, help='codes 模式的並發數')
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模擬伺服器的 403 比例')
+    parser.add_argument('--magnets', type=int, default=5)
+    parser.add_argument('--padding-kb', type=int, default=20)
+    parser.add_argument('--fixtures', help='錄製頁面目錄')
+    parser.add_argument('--delay-scale', type=float, default=0.0,
+                        help='爬蟲禮貌性延遲的縮放比例（預設 0，只量測網路與解析）')
+    parser.add_argument('--request-rate', type=float, default=0.0, help='每個身分的速率上限（預設 0 不限制）')
+    parser.add_argument('--virtual-clock', action='store_true',
+                        help='使用虛擬時鐘：延遲、退避與速率限制不實際睡眠，改為報告預估耗時')
+    parser.add_argument('--output', '-o', help='將結果寫入 JSON 文件')
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"未知模式: {', '.join(unknown)}")
+
+    proc, base_url = start_mock_server(args)
+    os.environ['JAVDB_BASE_URL'] = base_url
+    os.environ['DELAY_SCALE'] = str(args.delay_scale)
+    os.environ['REQUEST_RATE'] = str(args.request_rate)
+    os.environ['CLEARANCE_FILE'] = os.path.join(tempfile.gettempdir(), 'javdb_bench_clearance.json')
+    os.environ['LAYOUT_FINGERPRINTS'] = os.path.join(tempfile.gettempdir(), 'javdb_bench_fingerprints.json')
+    try:
+        reports = [run_mode(mode, base_url, args) for mode in modes]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=5)
+
+    print_report(reports)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'config': {k: v for k, v in vars(args).items() if k != 'output'},
+                'results': reports
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
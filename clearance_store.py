@@ -0,0 +1,73 @@
+"""
+Cloudflare 通關憑證保存
+Playwright 通過驗證後取得的 cookie（cf_clearance 等）與對應的 User-Agent 依出口身分保存到文件，
+下次執行時直接載入到 curl_cffi 會話，避免每頁都退回緩慢的瀏覽器備援
+"""
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ClearanceStore:
+    """通關憑證文件（以出口身分的代理為鍵，直連為 direct）"""
+
+    def __init__(self, path: str = "cf_clearance.json", session_cookie_ttl: float = 12 * 3600):
+        self.path = path
+        # 瀏覽器的 session cookie 沒有到期時間，保存後最多沿用這麼久
+        self.session_cookie_ttl = session_cookie_ttl
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def _valid_cookies(self, entry: Dict[str, Any], now: float) -> List[Dict[str, Any]]:
+        cookies = []
+        for cookie in entry.get('cookies', []):
+            expires = cookie.get('expires', -1)
+            if expires is None or expires < 0:
+                expires = entry.get('saved_at', 0) + self.session_cookie_ttl
+            if expires > now:
+                cookies.append(cookie)
+        return cookies
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """讀取指定身分尚未過期的憑證，回傳 {'user_agent', 'cookies'}；無可用憑證時回傳 None"""
+        entry = self._read().get(key)
+        if not entry:
+            return None
+        cookies = self._valid_cookies(entry, time.time())
+        if not any(c.get('name') == 'cf_clearance' for c in cookies):
+            return None
+        return {'user_agent': entry.get('user_agent', ''), 'cookies': cookies}
+
+    def save(self, key: str, user_agent: str, cookies: List[Dict[str, Any]]):
+        """保存指定身分的憑證（同時移除其他身分已過期的項目）"""
+        now = time.time()
+        data = self._read()
+        for other_key in list(data.keys()):
+            if not self._valid_cookies(data[other_key], now):
+                del data[other_key]
+        data[key] = {
+            'user_agent': user_agent,
+            'saved_at': now,
+            'cookies': [
+                {
+                    'name': c['name'],
+                    'value': c['value'],
+                    'domain': c.get('domain', ''),
+                    'path': c.get('path', '/'),
+                    'expires': c.get('expires', -1)
+                }
+                for c in cookies
+            ]
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
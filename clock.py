@@ -0,0 +1,83 @@
+"""
+可注入的時鐘
+所有延遲、退避與速率限制都透過時鐘睡眠；替換為 VirtualClock 時睡眠會立即推進虛擬時間，
+可在毫秒內模擬整次爬取的排程行為，同時仍能回報預估的實際耗時
+"""
+import threading
+import time
+from typing import Optional
+
+
+class Clock:
+    """系統時鐘（預設）"""
+
+    virtual = False
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, cond: threading.Condition, timeout: float) -> None:
+        """在已持有的條件變數上等待（虛擬時鐘直接推進時間）"""
+        cond.wait(timeout=timeout)
+
+
+class VirtualClock(Clock):
+    """虛擬時鐘：sleep 不實際等待，只累加虛擬時間
+
+    monotonic() = 實際經過時間 + 累計睡眠時間，因此網路與解析的真實耗時仍會計入，
+    elapsed() 即為「若真的睡眠」時的預估總耗時
+    """
+
+    virtual = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._offset = 0.0
+        self._start = time.monotonic()
+        self.sleep_calls = 0
+
+    def monotonic(self) -> float:
+        with self._lock:
+            return time.monotonic() + self._offset
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._offset += seconds
+            self.sleep_calls += 1
+
+    def wait(self, cond: threading.Condition, timeout: float) -> None:
+        self.sleep(timeout)
+
+    @property
+    def slept(self) -> float:
+        """累計的虛擬睡眠秒數"""
+        with self._lock:
+            return self._offset
+
+    def elapsed(self) -> float:
+        """建立以來的預估總耗時（實際耗時 + 虛擬睡眠）"""
+        return self.monotonic() - self._start
+
+
+_default_clock: Clock = Clock()
+
+
+def get_clock() -> Clock:
+    """目前的全域時鐘"""
+    return _default_clock
+
+
+def set_clock(clock: Optional[Clock]) -> Clock:
+    """設定全域時鐘（None 表示恢復系統時鐘），回傳設定後的時鐘
+
+    需在建立爬蟲/管理器之前呼叫，已建立的物件會保留建立時的時鐘
+    """
+    global _default_clock
+    _default_clock = clock or Clock()
+    return _default_clock
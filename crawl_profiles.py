@@ -0,0 +1,96 @@
+"""
+多組爬取設定（profile）
+同一次爬取中每個頁面只抓取一次，再依各 profile 的標籤、評分、選擇策略分別篩選，
+寫入各自的導出檔並記錄到各自的已爬取記錄（互不干擾）
+
+config.env 範例:
+  CRAWL_PROFILES=hd,subs
+  PROFILE_HD_FILTER_TAGS=高清
+  PROFILE_HD_MIN_SCORE=4.0
+  PROFILE_SUBS_FILTER_TAGS=字幕,中文
+  PROFILE_SUBS_SELECT=all
+  PROFILE_SUBS_OUTPUT=magnet/url_list_subs.txt
+  PROFILE_SUBS_TRACKER=scraped_movies_subs.json
+"""
+import os
+from typing import Dict, List, Optional
+
+SELECT_POLICIES = ('priority', 'first', 'all')
+
+
+class CrawlProfile:
+    """一組篩選設定與其輸出位置
+
+    select:
+      priority  依高清 > 字幕 > 第一個 選一個（與 top30 相同）
+      first     符合標籤的第一個
+      all       所有符合標籤的磁力鏈接
+    """
+
+    def __init__(self, name: str, filter_tags: Optional[List[str]] = None, min_score: float = 0.0,
+                 select: str = 'priority', output: Optional[str] = None, tracker_file: Optional[str] = None):
+        if select not in SELECT_POLICIES:
+            raise ValueError(f"profile {name} 的選擇策略無效: {select}（可用: {', '.join(SELECT_POLICIES)}）")
+        self.name = name
+        self.filter_tags = filter_tags or []
+        self.min_score = min_score
+        self.select = select
+        self.output = output or f"magnet/url_list_{name}.txt"
+        self.tracker_file = tracker_file or f"scraped_movies_{name}.json"
+
+    def __repr__(self):
+        return (f"CrawlProfile({self.name!r}, filter_tags={self.filter_tags}, min_score={self.min_score}, "
+                f"select={self.select!r})")
+
+    def accepts_movie(self, movie: Dict) -> bool:
+        """排行榜階段即可判斷的條件（評分），不符合的影片不需抓取詳情頁"""
+        return not self.min_score or movie.get('score', 0.0) >= self.min_score
+
+    def select_magnets(self, crawler, magnet_links: List) -> List:
+        """依標籤過濾後套用選擇策略"""
+        if self.filter_tags:
+            magnet_links = [m for m in magnet_links
+                            if any(tag in ','.join(m.tags) for tag in self.filter_tags)]
+        if not magnet_links:
+            return []
+        if self.select == 'all':
+            return magnet_links
+        if self.select == 'first':
+            return magnet_links[:1]
+        return crawler._filter_magnets_by_priority(magnet_links)
+
+
+def _split_tags(value: str) -> List[str]:
+    return [tag.strip() for tag in value.split(',') if tag.strip()]
+
+
+def load_profiles(names: Optional[List[str]] = None) -> List[CrawlProfile]:
+    """從環境變數（config.env）讀取 CRAWL_PROFILES 列出的 profile；names 指定時只取其中幾個
+
+    未設定的欄位沿用全域設定（FILTER_TAGS、MIN_SCORE）
+    """
+    configured = _split_tags(os.getenv('CRAWL_PROFILES', ''))
+    if names:
+        unknown = [name for name in names if name not in configured]
+        if unknown:
+            raise ValueError(f"未定義的 profile: {', '.join(unknown)}（CRAWL_PROFILES={','.join(configured)}）")
+        configured = [name for name in configured if name in names]
+
+    profiles = []
+    for name in configured:
+        prefix = f"PROFILE_{name.upper()}_"
+        tags = os.getenv(prefix + 'FILTER_TAGS', os.getenv('FILTER_TAGS', ''))
+        score_raw = os.getenv(prefix + 'MIN_SCORE', os.getenv('MIN_SCORE', '0.0'))
+        try:
+            min_score = float(score_raw)
+        except ValueError:
+            raise ValueError(f"profile {name} 的 MIN_SCORE 無效: {score_raw}")
+        profiles.append(CrawlProfile(
+            name,
+            filter_tags=_split_tags(tags),
+            min_score=min_score,
+            select=os.getenv(prefix + 'SELECT', 'priority').strip().lower(),
+            output=os.getenv(prefix + 'OUTPUT') or None,
+            tracker_file=os.getenv(prefix + 'TRACKER') or None,
+        ))
+    return profiles
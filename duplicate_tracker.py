@@ -1,12 +1,48 @@
 """
 重複追蹤系統
 用於記錄已爬取的影片，避免重複保存
+
+多個程序可共用同一個記錄文件：保存時取得跨程序鎖，先合併磁碟上其他程序寫入的記錄
+（同一番號取較新的時間），再寫入暫存檔後原子改名，不會互相覆蓋。
+刪除（過期清理、上限清理）以墓碑保存在記錄文件的 removed（基礎番號 -> 被刪除記錄的時間），
+合併時時間不晚於墓碑的記錄視為已刪除，其他程序記憶體中的舊記錄不會在保存時復活；
+之後重新標記（時間較新）的記錄不受墓碑影響。墓碑最多保留 max_records 筆（依時間保留較新的）
+
+啟動時只讀取旁邊的精簡索引（<記錄文件>.idx：排序後的 64-bit 番號雜湊，標頭含記錄文件的修改時間與統計），
+查詢是否已爬取以二分搜尋回答；需要修改記錄時才載入完整的 JSON。
+記錄文件以 schema_version 標示格式，舊版文件只在第一次開啟時驗證、正規化並寫回一次
+
+載入完整記錄時把每筆的時間預先解析為 epoch 秒，並以最小堆（依時間）維護淘汰順序、以計數器維護統計，
+上限清理、過期清理與統計的成本只與實際變動的筆數有關
 """
+import bisect
+import hashlib
+import heapq
+import itertools
 import json
 import os
 import re
-from typing import List, Dict, Any, Set
-from datetime import datetime
+from array import array
+from typing import List, Dict, Any, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+
+from file_lock import FileLock
+
+SCHEMA_VERSION = 2
+_INDEX_MAGIC = b'JDBTIDX1'
+
+
+def _code_hash(base_code: str) -> int:
+    """基礎番號的 64-bit 雜湊（索引用）"""
+    return int.from_bytes(hashlib.blake2b(base_code.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _to_epoch(date_str: Optional[str]) -> float:
+    """記錄時間轉為 epoch 秒；無法解析的時間視為最舊（-inf），會最先被清理"""
+    try:
+        return datetime.fromisoformat(date_str).timestamp()
+    except (ValueError, TypeError):
+        return float('-inf')
 
 
 class DuplicateTracker:
@@ -14,8 +50,97 @@ class DuplicateTracker:
     
     def __init__(self, db_file: str = "scraped_movies.json"):
         self.db_file = db_file
+        self.index_file = f"{db_file}.idx"
         self.max_records = 10000  # 改為 10000 筆
-        self.scraped_data = self._load_data()
+        self._lock = FileLock(f"{db_file}.lock")
+        self._data: Optional[Dict[str, Any]] = None  # 完整記錄（需要時才載入）
+        self._index: Optional[array] = None  # 排序後的番號雜湊（未載入完整記錄時用於查詢）
+        self._index_meta: Dict[str, Any] = {}
+        # 載入完整記錄後才建立：基礎番號 -> epoch 秒、(epoch, 番號) 最小堆（延遲刪除）、異常番號數
+        self._epochs: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._invalid_count = 0
+        self._disk_stamp = self._file_stamp()
+        if not self._open_index(self._disk_stamp):
+            self._ensure_loaded()
+    
+    @property
+    def scraped_data(self) -> Dict[str, Any]:
+        """完整記錄（第一次存取時載入）"""
+        self._ensure_loaded()
+        return self._data
+    
+    def _ensure_loaded(self) -> None:
+        if self._data is not None:
+            return
+        with self._lock:
+            self._data = self._load_data()
+            self._data.setdefault('scraped_movies', {})
+            self._build_order()
+            self._disk_stamp = self._file_stamp()
+            self._index = None
+            if self._disk_stamp is not None and self._index_meta.get('stamp') != list(self._disk_stamp):
+                self._write_index()
+    
+    def _build_order(self) -> None:
+        """載入後一次解析所有時間並建立淘汰堆與計數器"""
+        records = self._data['scraped_movies']
+        self._epochs = {code: _to_epoch(date) for code, date in records.items()}
+        self._heap = [(epoch, code) for code, epoch in self._epochs.items()]
+        heapq.heapify(self._heap)
+        self._invalid_count = sum(1 for code in records if not self._is_valid_code(code))
+    
+    def _set_record(self, base: str, date: Optional[str]) -> None:
+        """新增或更新一筆記錄（同步維護時間與淘汰堆；比墓碑新的記錄讓墓碑失效）"""
+        records = self._data['scraped_movies']
+        epoch = _to_epoch(date)
+        records[base] = date
+        tombstones = self._data.get('removed', {})
+        if base in tombstones and epoch > _to_epoch(tombstones[base]):
+            del tombstones[base]
+        if self._epochs.get(base) != epoch:
+            self._epochs[base] = epoch
+            heapq.heappush(self._heap, (epoch, base))
+            if len(self._heap) > 2 * len(records) + 64:
+                # 更新過的舊項目太多時重建，避免堆無限成長
+                self._heap = [(e, code) for code, e in self._epochs.items()]
+                heapq.heapify(self._heap)
+    
+    def _drop_record(self, base: str) -> Optional[str]:
+        """刪除一筆記錄並留下墓碑（堆中的項目延遲刪除）"""
+        date = self._data['scraped_movies'].pop(base, None)
+        self._epochs.pop(base, None)
+        if self._is_valid_code(base):
+            self._add_tombstone(base, date or '')
+        else:
+            self._invalid_count -= 1
+        return date
+    
+    def _add_tombstone(self, base: str, date: str) -> None:
+        """記錄墓碑（同一番號保留較新的時間）"""
+        tombstones = self._data.setdefault('removed', {})
+        if base not in tombstones or _to_epoch(date) > _to_epoch(tombstones[base]):
+            tombstones[base] = date
+    
+    def _prune_tombstones(self) -> None:
+        """墓碑超過 max_records 筆時只保留時間較新的"""
+        tombstones = self._data.get('removed', {})
+        if len(tombstones) > self.max_records:
+            newest = heapq.nlargest(self.max_records, tombstones.items(), key=lambda item: _to_epoch(item[1]))
+            self._data['removed'] = dict(newest)
+    
+    def _pop_oldest(self, before: float = float('inf')) -> Optional[str]:
+        """取出時間早於 before 的最舊記錄的番號（跳過已失效的堆項目）；沒有時返回 None"""
+        while self._heap:
+            epoch, code = self._heap[0]
+            if self._epochs.get(code) != epoch:
+                heapq.heappop(self._heap)  # 已刪除或已更新
+                continue
+            if epoch >= before:
+                return None
+            heapq.heappop(self._heap)
+            return code
+        return None
     
     def _to_base_code(self, code: str) -> str:
         """將番號正規化為基礎番號（同一作品不同版本如 -C/-UC/-U 視為同一部）
@@ -49,12 +174,16 @@ class DuplicateTracker:
         return False
     
     def _load_data(self) -> Dict[str, Any]:
-        """載入已爬取的數據"""
+        """載入已爬取的數據（已是目前格式時直接使用，舊版文件在此遷移一次）"""
         if os.path.exists(self.db_file):
             try:
                 with open(self.db_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    # 載入後檢查並清理舊記錄
+                    if data.get('schema_version') == SCHEMA_VERSION:
+                        # 寫入時已驗證並正規化，不再逐筆檢查，也不寫回
+                        data.setdefault('scraped_movies', {})
+                        return data
+                    # 舊版文件：檢查並清理舊記錄，標記格式版本後寫回（只發生一次）
                     if 'scraped_movies' in data:
                         scraped_movies = data['scraped_movies']
                         
@@ -86,31 +215,164 @@ class DuplicateTracker:
                             logging.info(f"已清理舊記錄，保留最新 {self.max_records} 筆")
                         
                         data['scraped_movies'] = valid_movies
+                        data['schema_version'] = SCHEMA_VERSION
                         # 立即保存清理後的數據
-                        with open(self.db_file, 'w', encoding='utf-8') as save_file:
-                            json.dump(data, save_file, ensure_ascii=False, indent=2)
+                        self._write_atomic(data)
+                        import logging
+                        logging.info(f"已將 {self.db_file} 遷移為格式版本 {SCHEMA_VERSION}（{len(valid_movies)} 筆）")
                     return data
             except (json.JSONDecodeError, FileNotFoundError):
                 pass
         
         return {
+            'schema_version': SCHEMA_VERSION,
             'scraped_movies': {},  # movie_code -> scraped_date
             'last_update': None
         }
     
-    def save_data(self):
-        """保存數據"""
+    def _open_index(self, stamp: Optional[Tuple[int, int]]) -> bool:
+        """讀取與記錄文件相符的索引；索引不存在或已過期時返回 False"""
+        if stamp is None:
+            # 尚無記錄文件：空的追蹤器
+            self._index = array('Q')
+            self._index_meta = {'count': 0, 'last_update': None, 'recent': []}
+            return True
+        try:
+            with open(self.index_file, 'rb') as f:
+                raw = f.read()
+        except OSError:
+            return False
+        if raw[:8] != _INDEX_MAGIC:
+            return False
+        header_len = int.from_bytes(raw[8:12], 'little')
+        try:
+            meta = json.loads(raw[12:12 + header_len].decode('utf-8'))
+        except ValueError:
+            return False
+        if meta.get('stamp') != list(stamp):
+            return False
+        index = array('Q')
+        index.frombytes(raw[12 + header_len:])
+        self._index = index
+        self._index_meta = meta
+        return True
+    
+    def _write_index(self) -> None:
+        """依目前的完整記錄重建索引（索引只是快取，寫入失敗不影響記錄）"""
+        records = self._data.get('scraped_movies', {})
+        meta = {
+            'stamp': list(self._disk_stamp),
+            'count': len(records),
+            'last_update': self._data.get('last_update'),
+            'recent': list(records)[-10:],
+        }
+        header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        hashes = array('Q', sorted(_code_hash(code) for code in records))
+        tmp_path = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(_INDEX_MAGIC + len(header).to_bytes(4, 'little') + header)
+                f.write(hashes.tobytes())
+            os.replace(tmp_path, self.index_file)
+            self._index_meta = meta
+        except OSError:
+            pass
+    
+    def _file_stamp(self) -> Optional[Tuple[int, int]]:
+        """記錄文件的 (修改時間, 大小)，用於判斷其他程序是否寫入過"""
+        try:
+            st = os.stat(self.db_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    
+    def _read_disk(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """讀取磁碟上目前的 (記錄, 墓碑)（不做清理）；文件不存在或損壞時返回空"""
         try:
-            self.scraped_data['last_update'] = datetime.now().isoformat()
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.scraped_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            raise
+            with open(self.db_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+        return data.get('scraped_movies', {}), data.get('removed', {})
+    
+    def _merge_from(self, disk_movies: Dict[str, str], disk_removed: Optional[Dict[str, str]] = None) -> int:
+        """把磁碟上的記錄與墓碑合併到記憶體，返回新增、更新或刪除的筆數
+
+        同一基礎番號取較新的時間；時間不晚於墓碑的記錄（含本程序記憶體中的）視為已刪除。
+        一律以解析後的時間比較（不受時間字串格式影響），合併結果與順序無關
+        """
+        mine = self.scraped_data['scraped_movies']
+        changed = 0
+        for base, removed_at in (disk_removed or {}).items():
+            removed_epoch = _to_epoch(removed_at)
+            if base in mine and self._epochs.get(base, float('-inf')) > removed_epoch:
+                continue  # 本程序之後重新標記過
+            self._add_tombstone(base, removed_at or '')
+            if base in mine:
+                self._drop_record(base)  # 其他程序已刪除
+                changed += 1
+        tombstones = self._data.get('removed', {})
+        for code, date in disk_movies.items():
+            if not self._is_valid_code(code):
+                continue
+            base = self._to_base_code(code)
+            epoch = _to_epoch(date)
+            if base in tombstones and epoch <= _to_epoch(tombstones[base]):
+                continue  # 已刪除，且之後沒有重新標記
+            if base not in mine or epoch > self._epochs.get(base, float('-inf')):
+                self._set_record(base, date)
+                changed += 1
+        return changed
+    
+    def _write_atomic(self, data: Dict[str, Any]) -> None:
+        """寫入暫存檔後原子改名（讀取端不會讀到寫到一半的文件）"""
+        tmp_path = f"{self.db_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.db_file)
+    
+    def refresh(self) -> bool:
+        """其他程序寫入過記錄文件時，將其變更合併到記憶體；返回是否有新的記錄"""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._disk_stamp:
+            return False
+        if self._data is None:
+            # 尚未載入完整記錄：換用新的索引（寫入端尚未更新索引時才載入 JSON）
+            previous = self._index_meta.get('count', 0)
+            if self._open_index(stamp):
+                self._disk_stamp = stamp
+                return self._index_meta.get('count', 0) != previous
+            self._ensure_loaded()
+            return True
+        self._disk_stamp = stamp
+        return self._merge_from(*self._read_disk()) > 0
+    
+    def save_data(self):
+        """保存數據：取得跨程序鎖 -> 合併磁碟上的變更 -> 原子寫入（並更新索引）"""
+        with self._lock:
+            data = self.scraped_data
+            if self._file_stamp() != self._disk_stamp:
+                self._merge_from(*self._read_disk())
+            self._prune_tombstones()
+            data['schema_version'] = SCHEMA_VERSION
+            data['last_update'] = datetime.now().isoformat()
+            self._write_atomic(data)
+            self._disk_stamp = self._file_stamp()
+            self._write_index()
     
-    def is_already_scraped(self, movie_code: str) -> bool:
-        """檢查影片是否已經爬取過（以基礎番號判斷，同一番號不同版本 -C/-UC/-U 視為已爬取）"""
+    def is_already_scraped(self, movie_code: str, refresh: bool = False) -> bool:
+        """檢查影片是否已經爬取過（以基礎番號判斷，同一番號不同版本 -C/-UC/-U 視為已爬取）
+        
+        refresh=True 時先合併其他程序寫入的記錄（文件未變動時只多一次 stat）
+        """
         if not self._is_valid_code(movie_code):
             return False
+        if refresh:
+            self.refresh()
+        if self._data is None:
+            target = _code_hash(self._to_base_code(movie_code))
+            position = bisect.bisect_left(self._index, target)
+            return position < len(self._index) and self._index[position] == target
         base = self._to_base_code(movie_code)
         return base in self.scraped_data.get('scraped_movies', {})
     
@@ -124,11 +386,8 @@ class DuplicateTracker:
         if scraped_date is None:
             scraped_date = datetime.now().isoformat()
         
-        if 'scraped_movies' not in self.scraped_data:
-            self.scraped_data['scraped_movies'] = {}
-        
-        base = self._to_base_code(movie_code)
-        self.scraped_data['scraped_movies'][base] = scraped_date
+        self._ensure_loaded()
+        self._set_record(self._to_base_code(movie_code), scraped_date)
     
     def mark_and_save(self, movie_code: str, scraped_date: str = None):
         """標記影片為已爬取並立即保存到文件"""
@@ -137,6 +396,7 @@ class DuplicateTracker:
     
     def get_new_movies(self, movies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """過濾出新影片（未爬取過的）"""
+        self.refresh()
         new_movies = []
         scraped_count = 0
         
@@ -168,47 +428,28 @@ class DuplicateTracker:
         self._auto_cleanup(max_records=self.max_records)
     
     def _auto_cleanup(self, max_records: int = 10000):
-        """自動清理舊記錄，保持最多指定數量"""
-        if 'scraped_movies' not in self.scraped_data:
-            return
-        
-        scraped_movies = self.scraped_data['scraped_movies']
-        
-        # 1. 先過濾掉格式異常的番號
-        valid_movies = {}
-        for code, date in scraped_movies.items():
-            if self._is_valid_code(code):
-                valid_movies[code] = date
-        
-        total_count = len(valid_movies)
-        invalid_count = len(scraped_movies) - total_count
+        """自動清理舊記錄，保持最多指定數量（從淘汰堆取出最舊的記錄，只處理要刪除的筆數）"""
+        self._ensure_loaded()
+        scraped_movies = self._data['scraped_movies']
         
+        # 1. 有異常格式的番號時才掃描刪除（正常情況計數器為 0，不需逐筆檢查）
+        invalid_count = self._invalid_count
         if invalid_count > 0:
+            for code in [code for code in scraped_movies if not self._is_valid_code(code)]:
+                self._drop_record(code)
             import logging
             logging.info(f"清理了 {invalid_count} 個異常格式的番號")
         
         # 2. 檢查數量
-        if total_count <= max_records:
-            # 更新為清理後的數據
-            self.scraped_data['scraped_movies'] = valid_movies
+        deleted_count = max(0, len(scraped_movies) - max_records)
+        if deleted_count == 0:
             if invalid_count > 0:
                 self.save_data()
             return  # 不需要清理
         
-        # 按照時間排序（舊的在前）
-        sorted_items = sorted(
-            valid_movies.items(),
-            key=lambda x: x[1]  # 按照日期排序
-        )
-        
-        # 保留最新的 max_records 筆
-        items_to_keep = sorted_items[-max_records:]
-        
-        # 刪除的數量
-        deleted_count = total_count - max_records
-        
-        # 更新數據
-        self.scraped_data['scraped_movies'] = dict(items_to_keep)
+        # 刪除最舊的記錄直到符合上限
+        for _ in range(deleted_count):
+            self._drop_record(self._pop_oldest())
         
         # 保存
         self.save_data()
@@ -217,48 +458,85 @@ class DuplicateTracker:
         import logging
         logging.info(f"自動清理記錄：刪除了 {deleted_count} 筆舊記錄，保留最新 {max_records} 筆")
     
+    def scraped_since(self, days: float) -> List[Tuple[str, float]]:
+        """最近 days 天內爬取的記錄 [(基礎番號, epoch 秒)]，新的在前"""
+        self._ensure_loaded()
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        recent = [(code, epoch) for code, epoch in self._epochs.items() if epoch >= cutoff]
+        recent.sort(key=lambda item: item[1], reverse=True)
+        return recent
+    
+    def export_snapshot(self, path: str, since: int = 0, node: Optional[str] = None,
+                        acks: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """匯出記錄時間晚於 since（epoch 微秒）的記錄為二進位快照，返回快照標頭（含 count、until）
+
+        acks 為本機已從各節點收到的記錄時間，寫入標頭供對方確認其增量標記
+        """
+        from tracker_snapshot import node_name, to_micros, write_snapshot
+        self.refresh()
+        self._ensure_loaded()
+        records = ((code, to_micros(epoch)) for code, epoch in self._epochs.items()
+                   if epoch != float('-inf') and to_micros(epoch) > since)
+        return write_snapshot(path, records, {
+            'node': node or node_name(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'since': since,
+            'acks': acks or {},
+        })
+    
+    def import_snapshot(self, path: str) -> Tuple[Dict[str, Any], int]:
+        """匯入其他主機的快照並合併（同一基礎番號取較新的時間），返回 (快照標頭, 新增或更新的筆數)"""
+        from tracker_snapshot import from_micros, read_snapshot
+        header, records = read_snapshot(path)
+        with self._lock:
+            self.refresh()
+            changed = self._merge_from({code: from_micros(micros) for code, micros in records.items()})
+            if changed:
+                self.save_data()
+        if changed:
+            self._auto_cleanup(max_records=self.max_records)
+        return header, changed
+    
     def get_statistics(self) -> Dict[str, Any]:
         """獲取統計信息"""
-        scraped_movies = self.scraped_data.get('scraped_movies', {})
-        # 統計有效和無效的番號
-        valid_count = sum(1 for code in scraped_movies.keys() if self._is_valid_code(code))
-        invalid_count = len(scraped_movies) - valid_count
+        if self._data is None:
+            # 由索引標頭回答，不載入完整記錄（寫入時已驗證，全部為有效番號）
+            meta = self._index_meta
+            return {
+                'total_scraped': meta.get('count', 0),
+                'valid_scraped': meta.get('count', 0),
+                'invalid_scraped': 0,
+                'last_update': meta.get('last_update'),
+                'recent_scraped': meta.get('recent', []),
+                'max_records': self.max_records
+            }
+        scraped_movies = self._data['scraped_movies']
+        # 有效/無效數由計數器維護，最近記錄只取字典尾端 10 筆
+        recent = list(itertools.islice(reversed(scraped_movies), 10))
+        recent.reverse()
         
         return {
             'total_scraped': len(scraped_movies),
-            'valid_scraped': valid_count,
-            'invalid_scraped': invalid_count,
-            'last_update': self.scraped_data.get('last_update'),
-            'recent_scraped': list(scraped_movies.keys())[-10:] if scraped_movies else [],
+            'valid_scraped': len(scraped_movies) - self._invalid_count,
+            'invalid_scraped': self._invalid_count,
+            'last_update': self._data.get('last_update'),
+            'recent_scraped': recent,
             'max_records': self.max_records
         }
     
     def clear_old_records(self, days: int = 7):
-        """清理指定天數之前的記錄"""
-        from datetime import timedelta
-        
-        if 'scraped_movies' not in self.scraped_data:
-            return 0
-        
-        cutoff_date = datetime.now() - timedelta(days=days)
+        """清理指定天數之前的記錄（無法解析的時間也刪除）"""
+        self._ensure_loaded()
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
         deleted_count = 0
         
-        movies_to_delete = []
-        for movie_code, scraped_date_str in self.scraped_data['scraped_movies'].items():
-            try:
-                scraped_date = datetime.fromisoformat(scraped_date_str)
-                if scraped_date < cutoff_date:
-                    movies_to_delete.append(movie_code)
-            except (ValueError, TypeError):
-                # 如果有無法解析的日期，也刪除
-                movies_to_delete.append(movie_code)
-        
-        for movie_code in movies_to_delete:
-            del self.scraped_data['scraped_movies'][movie_code]
+        code = self._pop_oldest(before=cutoff)
+        while code is not None:
+            self._drop_record(code)
             deleted_count += 1
+            code = self._pop_oldest(before=cutoff)
         
         if deleted_count > 0:
             self.save_data()
         
         return deleted_count
-
@@ -0,0 +1,124 @@
+"""
+串流導出
+每處理完一部影片即寫入一筆結果，批量處理大量番號時不需等待全部完成
+"""
+import csv
+import json
+import os
+from typing import Dict, Any
+
+
+class ExportSink:
+    """導出目的地基底類別"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.count = 0
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(filename, 'w', encoding='utf-8', newline='')
+
+    def write(self, result: Dict[str, Any]):
+        """寫入一筆結果並立即 flush"""
+        self._write(result)
+        self.count += 1
+        self._file.flush()
+
+    def _write(self, result: Dict[str, Any]):
+        raise NotImplementedError
+
+    def close(self):
+        """關閉文件"""
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TxtExportSink(ExportSink):
+    """文本格式（與番號查詢的 TXT 導出格式一致）"""
+
+    def _write(self, result: Dict[str, Any]):
+        f = self._file
+        f.write(f"番號: {result['code']}\n")
+        if result.get('detail_url'):
+            f.write(f"詳情頁: {result['detail_url']}\n")
+        if result['magnet_links']:
+            for magnet in result['magnet_links']:
+                f.write(f"   標題: {magnet.title}\n")
+                f.write(f"   大小: {magnet.size}\n")
+                f.write(f"   標籤: {', '.join(magnet.tags)}\n")
+                f.write(f"   下載鏈接: {magnet.copy_url or magnet.magnet_url}\n")
+                f.write(f"   日期: {magnet.date}\n")
+        else:
+            f.write(f"無符合條件的磁力鏈接 ({result.get('error', '')})\n")
+        f.write("-" * 80 + "\n")
+
+
+class JsonLinesExportSink(ExportSink):
+    """JSON 格式（每行一筆 JSON，方便串流寫入與讀取）"""
+
+    def _write(self, result: Dict[str, Any]):
+        data = {
+            'code': result['code'],
+            'detail_url': result.get('detail_url', ''),
+            'total_magnets': result.get('total_magnets', 0),
+            'error': result.get('error', ''),
+            'magnet_links': [
+                {
+                    'title': magnet.title,
+                    'size': magnet.size,
+                    'tags': magnet.tags,
+                    'file_count': magnet.file_count,
+                    'download_url': magnet.copy_url or magnet.magnet_url,
+                    'date': magnet.date
+                }
+                for magnet in result['magnet_links']
+            ]
+        }
+        self._file.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+
+class CsvExportSink(ExportSink):
+    """CSV 格式"""
+
+    def __init__(self, filename: str):
+        super().__init__(filename)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['番號', '詳情頁', '標題', '大小', '標籤', '文件數', '下載鏈接', '日期', '錯誤'])
+
+    def _write(self, result: Dict[str, Any]):
+        if not result['magnet_links']:
+            self._writer.writerow([result['code'], result.get('detail_url', ''), '', '', '', '', '', '', result.get('error', '')])
+            return
+        for magnet in result['magnet_links']:
+            self._writer.writerow([
+                result['code'],
+                result.get('detail_url', ''),
+                magnet.title,
+                magnet.size,
+                ', '.join(magnet.tags),
+                magnet.file_count,
+                magnet.copy_url or magnet.magnet_url,
+                magnet.date,
+                ''
+            ])
+
+
+_SINKS = {
+    'txt': TxtExportSink,
+    'json': JsonLinesExportSink,
+    'csv': CsvExportSink,
+}
+
+
+def open_export_sink(format_type: str, filename: str) -> ExportSink:
+    """依格式建立導出目的地"""
+    if format_type not in _SINKS:
+        raise ValueError(f"不支援的導出格式: {format_type}")
+    return _SINKS[format_type](filename)
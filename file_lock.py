@@ -0,0 +1,82 @@
+"""
+跨程序文件鎖
+以旁邊的 .lock 文件加上作業系統的獨占鎖（POSIX 用 fcntl.flock，Windows 用 msvcrt.locking），
+讓同時執行的多個爬蟲程序安全地讀寫同一個記錄文件；程序結束時作業系統會自動釋放鎖
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except ImportError:
+    fcntl = None
+    _HAS_FCNTL = False
+    import msvcrt
+
+
+class FileLock:
+    """獨占文件鎖（可重入：同一執行緒重複進入只在最外層取得/釋放）"""
+
+    def __init__(self, path: str, timeout: float = 30.0, poll_interval: float = 0.05):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def _try_lock(self) -> bool:
+        try:
+            if _HAS_FCNTL:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self) -> None:
+        if _HAS_FCNTL:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def acquire(self) -> None:
+        """取得鎖，超過 timeout 秒仍被其他程序持有時拋出 TimeoutError"""
+        self._thread_lock.acquire()
+        if self._depth > 0:
+            self._depth += 1
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a+')
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                self._file.close()
+                self._file = None
+                self._thread_lock.release()
+                raise TimeoutError(f"等待文件鎖逾時（{self.timeout} 秒）: {self.path}")
+            time.sleep(self.poll_interval)
+        self._depth = 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                self._unlock()
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,166 @@
+"""
+原始 HTML 封存
+將抓取到的頁面壓縮後附加到 pack 文件（只追加不改寫），並在 index.jsonl 記錄位置；
+同一 URL 每天只保存一份（以 URL + 日期作為內容位址），之後可離線重新解析而不需再次請求網站
+
+目錄結構:
+  pages.pack    壓縮後的頁面內容依序相接
+  index.jsonl   每行一筆: key、url、date、offset、length、codec、status、size、fetched_at
+  index.jsonl.lock  跨程序寫入鎖（多個爬蟲或 worker 共用同一封存目錄時，依序追加 pack 與索引）
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from file_lock import FileLock
+
+try:
+    import zstandard
+    _HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    _HAS_ZSTD = False
+
+PACK_FILE = 'pages.pack'
+INDEX_FILE = 'index.jsonl'
+
+
+def archive_key(url: str, date: str) -> str:
+    """內容位址：URL 與日期（YYYY-MM-DD）的 SHA-256 前 32 碼"""
+    return hashlib.sha256(f"{url}\n{date}".encode('utf-8')).hexdigest()[:32]
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        if not _HAS_ZSTD:
+            raise RuntimeError("封存內容使用 zstd 壓縮，請先安裝: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class HtmlArchive:
+    """append-only 的頁面封存（執行緒與多程序安全）"""
+
+    def __init__(self, directory: str, codec: str = 'gzip'):
+        self.directory = directory
+        if codec == 'zstd' and not _HAS_ZSTD:
+            logging.getLogger("bt_crawler").warning("未安裝 zstandard，封存改用 gzip 壓縮（pip install zstandard）")
+            codec = 'gzip'
+        self.codec = codec
+        self.pack_path = os.path.join(directory, PACK_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{self.index_path}.lock")
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._index_pos = 0  # 已讀取到的索引位置（之後由其他程序追加的行在寫入前補讀）
+        os.makedirs(directory, exist_ok=True)
+        with self._file_lock:
+            self._load_index()
+
+    @classmethod
+    def from_env(cls) -> Optional["HtmlArchive"]:
+        """HTML_ARCHIVE 設定時建立封存（HTML_ARCHIVE_CODEC 可設為 gzip 或 zstd），否則返回 None"""
+        directory = os.getenv('HTML_ARCHIVE', '').strip()
+        if not directory:
+            return None
+        return cls(directory, os.getenv('HTML_ARCHIVE_CODEC', 'gzip').strip().lower())
+
+    def _load_index(self):
+        """讀取索引中 _index_pos 之後的完整行"""
+        if not os.path.exists(self.index_path):
+            return
+        pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 寫入中斷留下的不完整行
+                self._index_pos += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry['offset'] + entry['length'] <= pack_size:
+                    self._entries[entry['key']] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def put(self, url: str, html: str, status: int = 200, date: Optional[str] = None) -> bool:
+        """封存一個頁面，當天已封存過同一 URL 時略過，返回是否有寫入
+
+        先寫入 pack 再追加索引行：中斷時 pack 最多多出無索引的位元組，不會產生指向不完整內容的索引；
+        兩者都在跨程序文件鎖內進行，offset 取自鎖內的 pack 結尾，並先補讀其他程序追加的索引
+        """
+        now = datetime.now()
+        date = date or now.strftime('%Y-%m-%d')
+        key = archive_key(url, date)
+        if key in self._entries:
+            return False
+        raw = html.encode('utf-8')
+        blob = _compress(raw, self.codec)
+        with self._lock, self._file_lock:
+            self._load_index()
+            if key in self._entries:
+                return False
+            with open(self.pack_path, 'ab') as pack:
+                pack.seek(0, os.SEEK_END)
+                offset = pack.tell()
+                pack.write(blob)
+            entry = {
+                'key': key,
+                'url': url,
+                'date': date,
+                'offset': offset,
+                'length': len(blob),
+                'codec': self.codec,
+                'status': status,
+                'size': len(raw),
+                'fetched_at': now.isoformat(timespec='seconds'),
+            }
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
+            with open(self.index_path, 'ab') as index:
+                index.write(line)
+            self._index_pos += len(line)
+            self._entries[key] = entry
+        return True
+
+    @staticmethod
+    def read_entry(directory: str, entry: Dict[str, Any]) -> str:
+        """讀取索引項目對應的頁面（不需建立 HtmlArchive，供子程序使用）"""
+        with open(os.path.join(directory, PACK_FILE), 'rb') as pack:
+            pack.seek(entry['offset'])
+            blob = pack.read(entry['length'])
+        return _decompress(blob, entry.get('codec', 'gzip')).decode('utf-8')
+
+    def get(self, url: str, date: str) -> Optional[str]:
+        entry = self._entries.get(archive_key(url, date))
+        return self.read_entry(self.directory, entry) if entry else None
+
+    def entries(self, date: Optional[str] = None, latest_only: bool = True) -> List[Dict[str, Any]]:
+        """索引項目（依 URL、日期排序）；latest_only 時每個 URL 只取最新一份"""
+        selected = [e for e in self._entries.values() if date is None or e['date'] == date]
+        selected.sort(key=lambda e: (e['url'], e['date']))
+        if not latest_only:
+            return selected
+        latest: Dict[str, Dict[str, Any]] = {}
+        for entry in selected:
+            latest[entry['url']] = entry
+        return list(latest.values())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.entries(latest_only=False))
@@ -0,0 +1,178 @@
+"""
+出口身分池
+每個身分包含代理出口、TLS 模擬目標與各自的 cookie，並擁有獨立的健康分數與速率額度，
+請求平均分散到健康的身分上，使整體吞吐量隨出口數量線性擴充
+"""
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from clock import Clock, get_clock
+from utils import RateLimiter
+
+
+class EgressIdentity:
+    """單一出口身分（代理 + 模擬目標 + cookie + 速率額度）"""
+
+    def __init__(self, name: str, proxy: Optional[str] = None, impersonate: str = "chrome",
+                 rate: float = 0.5, window: int = 20, clock: Optional[Clock] = None):
+        self.name = name
+        self.proxy = proxy
+        self.impersonate = impersonate
+        self.clock = clock or get_clock()
+        self.rate_limiter = RateLimiter(rate, clock=self.clock)
+        # 此身分專屬的 cookie（name -> {value, domain, path}），如 Cloudflare 的 cf_clearance
+        self.cookies: Dict[str, Dict[str, Any]] = {}
+        # 取得 cf_clearance 時瀏覽器使用的 UA；設定後此身分固定使用此 UA（clearance 與 UA 綁定）
+        self.user_agent: Optional[str] = None
+        # 不輪換 UA 的請求（如排行榜）在沒有通關憑證 UA 時使用的固定 UA
+        self.fixed_user_agent: Optional[str] = None
+        self.cooldown_until = 0.0
+        self._outcomes = deque(maxlen=window)  # True = 成功，False = 403/429/逾時
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cookie_version = 0
+
+    def get_session(self, factory: Callable[["EgressIdentity"], object]):
+        """取得此身分在目前執行緒的會話（每個執行緒各一個，共用此身分的 cookie）"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = factory(self)
+            self._local.session = session
+            self._local.cookie_version = -1
+        if self._local.cookie_version != self._cookie_version:
+            with self._lock:
+                cookies = dict(self.cookies)
+                version = self._cookie_version
+            for name, cookie in cookies.items():
+                session.cookies.set(name, cookie['value'], domain=cookie.get('domain', ''),
+                                    path=cookie.get('path', '/'))
+            self._local.cookie_version = version
+        return session
+
+    def update_cookies(self, cookies: List[Dict[str, Any]]):
+        """更新此身分的 cookie（每筆含 name/value/domain/path），下次取得會話時同步到各執行緒的會話"""
+        with self._lock:
+            for cookie in cookies:
+                self.cookies[cookie['name']] = {
+                    'value': cookie['value'],
+                    'domain': cookie.get('domain', ''),
+                    'path': cookie.get('path', '/')
+                }
+            self._cookie_version += 1
+
+    @property
+    def key(self) -> str:
+        """跨次執行穩定的識別鍵（代理 URL，直連為 direct）"""
+        return self.proxy or 'direct'
+
+    def reset_health(self):
+        """清除失敗紀錄與冷卻（取得新的通關憑證後呼叫）"""
+        with self._lock:
+            self._outcomes.clear()
+            self.cooldown_until = 0.0
+
+    def report(self, success: bool, cooldown: float = 60.0, min_samples: int = 5,
+               threshold: float = 0.5):
+        """回報一次請求結果；健康分數過低時暫停使用此身分一段時間"""
+        with self._lock:
+            self._outcomes.append(success)
+            if (not success and len(self._outcomes) >= min_samples
+                    and self._score_locked() < threshold):
+                self.cooldown_until = self.clock.monotonic() + cooldown
+                self._outcomes.clear()
+
+    def _score_locked(self) -> float:
+        if not self._outcomes:
+            return 1.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    @property
+    def score(self) -> float:
+        """健康分數（最近請求的成功比例，0.0 ~ 1.0）"""
+        with self._lock:
+            return self._score_locked()
+
+    @property
+    def healthy(self) -> bool:
+        return self.clock.monotonic() >= self.cooldown_until
+
+    def __repr__(self):
+        return f"EgressIdentity({self.name}, proxy={self.proxy or 'direct'}, impersonate={self.impersonate})"
+
+
+class IdentityPool:
+    """出口身分池：挑選健康且最快有速率額度的身分"""
+
+    def __init__(self, identities: List[EgressIdentity]):
+        if not identities:
+            raise ValueError("身分池至少需要一個身分")
+        self.identities = identities
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_rate: float = 0.5) -> "IdentityPool":
+        """從環境變數建立身分池
+
+        PROXIES: 逗號分隔的代理 URL，direct 表示直連（未設定時只有一個直連身分）
+        IMPERSONATE_TARGETS: 逗號分隔的 curl_cffi 模擬目標，依序輪流分配（預設 chrome）
+        REQUEST_RATE: 每個身分的每秒請求數
+        """
+        try:
+            rate = float(os.getenv('REQUEST_RATE', str(default_rate)))
+        except ValueError:
+            rate = default_rate
+        proxies = [p.strip() for p in os.getenv('PROXIES', '').split(',') if p.strip()] or ['direct']
+        targets = [t.strip() for t in os.getenv('IMPERSONATE_TARGETS', 'chrome').split(',') if t.strip()] or ['chrome']
+
+        identities = []
+        for i, proxy in enumerate(proxies):
+            identities.append(EgressIdentity(
+                name=f"id{i}",
+                proxy=None if proxy.lower() == 'direct' else proxy,
+                impersonate=targets[i % len(targets)],
+                rate=rate
+            ))
+        return cls(identities)
+
+    def acquire(self) -> EgressIdentity:
+        """挑選一個身分並等待其速率額度
+
+        優先挑選健康身分中最快可發送者（同時可用時取健康分數較高者）；
+        若全部處於冷卻中，則挑選最快結束冷卻的身分
+        """
+        with self._lock:
+            healthy = [ident for ident in self.identities if ident.healthy]
+            if healthy:
+                identity = min(healthy, key=lambda ident: (ident.rate_limiter.pending_delay(), -ident.score))
+            else:
+                identity = min(self.identities, key=lambda ident: ident.cooldown_until)
+        if not identity.healthy:
+            identity.clock.sleep(max(0.0, identity.cooldown_until - identity.clock.monotonic()))
+        identity.rate_limiter.wait()
+        return identity
+
+    def pending_delay(self) -> float:
+        """距離最快可發送的身分可以發送的秒數（冷卻中的身分計入剩餘冷卻時間），不預約"""
+        with self._lock:
+            return min(max(ident.cooldown_until - ident.clock.monotonic(), ident.rate_limiter.pending_delay())
+                       for ident in self.identities)
+
+    def try_acquire(self, exclude: Optional[EgressIdentity] = None) -> Optional[EgressIdentity]:
+        """不等待地挑選一個健康且目前有速率額度、出口與 exclude 不同的身分，沒有時返回 None（用於對沖請求）"""
+        with self._lock:
+            candidates = [ident for ident in self.identities
+                          if ident.healthy and (exclude is None or ident.key != exclude.key)]
+            for identity in sorted(candidates, key=lambda ident: -ident.score):
+                if identity.rate_limiter.try_acquire():
+                    return identity
+        return None
+
+    def set_fixed_user_agent(self, user_agent: str):
+        """設定所有身分在不輪換 UA 時使用的固定 UA（各執行緒的會話在下次請求時套用）"""
+        for identity in self.identities:
+            identity.fixed_user_agent = user_agent
+
+    def __len__(self):
+        return len(self.identities)
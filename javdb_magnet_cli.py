@@ -5,15 +5,46 @@ JavDB 磁力鏈接專用CLI工具
 import argparse
 import json
 import csv
-from typing import List, Dict, Any
+import sys
+import os
+from typing import List, Dict, Any, Optional
 
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
+from rich.progress import (Progress, ProgressColumn, SpinnerColumn, TextColumn, BarColumn,
+                           MofNCompleteColumn, TimeElapsedColumn, TimeRemainingColumn)
+from rich.text import Text
 from rich.prompt import Prompt, Confirm
 
 from javdb_magnet_crawler import JavDBMagnetManager, MagnetLink
+from export_sink import open_export_sink
+import metrics
+
+class _LiveStatsColumn(ProgressColumn):
+    """即時吞吐量與退避狀態欄（每次重繪時計算，斷路器冷卻期間也會更新）"""
+    
+    def __init__(self, manager: JavDBMagnetManager):
+        super().__init__()
+        self.manager = manager
+        self._requests_start = metrics.REQUESTS.total()
+    
+    def render(self, task) -> Text:
+        elapsed = task.elapsed or 0.0
+        if elapsed <= 0:
+            return Text("")
+        requests_made = metrics.REQUESTS.total() - self._requests_start
+        parts = [f"{requests_made / elapsed:.2f} req/s", f"{task.completed / elapsed:.2f} 部/s"]
+        state = self.manager.crawler.throttle.snapshot()
+        parts.append(f"並發 {state['in_flight']}/{state['limit']}")
+        if state['breaker'] != 'closed':
+            parts.append(f"[斷路器 {state['breaker']} {state['cooldown_remaining']:.0f}s]")
+        failed = task.fields.get('failed', 0)
+        if failed:
+            parts.append(f"失敗 {failed}")
+        style = "yellow" if state['breaker'] != 'closed' else "cyan"
+        return Text(" · ".join(parts), style=style)
+
 
 class JavDBMagnetCLI:
     """JavDB 磁力鏈接命令行界面"""
@@ -31,11 +62,24 @@ class JavDBMagnetCLI:
 示例用法:
   python javdb_magnet_cli.py top30 --export txt --output magnets.txt
   python javdb_magnet_cli.py top30 --filter 高清,中文 --export json
+  python javdb_magnet_cli.py top30 --sources censored:monthly,censored:weekly,uncensored:daily
+  python javdb_magnet_cli.py profiles hd subs
+  python javdb_magnet_cli.py queue enqueue && python javdb_magnet_cli.py queue work
+  python javdb_magnet_cli.py refresh --days 7 --budget 30
+  python javdb_magnet_cli.py tracker export --peer nas            （在 pc 上：產生 tracker_pc_<時間>.jdbsnap）
+  python javdb_magnet_cli.py tracker import tracker_pc_*.jdbsnap   （在 nas 上匯入 pc 的快照）
   python javdb_magnet_cli.py code SSIS-001 --filter 高清
+  python javdb_magnet_cli.py codes codes.txt --workers 4 --export csv --output codes.csv
+  python javdb_magnet_cli.py reparse --archive archive --export json
   python javdb_magnet_cli.py interactive
             """
         )
         
+        parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                            help='剖析模式：輸出 CPU 火焰圖資料與各階段記憶體配置（預設目錄 profile/<時間>）')
+        parser.add_argument('--profile-mode', choices=['sampling', 'cprofile'], default='sampling',
+                            help='sampling 輸出 collapsed stack（flamegraph.pl/speedscope），cprofile 輸出 .prof')
+        
         subparsers = parser.add_subparsers(dest='command', help='可用命令')
         
         # 前30命令
@@ -46,8 +90,49 @@ class JavDBMagnetCLI:
         top30_parser.add_argument('--export', '-e', choices=['txt', 'json', 'csv'], 
                                 help='導出格式（需配合 --output 指定文件名）')
         top30_parser.add_argument('--output', '-o', help='輸出文件名（使用 --export 時必填）')
-        top30_parser.add_argument('--rank-type', default='monthly', choices=['monthly'],
-                                help='排行榜類型: monthly (月榜)，默認為 monthly')
+        top30_parser.add_argument('--trace', help='將各階段耗時匯出為 Chrome trace JSON（可用 chrome://tracing 或 Perfetto 開啟）')
+        top30_parser.add_argument('--rank-type', choices=['daily', 'weekly', 'monthly'],
+                                help='排行榜類型: daily (日榜)、weekly (週榜)、monthly (月榜)；'
+                                     '未指定時使用配置文件中的 RANKING_SOURCES，再預設為 monthly')
+        top30_parser.add_argument('--sources', '-s',
+                                help='多個排行榜來源（類別:期間，逗號分隔，如 censored:monthly,censored:weekly,uncensored:daily），'
+                                     '並發抓取後依番號合併去重；預設使用配置文件中的 RANKING_SOURCES')
+        
+        # 多組 profile 爬取
+        profiles_parser = subparsers.add_parser('profiles', help='一次爬取月榜並套用配置文件中的多組 profile（每個頁面只抓取一次）')
+        profiles_parser.add_argument('names', nargs='*', help='只執行指定的 profile（預設為 CRAWL_PROFILES 全部）')
+        profiles_parser.add_argument('--limit', '-l', type=int, help='每個排行榜的下載數量（預設使用配置文件中的 TOP_COUNT）')
+        profiles_parser.add_argument('--sources', '-s', help='排行榜來源（同 top30 --sources）')
+        
+        # 分散式爬取（共享工作佇列）
+        queue_parser = subparsers.add_parser('queue', help='分散式爬取：coordinator 放入工作、多個 worker 租用處理、coordinator 收集結果')
+        queue_parser.add_argument('action', choices=['enqueue', 'work', 'collect', 'status'],
+                                  help='enqueue 抓取排行榜並放入佇列；work 以 worker 身分處理；collect 套用結果；status 顯示佇列狀態')
+        queue_parser.add_argument('--db', help='佇列 SQLite 文件（預設使用配置文件中的 QUEUE_DB，可放在共享磁碟供多台主機使用）')
+        queue_parser.add_argument('--limit', '-l', type=int, help='enqueue：每個排行榜的數量（預設使用 TOP_COUNT）')
+        queue_parser.add_argument('--sources', '-s', help='enqueue：排行榜來源（同 top30 --sources）')
+        queue_parser.add_argument('--filter', '-f', help='work：過濾標籤 (用逗號分隔)')
+        queue_parser.add_argument('--worker-id', help='work：worker 名稱（預設為 主機名-程序號）')
+        queue_parser.add_argument('--wait', action='store_true', help='work：佇列清空後繼續等待新項目；collect：持續收集直到佇列清空')
+        queue_parser.add_argument('--output', '-o', default='magnet/url_list_monthly.txt',
+                                  help='collect：磁力鏈接寫入的 url_list 文件（預設 magnet/url_list_monthly.txt）')
+        
+        # 重新檢查已爬取的影片是否有更好的磁力
+        refresh_parser = subparsers.add_parser('refresh', help='重新檢查最近爬取過的影片，只輸出新出現的更好磁力（字幕/高清）')
+        refresh_parser.add_argument('--days', '-d', type=float, help='檢查最近幾天內爬取的影片（預設使用配置文件中的 REFRESH_DAYS）')
+        refresh_parser.add_argument('--budget', '-b', type=int, help='本次最多發送的 HTTP 請求數，含重試（預設使用配置文件中的 REFRESH_BUDGET）')
+        refresh_parser.add_argument('--filter', '-f', help='過濾標籤 (用逗號分隔)')
+        refresh_parser.add_argument('--output', '-o', default='magnet/url_list_monthly.txt',
+                                    help='升級的磁力鏈接寫入的 url_list 文件（預設 magnet/url_list_monthly.txt）')
+        
+        # 已爬取記錄同步（多台主機交換快照）
+        tracker_parser = subparsers.add_parser('tracker', help='匯出/匯入已爬取記錄快照，讓多台主機共用去重狀態')
+        tracker_parser.add_argument('action', choices=['export', 'import'],
+                                    help='export 匯出快照；import 合併其他主機的快照（同一番號取較新的時間）')
+        tracker_parser.add_argument('files', nargs='*', help='import：快照文件；export：輸出文件（預設 tracker_<節點>_<時間>.jdbsnap）')
+        tracker_parser.add_argument('--peer', help='export：同步對象的節點名稱（對方的 SYNC_NODE 或主機名），'
+                                                   '只匯出對方尚未確認收到的記錄；確認隨匯入對方的快照更新')
+        tracker_parser.add_argument('--full', action='store_true', help='export：忽略同步標記，匯出全部記錄')
         
         # 番號命令
         code_parser = subparsers.add_parser('code', help='根據番號獲取磁力鏈接')
@@ -57,26 +142,92 @@ class JavDBMagnetCLI:
                                help='導出格式（需配合 --output 指定文件名）')
         code_parser.add_argument('--output', '-o', help='輸出文件名（使用 --export 時必填）')
         
+        # 批量番號命令
+        codes_parser = subparsers.add_parser('codes', help='從文件或標準輸入批量獲取番號的磁力鏈接')
+        codes_parser.add_argument('input', nargs='?', default='-',
+                                help='番號列表文件（每行一個或以逗號分隔，- 表示標準輸入，預設為 -）')
+        codes_parser.add_argument('--filter', '-f', help='過濾標籤 (用逗號分隔)')
+        codes_parser.add_argument('--workers', '-w', type=int,
+                                help='並發數（預設使用配置文件中的 CODES_WORKERS）')
+        codes_parser.add_argument('--export', '-e', choices=['txt', 'json', 'csv'], default='txt',
+                                help='導出格式，預設為 txt（json 為每行一筆）')
+        codes_parser.add_argument('--output', '-o', help='輸出文件名（預設為 magnet/javdb_codes_<時間>.<格式>）')
+        
+        # 離線重新解析封存頁面
+        reparse_parser = subparsers.add_parser('reparse', help='以封存的頁面重新解析並選擇磁力鏈接（不發送請求）')
+        reparse_parser.add_argument('--archive', '-a', help='封存目錄（預設使用配置文件中的 HTML_ARCHIVE）')
+        reparse_parser.add_argument('--date', help='只處理某一天的封存（YYYY-MM-DD），預設每個頁面取最新一份')
+        reparse_parser.add_argument('--filter', '-f', help='過濾標籤 (用逗號分隔)')
+        reparse_parser.add_argument('--workers', '-w', type=int, help='解析子程序數（預設為 CPU 核心數）')
+        reparse_parser.add_argument('--export', '-e', choices=['txt', 'json', 'csv'], default='txt',
+                                    help='導出格式，預設為 txt（json 為每行一筆）')
+        reparse_parser.add_argument('--output', '-o', help='輸出文件名（預設為 magnet/javdb_reparse_<時間>.<格式>）')
+        
         # 交互模式
         interactive_parser = subparsers.add_parser('interactive', help='交互模式')
         
-        args = parser.parse_args()
+        args, extra = parser.parse_known_args()
+        # tracker 的文件參數可寫在選項之後（argparse 在選項前就已結束收集 nargs='*' 的位置參數）
+        if extra and args.command == 'tracker' and not any(arg.startswith('-') for arg in extra):
+            args.files = list(args.files) + extra
+        elif extra:
+            parser.error(f"unrecognized arguments: {' '.join(extra)}")
         
         if not args.command:
             parser.print_help()
             return
         
         try:
-            if args.command == 'top30':
-                self.handle_top30(args)
-            elif args.command == 'code':
-                self.handle_code(args)
-            elif args.command == 'interactive':
-                self.handle_interactive()
+            # METRICS_PORT 設定時提供 /metrics，METRICS_TEXTFILE 設定時於結束後寫入指標文字檔
+            metrics.start_from_env()
+            if args.profile is not None:
+                self._run_profiled(args)
+            else:
+                self._dispatch(args)
         except KeyboardInterrupt:
             self.console.print("\n[yellow]操作已取消[/yellow]")
         except Exception as e:
             self.console.print(f"[red]錯誤: {e}[/red]")
+        finally:
+            try:
+                metrics.write_textfile_from_env()
+            except OSError as e:
+                self.console.print(f"[yellow]寫入指標文件失敗: {e}[/yellow]")
+    
+    def _dispatch(self, args):
+        """執行子命令"""
+        if args.command == 'top30':
+            self.handle_top30(args)
+        elif args.command == 'profiles':
+            self.handle_profiles(args)
+        elif args.command == 'queue':
+            self.handle_queue(args)
+        elif args.command == 'refresh':
+            self.handle_refresh(args)
+        elif args.command == 'tracker':
+            self.handle_tracker(args)
+        elif args.command == 'code':
+            self.handle_code(args)
+        elif args.command == 'codes':
+            self.handle_codes(args)
+        elif args.command == 'reparse':
+            self.handle_reparse(args)
+        elif args.command == 'interactive':
+            self.handle_interactive()
+    
+    def _run_profiled(self, args):
+        """在剖析器下執行子命令，並以 tracemalloc 記錄各階段的記憶體配置"""
+        from datetime import datetime
+        from profiling import profile_call
+        
+        output_dir = args.profile or os.path.join("profile", datetime.now().strftime("%Y%m%d_%H%M%S"))
+        try:
+            outputs = profile_call(lambda: self._dispatch(args), output_dir, args.profile_mode,
+                                   tracer=self.manager.crawler.tracer)
+        finally:
+            self.console.print(f"[cyan]剖析結果已寫入: {output_dir}[/cyan]")
+        for kind, path in outputs.items():
+            self.console.print(f"  {kind}: {path}")
     
     def handle_top30(self, args):
         """處理前30命令"""
@@ -89,8 +240,9 @@ class JavDBMagnetCLI:
         if stats['total_scraped'] > 0:
             self.console.print(f"[cyan]已記錄 {stats['total_scraped']} 部影片，將自動跳過重複[/cyan]")
         
-        rank_type = getattr(args, 'rank_type', 'monthly')
-        rank_name = "月榜"
+        rank_type = getattr(args, 'rank_type', None)
+        sources = self._ranking_sources(args, rank_type)
+        rank_name = "、".join(source.display_name for source in sources)
         
         # 讀取配置（優先使用命令行參數）
         top_count = getattr(args, 'limit', None)
@@ -116,7 +268,7 @@ class JavDBMagnetCLI:
             if filter_tags_str:
                 filter_tags = [tag.strip() for tag in filter_tags_str.split(',')]
         
-        self.console.print(f"[blue]正在獲取有碼{rank_name}前{top_count}的磁力鏈接...[/blue]")
+        self.console.print(f"[blue]正在獲取{rank_name}前{top_count}的磁力鏈接...[/blue]")
         if filter_tags:
             self.console.print(f"[cyan]標籤過濾: {', '.join(filter_tags)}[/cyan]")
         if min_score and min_score > 0:
@@ -126,14 +278,34 @@ class JavDBMagnetCLI:
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
-            TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+            MofNCompleteColumn(),
             TimeElapsedColumn(),
+            TextColumn("ETA"),
+            TimeRemainingColumn(),
+            _LiveStatsColumn(self.manager),
             console=self.console
         ) as progress:
-            task = progress.add_task("爬取中...", total=top_count)
+            task = progress.add_task("獲取排行榜...", total=top_count, failed=0)
+            
+            failed = 0
             
-            # 獲取前N的磁力鏈接（默認會跳過重複）
-            results = self.manager.get_top30_magnets(rank_type=rank_type, limit=top_count)
+            def on_progress(event):
+                nonlocal failed
+                kind = event['event']
+                if kind == 'planned':
+                    skipped = f"（跳過 {event['skipped']} 部重複）" if event['skipped'] else ""
+                    progress.update(task, total=event['total'], description=f"爬取中{skipped}")
+                elif kind == 'fetched':
+                    progress.update(task, description=f"解析 #{event['rank']} {event['code']}")
+                elif kind == 'written' or (kind == 'skipped' and 'rank' in event):
+                    progress.advance(task)
+                elif kind == 'failed':
+                    failed += 1
+                    progress.update(task, advance=1, failed=failed)
+            
+            # 獲取前N的磁力鏈接（默認會跳過重複），進度隨每部影片即時更新
+            results = self.manager.get_top30_magnets(rank_type=rank_type or 'monthly', limit=top_count,
+                                                     on_progress=on_progress, sources=sources)
             
             # 應用標籤過濾器
             if filter_tags:
@@ -143,7 +315,11 @@ class JavDBMagnetCLI:
             if min_score and min_score > 0:
                 results = self._apply_score_filter(results, min_score)
             
-            progress.update(task, completed=top_count)
+            progress.update(task, description="完成")
+        
+        if getattr(args, 'trace', None):
+            self.manager.crawler.tracer.export_chrome_trace(args.trace)
+            self.console.print(f"[cyan]階段追蹤已匯出: {args.trace}[/cyan]")
         
         if not results:
             self.console.print("[yellow]沒有新影片需要處理（所有影片都已經爬取過）[/yellow]")
@@ -164,6 +340,229 @@ class JavDBMagnetCLI:
             else:
                 self._export_results(results, args.export, args.output)
     
+    def _ranking_sources(self, args, rank_type: Optional[str] = None):
+        """排行榜來源：--sources > --rank-type（有碼）> 配置文件 RANKING_SOURCES > 有碼月榜"""
+        from rankings_plan import DEFAULT_SOURCE, RankingSource, parse_sources, sources_from_env
+        if getattr(args, 'sources', None):
+            sources, origin = parse_sources(args.sources), "命令行 --sources"
+        elif rank_type:
+            sources, origin = [RankingSource('censored', rank_type)], "命令行 --rank-type"
+        elif os.getenv('RANKING_SOURCES', '').strip():
+            sources, origin = sources_from_env(), "配置文件 RANKING_SOURCES"
+        else:
+            sources, origin = [DEFAULT_SOURCE], "預設"
+        self.manager.logger.info(f"排行榜計畫（{origin}）: {', '.join(source.key for source in sources)}")
+        return sources
+    
+    def handle_profiles(self, args):
+        """處理多組 profile 爬取命令"""
+        from dotenv import load_dotenv
+        from crawl_profiles import load_profiles
+        load_dotenv('config.env')
+        
+        profiles = load_profiles(args.names or None)
+        if not profiles:
+            self.console.print("[yellow]未定義任何 profile，請在配置文件設定 CRAWL_PROFILES 與 PROFILE_<名稱>_* 參數[/yellow]")
+            return
+        top_count = args.limit if args.limit is not None else int(os.getenv('TOP_COUNT', '30'))
+        sources = self._ranking_sources(args)
+        rank_name = "、".join(source.display_name for source in sources)
+        
+        self.console.print(f"[blue]正在獲取{rank_name}前{top_count}的磁力鏈接（{len(profiles)} 組 profile）...[/blue]")
+        for profile in profiles:
+            tags = ', '.join(profile.filter_tags) or '不過濾'
+            self.console.print(f"[cyan]  {profile.name}: 標籤 {tags}，評分 >= {profile.min_score}，"
+                               f"選擇 {profile.select} -> {profile.output}[/cyan]")
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            _LiveStatsColumn(self.manager),
+            console=self.console
+        ) as progress:
+            task = progress.add_task("獲取排行榜...", total=top_count, failed=0)
+            failed = 0
+            
+            def on_progress(event):
+                nonlocal failed
+                kind = event['event']
+                if kind == 'planned':
+                    progress.update(task, total=event['total'], description="爬取中")
+                elif kind == 'fetched':
+                    progress.update(task, description=f"解析 #{event['rank']} {event['code']}")
+                elif kind == 'written' or (kind == 'skipped' and 'rank' in event):
+                    progress.advance(task)
+                elif kind == 'failed':
+                    failed += 1
+                    progress.update(task, advance=1, failed=failed)
+            
+            results = self.manager.crawl_profiles(profiles, limit=top_count, on_progress=on_progress,
+                                                  sources=sources)
+            progress.update(task, description="完成")
+        
+        table = Table(title="各 profile 結果")
+        table.add_column("Profile", style="cyan")
+        table.add_column("新影片", justify="right")
+        table.add_column("選出磁力", justify="right", style="green")
+        table.add_column("導出檔")
+        for profile in profiles:
+            profile_results = results.get(profile.name, [])
+            selected = sum(len(r['magnet_links']) for r in profile_results)
+            table.add_row(profile.name, str(len(profile_results)), str(selected), profile.output)
+        self.console.print(table)
+    
+    def handle_queue(self, args):
+        """處理分散式爬取命令"""
+        import time
+        from dotenv import load_dotenv
+        from work_queue import WorkQueue
+        load_dotenv('config.env')
+        
+        queue = WorkQueue.from_env(args.db)
+        try:
+            if args.action == 'enqueue':
+                top_count = args.limit if args.limit is not None else int(os.getenv('TOP_COUNT', '30'))
+                sources = self._ranking_sources(args)
+                counts = self.manager.enqueue_rankings(queue, limit=top_count, sources=sources)
+                self.console.print(f"[green]排行榜 {counts['ranked']} 部，跳過 {counts['skipped']} 部已爬取，"
+                                   f"新放入佇列 {counts['enqueued']} 部（{queue.path}）[/green]")
+            elif args.action == 'work':
+                filter_tags = [tag.strip() for tag in args.filter.split(',')] if args.filter else []
+                with Progress(
+                    SpinnerColumn(),
+                    TextColumn("[progress.description]{task.description}"),
+                    MofNCompleteColumn(),
+                    TimeElapsedColumn(),
+                    _LiveStatsColumn(self.manager),
+                    console=self.console
+                ) as progress:
+                    task = progress.add_task("等待工作...", total=None, failed=0)
+                    failed = 0
+                    
+                    def on_progress(event):
+                        nonlocal failed
+                        if event['event'] == 'fetched':
+                            progress.update(task, description=f"處理 {event['code']}")
+                        elif event['event'] == 'written':
+                            progress.advance(task)
+                        elif event['event'] == 'failed':
+                            failed += 1
+                            progress.update(task, failed=failed)
+                    
+                    completed = self.manager.run_queue_worker(queue, worker_id=args.worker_id,
+                                                              filter_tags=filter_tags, wait=args.wait,
+                                                              on_progress=on_progress)
+                    progress.update(task, description="完成")
+                self.console.print(f"[green]本 worker 完成 {completed} 個項目[/green]")
+            elif args.action == 'collect':
+                results = []
+                while True:
+                    # 先判斷是否清空再收集，避免漏掉最後幾個剛完成的項目
+                    drained = queue.is_drained()
+                    results += self.manager.collect_queue_results(queue, args.output)
+                    if not args.wait or drained:
+                        break
+                    time.sleep(5)
+                found = sum(1 for r in results if r['magnet_links'])
+                self.console.print(f"[green]已套用 {len(results)} 個結果（{found} 部選出磁力鏈接），寫入: {args.output}[/green]")
+            self._display_queue_status(queue)
+        finally:
+            queue.close()
+    
+    def _display_queue_status(self, queue):
+        stats = queue.stats()
+        table = Table(title=f"佇列狀態 - {queue.path}")
+        for column in ('待處理', '租用中', '已完成', '已套用', '失敗'):
+            table.add_column(column, justify="right")
+        table.add_row(str(stats['pending']), str(stats['leased']), str(stats['done']),
+                      str(stats['applied']), str(stats['failed']))
+        self.console.print(table)
+        for item in queue.failed_items()[:10]:
+            self.console.print(f"[red]失敗（{item['attempts']} 次）: {item['url']} {item['error'] or ''}[/red]")
+    
+    def handle_refresh(self, args):
+        """處理重新檢查命令"""
+        from dotenv import load_dotenv
+        from movie_state import magnet_score
+        load_dotenv('config.env')
+        
+        days = args.days if args.days is not None else float(os.getenv('REFRESH_DAYS', '7'))
+        budget = args.budget if args.budget is not None else int(os.getenv('REFRESH_BUDGET', '30'))
+        filter_tags = [tag.strip() for tag in args.filter.split(',')] if args.filter else []
+        self.console.print(f"[blue]重新檢查最近 {days:g} 天內爬取的影片（最多 {budget} 個請求）...[/blue]")
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            _LiveStatsColumn(self.manager),
+            console=self.console
+        ) as progress:
+            task = progress.add_task("準備中...", total=budget, failed=0)
+            
+            def on_progress(event):
+                if event['event'] == 'planned':
+                    progress.update(task, total=min(budget, event['total']), description="檢查中")
+                elif event['event'] == 'checked':
+                    status = '未變動' if event['status'] == 304 else ('失敗' if not event['status'] else '已更新')
+                    progress.update(task, advance=1, description=f"{event['code']} {status}")
+            
+            upgrades = self.manager.refresh_tracked(days=days, budget=budget, filter_tags=filter_tags,
+                                                    filename=args.output, on_progress=on_progress)
+            progress.update(task, description="完成")
+        
+        if not upgrades:
+            self.console.print("[yellow]沒有發現更好的磁力鏈接[/yellow]")
+            return
+        table = Table(title=f"更好的磁力鏈接（已寫入 {args.output} 的本月分段）")
+        table.add_column("番號", style="cyan")
+        table.add_column("評分", justify="center")
+        table.add_column("標籤")
+        table.add_column("大小", justify="right")
+        for result in upgrades:
+            best = result['magnet_links'][0]
+            table.add_row(result['movie']['code'], f"{result['previous_score']} → {magnet_score(best)}",
+                          ", ".join(best.tags), best.size or "")
+        self.console.print(table)
+    
+    def handle_tracker(self, args):
+        """處理已爬取記錄同步命令"""
+        from tracker_snapshot import SyncMarkers, default_snapshot_name, from_micros, node_name
+        tracker = self.manager.tracker
+        markers = SyncMarkers(f"{tracker.db_file}.sync.json")
+        if args.action == 'export':
+            # 標記只在對方確認後推進（見 import），快照遺失時下次會重新匯出
+            since = markers.acked(args.peer) if args.peer and not args.full else 0
+            output = args.files[0] if args.files else default_snapshot_name()
+            header = tracker.export_snapshot(output, since=since, acks=markers.received())
+            scope = f"{from_micros(since)} 之後" if since else "全部"
+            self.console.print(f"[green]已匯出{scope}的 {header['count']} 筆記錄: {output}"
+                               f"（{os.path.getsize(output)} bytes）[/green]")
+        else:
+            if not args.files:
+                self.console.print("[red]請指定要匯入的快照文件[/red]")
+                return
+            for path in args.files:
+                header, changed = tracker.import_snapshot(path)
+                self.console.print(f"[green]{path}（節點 {header.get('node', '?')}）：快照 {header.get('count', 0)} 筆，"
+                                   f"新增或更新 {changed} 筆[/green]")
+                peer = header.get('node')
+                if not peer:
+                    continue
+                if not markers.receive(peer, header.get('since', 0), header.get('until', 0)):
+                    self.console.print(f"[yellow]{path} 與先前從 {peer} 收到的記錄不連續，請先匯入較早的快照"
+                                       f"（或請對方以 --full 匯出）[/yellow]")
+                ack = header.get('acks', {}).get(node_name())
+                if ack:
+                    markers.confirm(peer, ack)
+        stats = tracker.get_statistics()
+        self.console.print(f"[cyan]已爬取記錄: {stats['total_scraped']}/{stats['max_records']} 筆（{tracker.db_file}）[/cyan]")
+    
     def handle_code(self, args):
         """處理番號命令"""
         self.console.print(f"[blue]正在獲取番號 {args.movie_code} 的磁力鏈接...[/blue]")
@@ -227,6 +626,120 @@ class JavDBMagnetCLI:
             else:
                 self._export_magnet_links(magnet_links, args.movie_code, args.export, args.output)
     
+    def handle_codes(self, args):
+        """處理批量番號命令"""
+        import os
+        from datetime import datetime
+        from dotenv import load_dotenv
+        load_dotenv('config.env')
+        
+        # 讀取番號列表
+        if args.input == '-':
+            raw_lines = sys.stdin.read().splitlines()
+        else:
+            if not os.path.exists(args.input):
+                self.console.print(f"[red]錯誤: 找不到文件 {args.input}[/red]")
+                return
+            with open(args.input, 'r', encoding='utf-8') as f:
+                raw_lines = f.read().splitlines()
+        
+        codes = self.manager.normalize_codes(raw_lines)
+        if not codes:
+            self.console.print("[yellow]沒有可處理的番號[/yellow]")
+            return
+        
+        workers = args.workers
+        if workers is None:
+            try:
+                workers = int(os.getenv('CODES_WORKERS', '3'))
+            except ValueError:
+                workers = 3
+        
+        filter_tags = []
+        if args.filter:
+            filter_tags = [tag.strip() for tag in args.filter.split(',')]
+        
+        filename = args.output
+        if not filename:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"magnet/javdb_codes_{timestamp}.{args.export}"
+        elif not filename.endswith(f'.{args.export}'):
+            filename = f"{filename}.{args.export}"
+        
+        self.console.print(f"[blue]正在批量獲取 {len(codes)} 個番號的磁力鏈接（並發數: {workers}）...[/blue]")
+        if filter_tags:
+            self.console.print(f"[cyan]標籤過濾: {', '.join(filter_tags)}[/cyan]")
+        
+        with open_export_sink(args.export, filename) as sink, Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed}/{task.total}"),
+            TimeElapsedColumn(),
+            console=self.console
+        ) as progress:
+            task = progress.add_task("爬取中...", total=len(codes))
+            
+            def on_result(result):
+                sink.write(result)
+                progress.advance(task)
+            
+            results = self.manager.get_magnets_by_codes(
+                codes, max_workers=workers, filter_tags=filter_tags, on_result=on_result
+            )
+        
+        found = sum(1 for r in results if r['magnet_links'])
+        self.console.print(f"[green]完成：{found}/{len(results)} 個番號取得磁力鏈接，已導出到: {filename}[/green]")
+        missing = [r['code'] for r in results if not r['magnet_links']]
+        if missing:
+            self.console.print(f"[yellow]未取得磁力鏈接: {', '.join(missing[:20])}{' ...' if len(missing) > 20 else ''}[/yellow]")
+    
+    def handle_reparse(self, args):
+        """處理離線重新解析命令"""
+        from datetime import datetime
+        from html_archive import HtmlArchive
+        
+        archive_dir = args.archive or os.getenv('HTML_ARCHIVE', '')
+        if not archive_dir or not os.path.isdir(archive_dir):
+            self.console.print("[red]錯誤: 找不到封存目錄，請以 --archive 指定或在配置文件設定 HTML_ARCHIVE[/red]")
+            return
+        archive = HtmlArchive(archive_dir)
+        
+        filter_tags = []
+        if args.filter:
+            filter_tags = [tag.strip() for tag in args.filter.split(',')]
+        
+        filename = args.output
+        if not filename:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"magnet/javdb_reparse_{timestamp}.{args.export}"
+        elif not filename.endswith(f'.{args.export}'):
+            filename = f"{filename}.{args.export}"
+        
+        self.console.print(f"[blue]正在重新解析封存 {archive_dir}（共 {len(archive)} 個頁面）...[/blue]")
+        with open_export_sink(args.export, filename) as sink, Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            console=self.console
+        ) as progress:
+            task = progress.add_task("解析中...", total=None)
+            
+            def on_result(result):
+                sink.write(result)
+                progress.advance(task)
+            
+            results = self.manager.reparse_archive(
+                archive, date=args.date, max_workers=args.workers,
+                filter_tags=filter_tags, on_result=on_result
+            )
+            progress.update(task, total=len(results), description="完成")
+        
+        found = sum(1 for r in results if r['magnet_links'])
+        self.console.print(f"[green]完成：{found}/{len(results)} 個詳情頁取得磁力鏈接，已導出到: {filename}[/green]")
+    
     def handle_interactive(self):
         """處理交互模式"""
         self.console.print(Panel.fit(
@@ -673,7 +1186,7 @@ class JavDBMagnetCLI:
         args.filter = None
         args.export = 'txt'
         args.output = None
-        args.rank_type = 'monthly'  # 默認使用月榜
+        args.rank_type = None  # 使用配置文件的 RANKING_SOURCES，未設定時為有碼月榜
         
         self.handle_top30(args)
     
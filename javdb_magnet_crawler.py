@@ -6,9 +6,13 @@ import time
 import random
 import re
 import os
-from typing import List, Optional, Dict, Any
+import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import List, Optional, Dict, Any, Iterable, Callable, Tuple
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlencode
+from urllib.parse import urljoin, urlencode, urlparse
 from datetime import datetime
 
 # 使用 curl_cffi 模擬 Chrome TLS 指紋以通過 Cloudflare（requests 會被 403）
@@ -28,6 +32,25 @@ except ImportError:
     _USE_PLAYWRIGHT = False
 
 
+def _parse_retry_after(response) -> float:
+    """讀取 429/503 回應的 Retry-After（秒），無法解析時回傳 0"""
+    if response.status_code not in (429, 503):
+        return 0.0
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def _emit_progress(on_progress: Optional[Callable[[Dict[str, Any]], None]], event: str, **data) -> None:
+    """發送進度事件（planned/skipped/fetched/parsed/written/failed），回呼的錯誤不影響爬取"""
+    if on_progress is None:
+        return
+    data['event'] = event
+    try:
+        on_progress(data)
+    except Exception:
+        logging.getLogger("bt_crawler").debug("進度回呼失敗", exc_info=True)
+
 class _FakeResponse:
     """供解析用的簡易 response，僅含 .text / .status_code / .url"""
     __slots__ = ("text", "status_code", "url")
@@ -44,6 +67,20 @@ from utils import (
     get_random_user_agent, random_delay, clean_text, setup_logging
 )
 from duplicate_tracker import DuplicateTracker
+from identity_pool import IdentityPool, EgressIdentity
+from throttle import AdaptiveConcurrency
+from clearance_store import ClearanceStore
+from latency import LatencyTracker, endpoint_of
+from clock import get_clock
+import metrics
+from tracing import Tracer
+from html_archive import HtmlArchive
+from page_fingerprint import LayoutMonitor, LayoutChangedError
+from crawl_profiles import CrawlProfile
+from rankings_plan import RankingSource, DEFAULT_SOURCE, PERIODS, merge_rankings
+from work_queue import WorkQueue
+from url_list_store import UrlListStore
+from movie_state import MovieStateStore, magnet_score, infohash_of, best_magnet
 
 class MagnetLink:
     """磁力鏈接數據模型"""
@@ -57,18 +94,60 @@ class MagnetLink:
         self.download_url = ""  # 下載按鈕的鏈接
         self.date = ""  # 上傳日期
         self.quality = ""  # 質量標識
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """轉為可 JSON 序列化的 dict（跨程序傳遞用）"""
+        return dict(vars(self))
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MagnetLink":
+        magnet = cls()
+        for key, value in data.items():
+            if hasattr(magnet, key):
+                setattr(magnet, key, value)
+        return magnet
 
 class JavDBMagnetCrawler:
     """JavDB 磁力鏈接專用爬蟲"""
     
     def __init__(self):
-        self.base_url = "https://javdb.com"
-        if _USE_CFFI:
-            self.session = cffi_requests.Session(impersonate="chrome")
-        else:
-            self.session = requests.Session()
+        from dotenv import load_dotenv
+        load_dotenv('config.env')
+        
+        # JAVDB_BASE_URL 可指向鏡像站或本地模擬伺服器（benchmarks/mock_javdb_server.py）
+        self.base_url = os.getenv('JAVDB_BASE_URL', 'https://javdb.com').rstrip('/')
+        self.cookie_domain = urlparse(self.base_url).hostname or 'javdb.com'
         self.logger = setup_logging()
-        self._setup_session()
+        # 所有延遲、退避與速率限制共用的時鐘（可用 clock.set_clock 換成 VirtualClock 做免睡眠模擬）
+        self.clock = get_clock()
+        # 階段耗時追蹤（管理器每次執行前 reset，結束時輸出各階段耗時）
+        self.tracer = Tracer(self.clock)
+        # 出口身分池：每個身分有各自的代理、模擬目標、cookie 與速率額度（REQUEST_RATE 為每個身分的每秒請求數）
+        self.identity_pool = IdentityPool.from_env()
+        # 主執行緒在第一個身分上的會話（保留 self.session 供外部設定 UA 等）
+        self.session = self.identity_pool.identities[0].get_session(self._create_session)
+        # 載入先前 Playwright 取得且尚未過期的 Cloudflare 通關憑證
+        self.clearance_store = ClearanceStore(os.getenv('CLEARANCE_FILE', 'cf_clearance.json'))
+        self._load_clearances()
+        # 全域自適應並發控制（AIMD）與斷路器，依 403/429/5xx 訊號自動調整
+        self.throttle = AdaptiveConcurrency.from_env()
+        # 各端點延遲統計：依 p95 設定逾時（上限 REQUEST_TIMEOUT），HEDGE_REQUESTS=1 時超過 p95 送出對沖請求
+        try:
+            request_timeout = float(os.getenv('REQUEST_TIMEOUT', '30'))
+        except ValueError:
+            request_timeout = 30.0
+        self.latency = LatencyTracker(default_timeout=request_timeout)
+        self.hedge_enabled = os.getenv('HEDGE_REQUESTS', '0').strip().lower() in ('1', 'true', 'yes')
+        self._hedge_executor = None
+        # 實際發出的 HTTP 請求數（含重試與對沖），refresh 以此計算請求預算
+        self.requests_sent = 0
+        self._sent_lock = threading.Lock()
+        # HTML_ARCHIVE 設定時封存每個抓取到的頁面，供 reparse 離線重新解析
+        self.archive = HtmlArchive.from_env()
+        # 頁面版面指紋：網站改版導致連續數頁解析異常時提早停止（LAYOUT_CHECK=0 停用）
+        self.layout_monitor = LayoutMonitor.from_env()
+        if len(self.identity_pool) > 1:
+            self.logger.info(f"出口身分池已啟用：{len(self.identity_pool)} 個身分 {self.identity_pool.identities}")
         if _USE_CFFI:
             self.logger.info("使用 curl_cffi 模擬 Chrome TLS（impersonate=chrome）")
         else:
@@ -78,15 +157,30 @@ class JavDBMagnetCrawler:
         else:
             self.logger.info("若持續 403，可安裝 Playwright 備援: pip install playwright 後執行 playwright install chromium")
     
-    def _setup_session(self):
+    def _create_session(self, identity: EgressIdentity):
+        """為出口身分建立新的 HTTP 會話（優先使用 curl_cffi 模擬指定瀏覽器）
+
+        curl_cffi Session 非執行緒安全，並發時每個身分在每個執行緒各建立一個
+        """
+        proxies = {"http": identity.proxy, "https": identity.proxy} if identity.proxy else None
+        if _USE_CFFI:
+            session = cffi_requests.Session(impersonate=identity.impersonate, proxies=proxies)
+        else:
+            session = requests.Session()
+            if proxies:
+                session.proxies.update(proxies)
+        self._setup_session(session)
+        return session
+    
+    def _setup_session(self, session):
         """設置會話"""
-        self.session.headers.update({
+        session.headers.update({
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
             "Accept-Language": "zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7",
             "Accept-Encoding": "gzip, deflate, br",
             "Connection": "keep-alive",
-            "Referer": "https://javdb.com/",
+            "Referer": self.base_url + "/",
             "Upgrade-Insecure-Requests": "1",
             "Sec-Fetch-Dest": "document",
             "Sec-Fetch-Mode": "navigate",
@@ -96,20 +190,51 @@ class JavDBMagnetCrawler:
             "Sec-GPC": "1"
         })
         # JavDB 18 歲確認：直接帶入 over18=1，無需先請求 over18 頁面
-        self.session.cookies.set("over18", "1", domain="javdb.com", path="/")
+        session.cookies.set("over18", "1", domain=self.cookie_domain, path="/")
     
-    def _fetch_with_playwright(self, full_url: str) -> Optional[_FakeResponse]:
-        """403 時用真實瀏覽器取得頁面。需安裝 playwright 並執行 playwright install chromium。"""
+    def _load_clearances(self):
+        """將保存的通關憑證套用到對應的出口身分"""
+        for identity in self.identity_pool.identities:
+            clearance = self.clearance_store.load(identity.key)
+            metrics.CACHE_LOOKUPS.inc(cache='clearance', result='hit' if clearance else 'miss')
+            if clearance:
+                identity.update_cookies(clearance['cookies'])
+                identity.user_agent = clearance['user_agent'] or None
+                self.logger.info(f"已載入 {identity.key} 的 Cloudflare 通關憑證（{len(clearance['cookies'])} 個 cookie）")
+    
+    def _adopt_clearance(self, identity: EgressIdentity, user_agent: str, cookies: List[Dict[str, Any]]):
+        """將瀏覽器取得的 cookie 與 UA 移交給 curl_cffi 會話並保存到文件"""
+        if not cookies:
+            return
+        identity.update_cookies(cookies)
+        if user_agent:
+            identity.user_agent = user_agent
+        identity.reset_health()
+        names = [c['name'] for c in cookies]
+        self.logger.info(f"已將瀏覽器 cookie 移交給 {identity.key}: {', '.join(names)}")
+        try:
+            self.clearance_store.save(identity.key, user_agent, cookies)
+        except OSError as e:
+            self.logger.warning(f"保存通關憑證失敗: {e}")
+    
+    def _fetch_with_playwright(self, full_url: str, identity: Optional[EgressIdentity] = None) -> Optional[_FakeResponse]:
+        """403 時用真實瀏覽器取得頁面。需安裝 playwright 並執行 playwright install chromium。
+        
+        成功後會把瀏覽器的 cookie（cf_clearance 等）與 UA 移交給該出口身分，後續請求改回快速的 curl_cffi。
+        """
         if not _USE_PLAYWRIGHT:
             return None
         try:
             with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
+                launch_kwargs = {"headless": True}
+                if identity is not None and identity.proxy:
+                    launch_kwargs["proxy"] = {"server": identity.proxy}
+                browser = p.chromium.launch(**launch_kwargs)
                 context = browser.new_context(
                     locale="zh-TW",
                     viewport={"width": 1280, "height": 720},
                 )
-                context.add_cookies([{"name": "over18", "value": "1", "domain": "javdb.com", "path": "/"}])
+                context.add_cookies([{"name": "over18", "value": "1", "domain": self.cookie_domain, "path": "/"}])
                 page = context.new_page()
                 page.goto(full_url, wait_until="domcontentloaded", timeout=30000)
                 # 若有年齡驗證彈窗，點「是,我已滿18歲」
@@ -121,6 +246,9 @@ class JavDBMagnetCrawler:
                 except Exception:
                     pass
                 html = page.content()
+                if identity is not None:
+                    user_agent = page.evaluate("() => navigator.userAgent")
+                    self._adopt_clearance(identity, user_agent, context.cookies())
                 browser.close()
                 return _FakeResponse(html, 200, full_url)
         except Exception as e:
@@ -132,36 +260,38 @@ class JavDBMagnetCrawler:
                      extra_headers: Optional[Dict[str, str]] = None) -> Optional[Any]:
         """發送HTTP請求。skip_ua_rotation=True 時不更換 UA（用於先訪首頁再請求排行榜以通過 Cloudflare）。"""
         for attempt in range(retries + 1):
+            identity = None
             try:
                 # 隨機延遲
                 if attempt > 0:
-                    random_delay(2, 5)
+                    random_delay(2, 5, clock=self.clock)
                 
-                # 更新User-Agent（若未要求固定 UA）
-                if not skip_ua_rotation:
-                    self.session.headers['User-Agent'] = get_random_user_agent()
-                req_headers = {'Accept-Encoding': 'gzip, deflate'}
-                if extra_headers:
-                    req_headers.update(extra_headers)
-                # 每次請求都明確帶上 over18，確保 curl_cffi 的 cookie jar 有送出
-                req_cookies = {"over18": "1"}
-                response = self.session.get(
-                    url,
-                    params=params,
-                    timeout=30,
-                    allow_redirects=True,
-                    headers=req_headers,
-                    cookies=req_cookies
-                )
+                # 取得並發名額與健康且有速率額度的出口身分（重試時可能換到其他身分）
+                identity = self._acquire_slot()
+                status = None
+                retry_after = 0.0
+                # 延遲量測使用實際時間（網路耗時不受虛擬時鐘影響）
+                start = time.monotonic()
+                try:
+                    response, identity = self._send(identity, url, params, extra_headers, skip_ua_rotation)
+                    status = response.status_code
+                    retry_after = _parse_retry_after(response)
+                finally:
+                    self._release_throttle(status, time.monotonic() - start, retry_after)
                 
+                identity.report(response.status_code not in (403, 429))
                 response.raise_for_status()
+                self._archive_page(url, params, response)
                 # 請求間隔 - 增加延遲以降低被封鎖的風險
-                random_delay(2, 4)  # 從 1-3秒 增加到 2-4秒
+                random_delay(2, 4, clock=self.clock)  # 從 1-3秒 增加到 2-4秒
                 
                 return response
                 
             except Exception as e:
                 self.logger.warning(f"請求失敗 (嘗試 {attempt + 1}/{retries + 1}): {e}")
+                # 無回應（逾時、連線或代理錯誤）計入身分的失敗率；有回應者已在上方回報
+                if identity is not None and getattr(e, "response", None) is None:
+                    identity.report(False)
                 
                 if attempt == retries:
                     # 若為 403 且已安裝 Playwright，改用真實瀏覽器取得頁面
@@ -169,24 +299,162 @@ class JavDBMagnetCrawler:
                     if err_resp is not None and err_resp.status_code == 403 and _USE_PLAYWRIGHT:
                         full_url = url + ("?" + urlencode(params)) if params else url
                         self.logger.info("收到 403，嘗試使用 Playwright 真實瀏覽器取得頁面...")
-                        pw_resp = self._fetch_with_playwright(full_url)
+                        pw_resp = self._fetch_with_playwright(full_url, identity)
+                        metrics.PLAYWRIGHT_FALLBACKS.inc(result='success' if pw_resp is not None else 'failure')
                         if pw_resp is not None:
                             self.logger.info("Playwright 取得頁面成功")
+                            self._archive_page(url, params, pw_resp)
                             return pw_resp
                     self.logger.error(f"請求最終失敗: {url}")
+                    metrics.FAILURES.inc(endpoint=endpoint_of(url))
                     return None
                 
+                metrics.RETRIES.inc(endpoint=endpoint_of(url))
                 # 指數退避
-                time.sleep(2 ** attempt)
+                self.clock.sleep(2 ** attempt)
         
         return None
     
-    def get_monthly_rankings_with_magnets(self, limit: int = 30) -> List[Dict[str, Any]]:
-        """獲取有碼月榜前30的影片及其磁力鏈接"""
+    def _acquire_slot(self) -> EgressIdentity:
+        """取得並發名額與目前有速率額度的出口身分
+        
+        等待身分冷卻或速率額度時先歸還名額，AIMD 並發上限只限制實際進行中的請求，而非等待中的執行緒
+        """
+        while True:
+            # 等待並發名額（斷路器開啟時會在此等待冷卻結束）
+            self.throttle.acquire()
+            identity = self.identity_pool.try_acquire()
+            if identity is not None:
+                return identity
+            self.throttle.cancel()
+            self.clock.sleep(self.identity_pool.pending_delay())
+    
+    def _release_throttle(self, status: Optional[int], latency: float, retry_after: float = 0.0) -> None:
+        """回報請求結果並釋放並發名額，斷路器因此開啟時記錄警告"""
+        if self.throttle.release(status, latency, retry_after):
+            state = self.throttle.snapshot()
+            self.logger.warning(
+                f"限流錯誤率過高，斷路器開啟，"
+                f"暫停請求 {state['cooldown_remaining']:.0f} 秒（並發上限降為 {state['limit']}）"
+            )
+    
+    def _archive_page(self, url: str, params: Optional[Dict], response) -> None:
+        """封存成功取得的頁面（未啟用封存時不做任何事，寫入失敗只記錄警告）"""
+        if self.archive is None or response.status_code == 304:
+            return
+        full_url = url + ("?" + urlencode(params) if params else "")
+        try:
+            self.archive.put(full_url, response.text, response.status_code)
+        except OSError as e:
+            self.logger.warning(f"封存頁面失敗: {e}")
+    
+    def _send_once(self, identity: EgressIdentity, url: str, params: Optional[Dict],
+                   extra_headers: Optional[Dict[str, str]], skip_ua_rotation: bool,
+                   timeout: float, endpoint: str):
+        """以指定出口身分在目前執行緒發送一次 GET，成功時記錄延遲"""
+        session = identity.get_session(self._create_session)
+        
+        # 更新User-Agent：持有通關憑證的身分必須沿用取得憑證時的 UA
+        if identity.user_agent:
+            session.headers['User-Agent'] = identity.user_agent
+        elif skip_ua_rotation:
+            if identity.fixed_user_agent:
+                session.headers['User-Agent'] = identity.fixed_user_agent
+        else:
+            session.headers['User-Agent'] = get_random_user_agent()
+        req_headers = {'Accept-Encoding': 'gzip, deflate'}
+        if extra_headers:
+            req_headers.update(extra_headers)
+        # 每次請求都明確帶上 over18，確保 curl_cffi 的 cookie jar 有送出
+        req_cookies = {"over18": "1"}
+        with self._sent_lock:
+            self.requests_sent += 1
+        start = time.monotonic()
+        try:
+            response = session.get(
+                url,
+                params=params,
+                timeout=timeout,
+                allow_redirects=True,
+                headers=req_headers,
+                cookies=req_cookies
+            )
+        except Exception:
+            metrics.REQUESTS.inc(endpoint=endpoint, status='error')
+            raise
+        elapsed = time.monotonic() - start
+        metrics.REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        metrics.REQUEST_LATENCY.observe(elapsed, endpoint=endpoint)
+        metrics.RESPONSE_BYTES.observe(len(response.content or b''), endpoint=endpoint)
+        if response.status_code < 400:
+            self.latency.record(endpoint, elapsed)
+        return response
+    
+    def _send_hedge(self, identity: EgressIdentity, *args):
+        """發送對沖請求（已取得並發名額），結果同樣回報給並發控制"""
+        status = None
+        retry_after = 0.0
+        start = time.monotonic()
+        try:
+            response = self._send_once(identity, *args)
+            status = response.status_code
+            retry_after = _parse_retry_after(response)
+            return response
+        finally:
+            self._release_throttle(status, time.monotonic() - start, retry_after)
+    
+    def _send(self, identity: EgressIdentity, url: str, params: Optional[Dict],
+              extra_headers: Optional[Dict[str, str]], skip_ua_rotation: bool):
+        """發送請求，逾時依端點 p95 設定；啟用對沖時，超過 p95 仍未回應就以另一個身分再送一次，
+        採用先回來的結果並取消另一個（已送出的請求無法中斷，其結果直接丟棄）
+        對沖請求同樣佔用並發名額，且只在另有出口不同、健康且立即有速率額度的身分時送出，否則繼續等待原請求
+        
+        Returns:
+            (response, 實際取得回應的出口身分)
+        """
+        endpoint = endpoint_of(url)
+        timeout = self.latency.timeout_for(endpoint)
+        hedge_after = self.latency.hedge_delay(endpoint) if self.hedge_enabled else None
+        args = (url, params, extra_headers, skip_ua_rotation, timeout, endpoint)
+        if hedge_after is None:
+            return self._send_once(identity, *args), identity
+        
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        primary = self._hedge_executor.submit(self._send_once, identity, *args)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result(), identity
+        
+        if not self.throttle.try_acquire():
+            return primary.result(), identity
+        hedge_identity = self.identity_pool.try_acquire(exclude=identity)
+        if hedge_identity is None:
+            self.throttle.cancel()
+            return primary.result(), identity
+        self.logger.info(f"請求超過 p95（{hedge_after:.1f} 秒），以 {hedge_identity.key} 送出對沖請求: {url}")
+        hedge = self._hedge_executor.submit(self._send_hedge, hedge_identity, *args)
+        owners = {primary: identity, hedge: hedge_identity}
+        pending = set(owners)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        # 尚未開始的對沖請求被取消時不會回報結果，需歸還名額
+                        if other.cancel() and other is hedge:
+                            self.throttle.cancel()
+                    return future.result(), owners[future]
+        # 兩個請求都失敗，拋出原請求的錯誤
+        raise primary.exception()
+    
+    def get_monthly_rankings_with_magnets(self, limit: int = 30,
+                                          on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """獲取有碼月榜前30的影片及其磁力鏈接（on_progress 接收進度事件，見 _emit_progress）"""
         self.logger.info(f"開始獲取有碼月榜前{limit}的影片磁力鏈接")
         
         # 直接請求排行榜（已帶 over18=1 cookie 與 Chrome TLS），不再先訪首頁避免觸發 403
-        self.session.headers['User-Agent'] = FIXED_CHROME_UA
+        self.identity_pool.set_fixed_user_agent(FIXED_CHROME_UA)
         # 1. 獲取排行榜頁面
         rankings_url = f"{self.base_url}/rankings/movies"
         params = {
@@ -206,6 +474,7 @@ class JavDBMagnetCrawler:
         # 2. 解析排行榜，獲取影片列表
         movies = self._parse_rankings_page(response.text, limit)
         self.logger.info(f"從排行榜獲取到 {len(movies)} 部影片")
+        _emit_progress(on_progress, 'planned', total=len(movies), skipped=0)
         
         # 3. 創建即時寫入文件
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -228,7 +497,13 @@ class JavDBMagnetCrawler:
                 self.logger.info(f"處理第 {i}/{len(movies)} 部影片: {movie['title']}")
                 
                 # 獲取磁力鏈接
-                magnet_links = self.get_movie_magnet_links(movie['detail_url'])
+                html = self.fetch_movie_page(movie['detail_url'])
+                magnet_links = []
+                if html is not None:
+                    _emit_progress(on_progress, 'fetched', rank=i, code=movie.get('code', ''))
+                    with self.tracer.span('detail_parse'):
+                        magnet_links = self._parse_magnet_links_page(html, movie['detail_url'])
+                    _emit_progress(on_progress, 'parsed', rank=i, magnets=len(magnet_links))
                 
                 # 根據優先順序過濾磁力鏈接
                 filtered_magnets = self._filter_magnets_by_priority(magnet_links)
@@ -270,9 +545,14 @@ class JavDBMagnetCrawler:
                 
                 f.write("-" * 80 + "\n\n")
                 f.flush()  # 強制寫入，確保即時保存
+                if html is None:
+                    _emit_progress(on_progress, 'failed', rank=i, code=movie.get('code', ''), reason='fetch')
+                else:
+                    _emit_progress(on_progress, 'written', rank=i, code=movie.get('code', ''),
+                                   selected=len(filtered_magnets))
                 
                 # 避免請求過於頻繁
-                random_delay(2, 4)
+                random_delay(2, 4, clock=self.clock)
             
             # 寫入統計信息
             total_magnets = sum(result['total_magnets'] for result in results)
@@ -290,25 +570,26 @@ class JavDBMagnetCrawler:
         self.logger.info(f"磁力鏈接已即時保存到: {filename}")
         return results
     
+    @metrics.timed_parse('rankings')
     def _parse_rankings_page(self, html_content: str, limit: int) -> List[Dict[str, Any]]:
         """解析排行榜頁面"""
         soup = BeautifulSoup(html_content, 'html.parser')
         movies = []
         
-        self.logger.info(f"頁面內容長度: {len(html_content)}")
+        self.logger.debug("頁面內容長度: %d", len(html_content))
         
         # 查找電影列表容器
         movie_items = soup.find_all('div', class_='item')
-        self.logger.info(f"找到 {len(movie_items)} 個電影項目")
+        self.logger.info("找到 %d 個電影項目", len(movie_items))
         
         # 如果沒有找到，嘗試其他選擇器
         if not movie_items:
             movie_items = soup.find_all('div', class_='movie-item')
-            self.logger.info(f"使用 movie-item 找到 {len(movie_items)} 個項目")
+            self.logger.info("使用 movie-item 找到 %d 個項目", len(movie_items))
         
         if not movie_items:
             movie_items = soup.find_all('div', class_='video-item')
-            self.logger.info(f"使用 video-item 找到 {len(movie_items)} 個項目")
+            self.logger.info("使用 video-item 找到 %d 個項目", len(movie_items))
         
         
         for index, item in enumerate(movie_items[:limit]):
@@ -320,6 +601,7 @@ class JavDBMagnetCrawler:
                 self.logger.warning(f"解析電影項目失敗: {e}")
                 continue
         
+        self._check_layout('rankings', soup, len(movies))
         return movies
     
     def _parse_movie_item(self, item, rank: int) -> Optional[Dict[str, Any]]:
@@ -490,20 +772,67 @@ class JavDBMagnetCrawler:
         self.logger.warning(f"未找到番號 {movie_code} 的影片")
         return None
     
-    def get_movie_magnet_links(self, movie_url: str) -> List[MagnetLink]:
-        """獲取影片的磁力鏈接"""
-        self.logger.info(f"獲取磁力鏈接: {movie_url}")
+    def fetch_movie_page(self, movie_url: str) -> Optional[str]:
+        """抓取影片詳情頁 HTML，失敗時返回 None"""
+        _, html, _ = self.fetch_movie_page_conditional(movie_url)
+        return html
+    
+    def fetch_movie_page_conditional(self, movie_url: str, etag: Optional[str] = None,
+                                     last_modified: Optional[str] = None) -> Tuple[int, Optional[str], Dict[str, Optional[str]]]:
+        """以條件請求抓取影片詳情頁（帶上次的 ETag / Last-Modified）
         
-        response = self._make_request(movie_url)
+        Returns:
+            (狀態碼（失敗為 0）, HTML（失敗或 304 未變動時為 None）, 新的驗證標頭 {'etag', 'last_modified'})
+        """
+        self.logger.info(f"獲取磁力鏈接: {movie_url}")
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        with self.tracer.span('detail_fetch'):
+            response = self._make_request(movie_url, extra_headers=headers or None)
         if not response:
             self.logger.error(f"無法獲取影片詳情頁面: {movie_url}")
+            return 0, None, {}
+        response_headers = getattr(response, 'headers', None) or {}
+        validators = {'etag': response_headers.get('ETag') or etag,
+                      'last_modified': response_headers.get('Last-Modified') or last_modified}
+        if response.status_code == 304:
+            return 304, None, validators
+        return response.status_code, response.text, validators
+    
+    def get_movie_magnet_links(self, movie_url: str) -> List[MagnetLink]:
+        """獲取影片的磁力鏈接"""
+        html = self.fetch_movie_page(movie_url)
+        if html is None:
             return []
         
-        return self._parse_magnet_links_page(response.text, movie_url)
+        with self.tracer.span('detail_parse'):
+            return self._parse_magnet_links_page(html, movie_url)
     
+    @metrics.timed_parse('detail')
     def _parse_magnet_links_page(self, html_content: str, movie_url: str) -> List[MagnetLink]:
         """解析磁力鏈接頁面"""
         soup = BeautifulSoup(html_content, 'html.parser')
+        magnet_links, source = self._extract_magnet_links(soup, html_content)
+        # 只能以全頁正則回退取得磁力的頁面（沒有標籤等資訊）視為版面異常
+        self._check_layout('detail', soup, len(magnet_links), degraded=source == 'regex')
+        return magnet_links
+    
+    def _check_layout(self, kind: str, soup, items: int, degraded: bool = False) -> None:
+        """比對版面指紋，連續多頁不符時依 LAYOUT_ON_CHANGE 停止爬取或警告"""
+        if self.layout_monitor is not None:
+            self.layout_monitor.observe(kind, soup, items, degraded=degraded)
+    
+    def _extract_magnet_links(self, soup, html_content: str) -> Tuple[List[MagnetLink], str]:
+        """從詳情頁提取磁力鏈接（依序嘗試多種選擇器，最後以正則表達式回退）
+        
+        Returns:
+            (磁力鏈接列表, 取得項目的路徑: 'selector' 磁力區域選擇器、'legacy' 複製按鈕（舊版表格）、
+             'regex' 全頁正則回退；沒有項目時為 'none')
+        """
         magnet_links = []
         error_indicators = ['驗證碼', '登錄', '請登入', '需要登錄', 'captcha', 'login', '請稍後再試', '訪問過於頻繁']
         page_text_lower = html_content.lower()
@@ -525,14 +854,14 @@ class JavDBMagnetCrawler:
         for selector in selectors:
             magnet_section = soup.select_one(selector)
             if magnet_section:
-                self.logger.info(f"找到磁力鏈接區域: {selector}")
+                self.logger.debug("找到磁力鏈接區域: %s", selector)
                 break
         
         if not magnet_section:
             # 如果找不到專門的磁力鏈接區域，查找包含"複製"按鈕的區域
             copy_buttons = soup.find_all('a', string='複製')
             if copy_buttons:
-                self.logger.info(f"找到 {len(copy_buttons)} 個複製按鈕")
+                self.logger.debug("找到 %d 個複製按鈕", len(copy_buttons))
                 # 從複製按鈕向上查找父容器
                 for button in copy_buttons:
                     parent = button.find_parent('div') or button.find_parent('tr')
@@ -541,7 +870,7 @@ class JavDBMagnetCrawler:
                         if magnet_link:
                             magnet_links.append(magnet_link)
                 if magnet_links:
-                    return magnet_links
+                    return magnet_links, 'legacy'
             
             # 如果還是找不到，嘗試從HTML中直接提取magnet鏈接（使用正則表達式）
             self.logger.warning("未找到磁力鏈接區域和複製按鈕，嘗試從HTML中直接提取")
@@ -560,7 +889,7 @@ class JavDBMagnetCrawler:
                     magnet_link.file_count = 0
                     magnet_link.date = ""
                     magnet_links.append(magnet_link)
-                    self.logger.info(f"成功提取磁力鏈接: {magnet_url[:50]}...")
+                    self.logger.debug("成功提取磁力鏈接: %.50s...", magnet_url)
             
             if not magnet_links:
                 self.logger.warning("無法從頁面中提取任何磁力鏈接")
@@ -568,8 +897,8 @@ class JavDBMagnetCrawler:
                     if ind.lower() in page_text_lower:
                         self.logger.warning(f"頁面可能包含錯誤提示（{ind}），網站可能限制了訪問")
                         break
-                return []
-            return magnet_links
+                return [], 'none'
+            return magnet_links, 'regex'
         
         # 查找磁力鏈接項目
         magnet_items = []
@@ -587,7 +916,7 @@ class JavDBMagnetCrawler:
             items = magnet_section.select(selector)
             if items:
                 magnet_items = items
-                self.logger.info(f"使用選擇器 {selector} 找到 {len(items)} 個項目")
+                self.logger.debug("使用選擇器 %s 找到 %d 個項目", selector, len(items))
                 break
         
         if not magnet_items:
@@ -596,27 +925,27 @@ class JavDBMagnetCrawler:
             if not magnet_items:
                 magnet_items = magnet_section.find_all('div')
         
-        self.logger.info(f"開始解析 {len(magnet_items)} 個磁力鏈接項目")
+        self.logger.debug("開始解析 %d 個磁力鏈接項目", len(magnet_items))
         
         for i, item in enumerate(magnet_items):
             try:
                 magnet_link = self._parse_magnet_item(item)
                 if magnet_link:
                     magnet_links.append(magnet_link)
-                    self.logger.info(f"成功解析第 {i+1} 個磁力鏈接: {magnet_link.title}")
+                    self.logger.debug("成功解析第 %d 個磁力鏈接: %s", i + 1, magnet_link.title)
                 else:
-                    self.logger.debug(f"第 {i+1} 個項目解析失敗")
+                    self.logger.debug("第 %d 個項目解析失敗", i + 1)
             except Exception as e:
                 self.logger.warning(f"解析磁力鏈接項目失敗: {e}")
                 continue
         
-        self.logger.info(f"總共解析出 {len(magnet_links)} 個磁力鏈接")
+        self.logger.info("總共解析出 %d 個磁力鏈接", len(magnet_links))
         if not magnet_links:
             for ind in error_indicators:
                 if ind.lower() in page_text_lower:
                     self.logger.warning(f"頁面可能包含錯誤提示（{ind}），網站可能限制了訪問")
                     break
-        return magnet_links
+        return magnet_links, 'selector' if magnet_links else 'none'
     
     def _parse_magnet_item(self, item) -> Optional[MagnetLink]:
         """解析磁力鏈接項目"""
@@ -741,8 +1070,9 @@ class JavDBMagnetCrawler:
             if file_count_match:
                 magnet.file_count = int(file_count_match.group(1))
         
-        # 調試信息
-        self.logger.info(f"解析磁力鏈接項目: 標題={magnet.title}, 大小={magnet.size}, 標籤={magnet.tags}, 複製鏈接={magnet.copy_url}")
+        # 調試信息（每個磁力項目一筆，屬高頻日誌：DEBUG 級並延後格式化，標籤以 tuple 傳入避免之後被修改）
+        self.logger.debug("解析磁力鏈接項目: 標題=%s, 大小=%s, 標籤=%s, 複製鏈接=%s",
+                          magnet.title, magnet.size, tuple(magnet.tags), magnet.copy_url)
         
         return magnet if magnet.copy_url or magnet.magnet_url else None
     
@@ -778,13 +1108,13 @@ class JavDBMagnetCrawler:
         
         # 按優先順序返回一個最佳選擇
         if high_quality:
-            self.logger.info(f"選擇高清磁力鏈接: {high_quality[0].copy_url}")
+            self.logger.info("選擇高清磁力鏈接: %s", high_quality[0].copy_url)
             return [high_quality[0]]  # 只返回第一個高清
         elif subtitle:
-            self.logger.info(f"選擇字幕磁力鏈接: {subtitle[0].copy_url}")
+            self.logger.info("選擇字幕磁力鏈接: %s", subtitle[0].copy_url)
             return [subtitle[0]]  # 只返回第一個字幕
         else:
-            self.logger.info(f"選擇第一個磁力鏈接: {magnet_links[0].copy_url}")
+            self.logger.info("選擇第一個磁力鏈接: %s", magnet_links[0].copy_url)
             return [magnet_links[0]]  # 只返回第一個
     
     def get_magnet_download_url(self, magnet_link: MagnetLink) -> Optional[str]:
@@ -802,6 +1132,52 @@ class JavDBMagnetCrawler:
         
         return magnet_link.magnet_url
 
+def _select_magnets(crawler: JavDBMagnetCrawler, magnet_links: List[MagnetLink],
+                    filter_tags: Optional[List[str]] = None) -> List[MagnetLink]:
+    """套用標籤過濾後依優先順序選出最佳磁力鏈接"""
+    if filter_tags:
+        magnet_links = [m for m in magnet_links if any(tag in ','.join(m.tags) for tag in filter_tags)]
+    return crawler._filter_magnets_by_priority(magnet_links)
+
+def _select_best_scored(magnet_links: List[MagnetLink], filter_tags: Optional[List[str]] = None) -> List[MagnetLink]:
+    """套用標籤過濾後選出 magnet_score 最高的磁力鏈接（同分取列表中較前者）
+
+    refresh 以評分判斷升級，選擇也必須依評分：排在無字幕高清版之後的字幕高清版才會被選到
+    """
+    if filter_tags:
+        magnet_links = [m for m in magnet_links if any(tag in ','.join(m.tags) for tag in filter_tags)]
+    best = best_magnet(magnet_links)
+    return [best] if best is not None else []
+
+# reparse 子程序內的解析器（每個子程序建立一次）
+_reparse_crawler: Optional[JavDBMagnetCrawler] = None
+
+def _init_reparse_worker():
+    global _reparse_crawler
+    _reparse_crawler = JavDBMagnetCrawler()
+    _reparse_crawler.logger.setLevel(logging.WARNING)
+    # 離線重新解析舊頁面，不比對也不記錄版面指紋
+    _reparse_crawler.layout_monitor = None
+
+def _reparse_entry(archive_dir: str, entry: Dict[str, Any], filter_tags: Optional[List[str]]) -> Dict[str, Any]:
+    """在子程序中解析一個封存的詳情頁，返回與番號查詢相同格式的結果"""
+    crawler = _reparse_crawler
+    html = HtmlArchive.read_entry(archive_dir, entry)
+    magnet_links = crawler._parse_magnet_links_page(html, entry['url'])
+    selected = _select_magnets(crawler, magnet_links, filter_tags)
+    code = ''
+    if selected:
+        code = crawler._extract_real_code_from_magnet(selected[0].copy_url or selected[0].magnet_url)
+    return {
+        'code': code or entry['url'].rstrip('/').rsplit('/', 1)[-1],
+        'detail_url': entry['url'],
+        'archived_date': entry['date'],
+        'magnet_links': selected,
+        'total_magnets': len(magnet_links),
+        'filtered_magnets': len(selected),
+        'error': '' if selected else '沒有符合條件的磁力鏈接'
+    }
+
 class JavDBMagnetManager:
     """JavDB 磁力鏈接管理器"""
     
@@ -809,20 +1185,34 @@ class JavDBMagnetManager:
         self.crawler = JavDBMagnetCrawler()
         self.logger = setup_logging()
         self.tracker = DuplicateTracker()
-        self.written_urls = set()  # 用於跟踪已寫入的URL，避免重複
+        self._movie_state: Optional[MovieStateStore] = None
+    
+    @property
+    def movie_state(self) -> MovieStateStore:
+        """各影片的磁力狀態（MOVIE_STATE_DB，第一次使用時開啟）"""
+        if self._movie_state is None:
+            self._movie_state = MovieStateStore.from_env()
+        return self._movie_state
     
-    def get_top30_magnets(self, skip_duplicates: bool = True, rank_type: str = "monthly", limit: int = None) -> List[Dict[str, Any]]:
+    def get_top30_magnets(self, skip_duplicates: bool = True, rank_type: str = "monthly", limit: int = None,
+                          on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                          sources: Optional[List[RankingSource]] = None) -> List[Dict[str, Any]]:
         """獲取有碼排行榜前N的磁力鏈接
         
         Args:
             skip_duplicates: 是否跳過已爬取的影片
-            rank_type: 排行榜類型 ("monthly" 月榜)
-            limit: 下載數量（如果為None，則從配置文件讀取）
+            rank_type: 排行榜期間 ("daily" 日榜、"weekly" 週榜、"monthly" 月榜)，未指定 sources 時使用有碼該期間
+            limit: 每個排行榜的下載數量（如果為None，則從配置文件讀取）
+            on_progress: 進度事件回呼，收到含 event 欄位的 dict：
+                planned（total, skipped）、skipped（count；爬取中途發現已由其他程序處理時另含 rank, code）、
+                fetched（rank, code）、parsed（rank, magnets）、written（rank, code, selected）、failed（rank, code, reason）
+            sources: 多個排行榜來源（類別、期間），並發抓取後依番號合併去重
         """
-        # 只支持月榜
-        if rank_type != "monthly":
+        if rank_type not in PERIODS:
+            self.logger.warning(f"未知的排行榜類型 {rank_type}，已改為月榜（monthly）")
             rank_type = "monthly"
-            self.logger.warning("已將排行榜類型改為月榜（monthly）")
+        if sources is None:
+            sources = [RankingSource('censored', rank_type)]
         
         # 從環境變數讀取 limit（如果未提供）
         if limit is None:
@@ -832,135 +1222,162 @@ class JavDBMagnetManager:
             top_count_raw = os.getenv('TOP_COUNT', '30')
             limit = int(top_count_raw)
         
-        return self.get_top30_monthly_with_duplicate_check(limit=limit) if skip_duplicates else self.crawler.get_monthly_rankings_with_magnets(limit)
+        if skip_duplicates:
+            return self.get_top30_monthly_with_duplicate_check(limit=limit, on_progress=on_progress, sources=sources)
+        if sources != [DEFAULT_SOURCE]:
+            self.logger.warning("不檢查重複的模式只支持有碼月榜，已忽略其他排行榜來源")
+        return self.crawler.get_monthly_rankings_with_magnets(limit, on_progress=on_progress)
+    
+    def get_top30_monthly_with_duplicate_check(self, limit: int = 30,
+                                               on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                               sources: Optional[List[RankingSource]] = None) -> List[Dict[str, Any]]:
+        """獲取前N排行榜（預設有碼月榜），跳過已爬取的影片（共享重複檢測），結束時記錄各階段耗時"""
+        tracer = self.crawler.tracer
+        tracer.reset()
+        try:
+            return self._crawl_monthly_with_duplicate_check(limit, on_progress, sources or [DEFAULT_SOURCE])
+        finally:
+            self.logger.info("各階段耗時:\n" + tracer.format_report())
+    
+    def _fetch_rankings(self, limit: int, source: RankingSource = DEFAULT_SOURCE) -> Optional[List[Dict[str, Any]]]:
+        """獲取並解析一個排行榜的第一頁，失敗時返回 None"""
+        tracer = self.crawler.tracer
+        # 直接請求排行榜（已帶 over18=1 cookie 與 Chrome TLS）
+        self.crawler.identity_pool.set_fixed_user_agent(FIXED_CHROME_UA)
+        rankings_url = f"{self.crawler.base_url}/rankings/movies"
+        with tracer.span('rankings_fetch'):
+            response = self.crawler._make_request(
+                rankings_url, source.params(),
+                skip_ua_rotation=True,
+                extra_headers={"Referer": self.crawler.base_url + "/"}
+            )
+        if not response:
+            self.logger.error(f"無法獲取{source.display_name}排行榜頁面")
+            return None
+        
+        with tracer.span('rankings_parse'):
+            all_movies = self.crawler._parse_rankings_page(response.text, limit)
+        self.logger.info(f"從{source.display_name}排行榜獲取到 {len(all_movies)} 部影片")
+        return all_movies
+    
+    def _movie_key(self, movie: Dict[str, Any]) -> str:
+        """跨排行榜合併用的鍵：基礎番號，番號格式異常時用詳情頁 URL"""
+        code = movie.get('code', '')
+        if code and self.tracker._is_valid_code(code):
+            return self.tracker._to_base_code(code.upper())
+        return movie.get('detail_url', '')
+    
+    def _fetch_rankings_plan(self, sources: List[RankingSource], limit: int) -> Optional[List[Dict[str, Any]]]:
+        """並發抓取多個排行榜並依番號合併去重（limit 為每個排行榜的數量），全部失敗時返回 None"""
+        if len(sources) == 1:
+            return self._fetch_rankings(limit, sources[0])
+        ranked_lists = []
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            futures = [executor.submit(self._fetch_rankings, limit, source) for source in sources]
+            for source, future in zip(sources, futures):
+                try:
+                    movies = future.result()
+                except LayoutChangedError:
+                    raise
+                except Exception as e:
+                    self.logger.warning(f"抓取{source.display_name}排行榜失敗: {e}")
+                    movies = None
+                if movies is not None:
+                    ranked_lists.append((source, movies))
+        if not ranked_lists:
+            return None
+        with self.crawler.tracer.span('rankings_merge'):
+            merged = merge_rankings(ranked_lists, self._movie_key)
+        total = sum(len(movies) for _, movies in ranked_lists)
+        self.logger.info(f"合併 {len(ranked_lists)} 個排行榜：{total} 筆 -> {len(merged)} 部不重複影片")
+        return merged
     
-    def get_top30_monthly_with_duplicate_check(self, limit: int = 30) -> List[Dict[str, Any]]:
-        """獲取前N月榜，跳過已爬取的影片（共享重複檢測）"""
+    def _resolve_movie_code(self, movie: Dict[str, Any], filtered_magnets: List[MagnetLink]) -> Optional[str]:
+        """從選中的磁力鏈接（或標題）取得真實番號並更新 movie['code']，取不到時返回 None"""
+        if not filtered_magnets:
+            return None
+        magnet = filtered_magnets[0]
+        real_code = self.crawler._extract_real_code_from_magnet(magnet.copy_url or magnet.magnet_url)
+        if real_code:
+            movie['code'] = real_code  # 更新為真實番號
+        elif not movie.get('code') or len(movie.get('code', '')) < 5:
+            # 如果沒有提取到真實番號，嘗試從標題提取
+            title = movie.get('title', '')
+            code_match = re.search(r'([A-Z]{2,6}-\d{3,5})', title)
+            if code_match:
+                real_code = code_match.group(1)
+                movie['code'] = real_code
+        return real_code
+    
+    def _crawl_monthly_with_duplicate_check(self, limit: int,
+                                            on_progress: Optional[Callable[[Dict[str, Any]], None]],
+                                            sources: List[RankingSource]) -> List[Dict[str, Any]]:
+        tracer = self.crawler.tracer
         # 檢查統計信息
         stats = self.tracker.get_statistics()
         if stats['total_scraped'] > 0:
             self.logger.info(f"📊 已記錄 {stats['total_scraped']} 部影片，將自動跳過重複")
         else:
-            # 如果 scraped_movies.json 不存在或為空，清空 written_urls 以確保一致性
-            # 這樣可以避免因為舊的 url_list_monthly.txt 導致誤判重複
-            self.written_urls.clear()
-            self.logger.info("📋 檢測到無歷史記錄，已清空URL重複檢查列表")
+            # 如果 scraped_movies.json 不存在或為空，不以舊的 url_list 去重（避免誤判重複）
+            self.logger.info("📋 檢測到無歷史記錄，本次不使用 url_list 中的舊URL檢查重複")
         
-        self.logger.info(f"開始獲取有碼月榜前{limit}的影片磁力鏈接（檢查重複）")
+        source_names = '、'.join(source.display_name for source in sources)
+        self.logger.info(f"開始獲取{source_names}前{limit}的影片磁力鏈接（檢查重複）")
         
-        # 直接請求排行榜（已帶 over18=1 cookie 與 Chrome TLS）
-        self.crawler.session.headers['User-Agent'] = FIXED_CHROME_UA
-        # 1. 獲取排行榜頁面
-        rankings_url = f"{self.crawler.base_url}/rankings/movies"
-        params = {
-            "p": "monthly",  # 月榜
-            "t": "censored",  # 有碼
-            "page": 1
-        }
-        response = self.crawler._make_request(
-            rankings_url, params,
-            skip_ua_rotation=True,
-            extra_headers={"Referer": self.crawler.base_url + "/"}
-        )
-        if not response:
-            self.logger.error("無法獲取排行榜頁面")
+        # 1-2. 獲取並解析排行榜頁面（多個來源時並發抓取並合併去重）
+        all_movies = self._fetch_rankings_plan(sources, limit)
+        if all_movies is None:
             return []
         
-        # 2. 解析排行榜，獲取影片列表
-        all_movies = self.crawler._parse_rankings_page(response.text, limit)
-        self.logger.info(f"從月榜排行榜獲取到 {len(all_movies)} 部影片")
-        
         # 3. 過濾出未爬取的影片
-        new_movies, skipped_count = self.tracker.get_new_movies(all_movies)
+        with tracer.span('dedup'):
+            new_movies, skipped_count = self.tracker.get_new_movies(all_movies)
+        metrics.CACHE_LOOKUPS.inc(skipped_count, cache='tracker', result='hit')
+        metrics.CACHE_LOOKUPS.inc(len(new_movies), cache='tracker', result='miss')
         self.logger.info(f"✓ 跳過 {skipped_count} 部已爬取的影片")
         self.logger.info(f"✓ 剩餘 {len(new_movies)} 部新影片")
+        if skipped_count:
+            _emit_progress(on_progress, 'skipped', count=skipped_count)
+        _emit_progress(on_progress, 'planned', total=len(new_movies), skipped=skipped_count)
         if not new_movies:
             self.logger.info("沒有新影片需要爬取")
             return []
         
-        # 4. 使用固定檔名（月榜專用），始終追加模式
-        os.makedirs("magnet", exist_ok=True)
-        filename = "magnet/url_list_monthly.txt"
-        
-        # 檢查文件是否存在，如果不存在則需要初始化 written_urls
-        # 注意：如果 scraped_movies.json 不存在（已在上方清空 written_urls），
-        # 這裡不再從 url_list_monthly.txt 讀取 URL，確保一致性
-        if not os.path.exists(filename):
-            # 文件不存在，清空 written_urls（新文件）
-            self.written_urls.clear()
-            self.logger.info(f"創建新文件: {filename}")
-        else:
-            # 文件已存在，但只有在 scraped_movies.json 也存在時才讀取現有URL
-            # 這樣可以避免因為只有 url_list_monthly.txt 而誤判重複
-            scraped_movies_exists = os.path.exists(self.tracker.db_file)
-            if scraped_movies_exists:
-                # 文件已存在，讀取現有URL到 written_urls 中（避免重複）
-                try:
-                    with open(filename, 'r', encoding='utf-8') as f:
-                        existing_urls = [line.strip() for line in f if line.strip() and not line.strip().startswith('20')]  # 過濾掉日期標題行
-                        self.written_urls.update(existing_urls)
-                    self.logger.info(f"追加到現有文件: {filename} (已有 {len(self.written_urls)} 個URL)")
-                except Exception as e:
-                    self.logger.warning(f"讀取現有文件失敗: {e}，將繼續追加")
-            else:
-                # scraped_movies.json 不存在，不清除 written_urls（已在上面清空）
-                # 但也不從 url_list_monthly.txt 讀取，確保一致性
-                self.logger.info(f"檢測到 {filename} 存在但 scraped_movies.json 不存在，忽略月榜檔中的舊URL以確保一致性")
+        # 4. 使用固定檔名（有碼月榜專用，其他排行榜組合寫入 url_list_rankings.txt），依月份輪替分段、始終追加
+        filename = "magnet/url_list_monthly.txt" if sources == [DEFAULT_SOURCE] else "magnet/url_list_rankings.txt"
         
-        file_mode = 'a'  # 始終使用追加模式
-        
-        # 檢查文件最後一行是否為今天的日期標題
-        current_date = datetime.now().strftime('%Y/%m/%d')
-        needs_date_header = True
-        if os.path.exists(filename) and os.path.getsize(filename) > 0:
-            try:
-                with open(filename, 'r', encoding='utf-8') as check_file:
-                    lines = check_file.readlines()
-                    if lines:
-                        # 從後往前找最後一個非空行
-                        for line in reversed(lines):
-                            last_line = line.strip()
-                            if last_line:
-                                # 檢查是否為今天的日期格式 YYYY/MM/DD
-                                if last_line == current_date:
-                                    needs_date_header = False
-                                break
-            except Exception:
-                pass
+        # 只有 scraped_movies.json 有記錄時才以過去寫入的 URL 去重（避免因為只有 url_list 而誤判重複）
+        with tracer.span('url_list_scan'):
+            store = UrlListStore(filename, use_history=stats['total_scraped'] > 0)
+        self.logger.info(f"追加到: {store.segment}")
         
         # 5. 為每部新影片獲取磁力鏈接並即時寫入
         results = []
         scraped_codes = []  # 記錄成功爬取的番號
         
-        with open(filename, file_mode, encoding='utf-8') as f:
-            # 如果需要，寫入日期標題
-            if needs_date_header:
-                f.write(f"\n{current_date}\n")
-            
+        with store:
             for i, movie in enumerate(new_movies, 1):
+                # 同時執行的其他爬蟲（共用記錄文件）可能已處理這部影片
+                if self.tracker.is_already_scraped(movie.get('code', ''), refresh=True):
+                    self.logger.info(f"跳過第 {i}/{len(new_movies)} 部: {movie['code']} 已由其他程序爬取")
+                    _emit_progress(on_progress, 'skipped', count=1, rank=i, code=movie['code'])
+                    continue
                 self.logger.info(f"處理第 {i}/{len(new_movies)} 部新影片: {movie['title']}")
                 
-                # 獲取磁力鏈接
-                magnet_links = self.crawler.get_movie_magnet_links(movie['detail_url'])
+                # 獲取磁力鏈接（保留驗證標頭，refresh 模式可用條件請求重新檢查）
+                _, html, validators = self.crawler.fetch_movie_page_conditional(movie['detail_url'])
+                magnet_links = []
+                if html is not None:
+                    _emit_progress(on_progress, 'fetched', rank=i, code=movie.get('code', ''))
+                    with tracer.span('detail_parse'):
+                        magnet_links = self.crawler._parse_magnet_links_page(html, movie['detail_url'])
+                    _emit_progress(on_progress, 'parsed', rank=i, magnets=len(magnet_links))
                 
                 # 根據優先順序過濾磁力鏈接
-                filtered_magnets = self.crawler._filter_magnets_by_priority(magnet_links)
-                
-                # 嘗試從磁力鏈接中提取真實番號
-                real_code = None
-                if filtered_magnets:
-                    magnet = filtered_magnets[0]
-                    real_code = self.crawler._extract_real_code_from_magnet(magnet.copy_url or magnet.magnet_url)
-                    if real_code:
-                        movie['code'] = real_code  # 更新為真實番號
-                    elif not movie.get('code') or len(movie.get('code', '')) < 5:
-                        # 如果沒有提取到真實番號，嘗試從標題提取
-                        title = movie.get('title', '')
-                        code_match = re.search(r'([A-Z]{2,6}-\d{3,5})', title)
-                        if code_match:
-                            extracted_code = code_match.group(1)
-                            movie['code'] = extracted_code
-                            real_code = extracted_code
+                with tracer.span('select'):
+                    filtered_magnets = self.crawler._filter_magnets_by_priority(magnet_links)
+                    # 嘗試從磁力鏈接中提取真實番號
+                    real_code = self._resolve_movie_code(movie, filtered_magnets)
                 
                 result = {
                     'rank': i,
@@ -975,24 +1392,23 @@ class JavDBMagnetManager:
                 # 使用真實番號記錄（如果有），否則使用原始 code
                 code_to_record = real_code or movie.get('code', '')
                 
-                # 即時寫入到文件（只保存URL，檢查重複）
-                if filtered_magnets:
-                    magnet = filtered_magnets[0]  # 只取第一個（最佳選擇）
-                    url = magnet.copy_url or magnet.magnet_url
-                    # 標準化URL（去除首尾空格）
-                    if url:
-                        url = url.strip()
-                    # 檢查URL是否已經寫入過（避免重複）
-                    if url and url not in self.written_urls:
-                        f.write(f"{url}\n")
-                        self.written_urls.add(url)  # 記錄已寫入的URL
-                    elif url and url in self.written_urls:
-                        self.logger.info(f"跳過重複URL: {url}")
+                # 即時寫入到文件（只保存URL，檢查重複；寫入後立即 flush）
+                with tracer.span('url_list_write'):
+                    if filtered_magnets:
+                        magnet = filtered_magnets[0]  # 只取第一個（最佳選擇）
+                        url = (magnet.copy_url or magnet.magnet_url or '').strip()
+                        if url and not store.write(url):
+                            self.logger.info(f"跳過重複URL: {url}")
                 
                 # 無論是否有磁力鏈接，只要有有效的番號就記錄為已處理（避免重複爬取）
                 # 驗證番號格式，只記錄有效的番號，並立即寫入到 scraped_movies.json
                 if code_to_record and self.tracker._is_valid_code(code_to_record):
-                    self.tracker.mark_and_save(code_to_record)  # 即時寫入
+                    with tracer.span('mark_and_save'):
+                        self.tracker.mark_and_save(code_to_record)  # 即時寫入
+                        if html is not None:
+                            # 基準評分取所有磁力中的最高分（與 refresh 的選擇規則一致），而非實際寫入的那一個
+                            self.movie_state.record(self.tracker._to_base_code(code_to_record), movie,
+                                                    magnet_links, magnet_links, **validators)
                     scraped_codes.append(code_to_record)  # 保留用於統計
                     if not filtered_magnets:
                         self.logger.info(f"影片 {code_to_record} 沒有找到磁力鏈接，但已記錄為已處理")
@@ -1001,16 +1417,21 @@ class JavDBMagnetManager:
                     if code_to_record:
                         self.logger.warning(f"跳過記錄異常格式的番號: {code_to_record} (標題: {movie.get('title', '')})")
                 
-                f.flush()  # 強制寫入，確保即時保存
+                if html is None:
+                    _emit_progress(on_progress, 'failed', rank=i, code=code_to_record, reason='fetch')
+                else:
+                    _emit_progress(on_progress, 'written', rank=i, code=code_to_record,
+                                   selected=len(filtered_magnets))
                 
                 # 避免請求過於頻繁 - 增加延遲時間以降低被封鎖的風險（使用模組頂層導入的 random_delay）
-                if not filtered_magnets:
-                    self.logger.warning(f"影片 {movie.get('title', '')} 未找到磁力鏈接，延遲更長時間...")
-                    random_delay(5, 8)  # 延長到5-8秒
-                else:
-                    random_delay(3, 6)  # 正常情況延遲3-6秒（從2-4秒增加）
+                with tracer.span('delay'):
+                    if not filtered_magnets:
+                        self.logger.warning(f"影片 {movie.get('title', '')} 未找到磁力鏈接，延遲更長時間...")
+                        random_delay(5, 8, clock=self.crawler.clock)  # 延長到5-8秒
+                    else:
+                        random_delay(3, 6, clock=self.crawler.clock)  # 正常情況延遲3-6秒（從2-4秒增加）
         
-        self.logger.info(f"磁力鏈接已即時保存到: {filename}")
+        self.logger.info(f"磁力鏈接已即時保存到: {store.segment}")
         
         # 6. 已爬取的影片已通過 mark_and_save 即時寫入，這裡只記錄統計信息
         if scraped_codes:
@@ -1018,6 +1439,331 @@ class JavDBMagnetManager:
         
         return results
     
+    def crawl_profiles(self, profiles: List[CrawlProfile], limit: int = 30,
+                       on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                       sources: Optional[List[RankingSource]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """一次爬取套用多組 profile：排行榜與每個詳情頁只抓取一次，再依各 profile 篩選、寫檔與記錄
+
+        每個 profile 使用自己的已爬取記錄（tracker_file）與導出檔（output），
+        只抓取至少一個 profile 尚未處理的影片；sources 預設為有碼月榜；返回 {profile 名稱: 結果列表}
+        """
+        tracer = self.crawler.tracer
+        tracer.reset()
+        try:
+            return self._crawl_profiles(profiles, limit, on_progress, sources or [DEFAULT_SOURCE])
+        finally:
+            self.logger.info("各階段耗時:\n" + tracer.format_report())
+    
+    def _crawl_profiles(self, profiles: List[CrawlProfile], limit: int,
+                        on_progress: Optional[Callable[[Dict[str, Any]], None]],
+                        sources: List[RankingSource]) -> Dict[str, List[Dict[str, Any]]]:
+        tracer = self.crawler.tracer
+        results: Dict[str, List[Dict[str, Any]]] = {profile.name: [] for profile in profiles}
+        if not profiles:
+            return results
+        source_names = '、'.join(source.display_name for source in sources)
+        self.logger.info(f"開始獲取{source_names}前{limit}的影片磁力鏈接（profile: {', '.join(results)}）")
+        
+        all_movies = self._fetch_rankings_plan(sources, limit)
+        if all_movies is None:
+            return results
+        
+        # 各 profile 以自己的記錄去重，彙整出每部影片需要套用的 profile
+        trackers: Dict[str, DuplicateTracker] = {}
+        pending: Dict[str, List[CrawlProfile]] = {}
+        with tracer.span('dedup'):
+            for profile in profiles:
+                tracker = trackers[profile.name] = DuplicateTracker(profile.tracker_file)
+                candidates = [movie for movie in all_movies if profile.accepts_movie(movie)]
+                new_movies, skipped_count = tracker.get_new_movies(candidates)
+                metrics.CACHE_LOOKUPS.inc(skipped_count, cache='tracker', result='hit')
+                metrics.CACHE_LOOKUPS.inc(len(new_movies), cache='tracker', result='miss')
+                for movie in new_movies:
+                    pending.setdefault(movie['detail_url'], []).append(profile)
+                self.logger.info(f"[{profile.name}] 新影片 {len(new_movies)} 部，跳過 {skipped_count} 部已爬取、"
+                                 f"{len(all_movies) - len(candidates)} 部評分低於 {profile.min_score}")
+        movies = [movie for movie in all_movies if movie['detail_url'] in pending]
+        skipped_total = len(all_movies) - len(movies)
+        self.logger.info(f"✓ 共 {len(movies)} 部影片需要抓取詳情頁（各 profile 共用）")
+        if skipped_total:
+            _emit_progress(on_progress, 'skipped', count=skipped_total)
+        _emit_progress(on_progress, 'planned', total=len(movies), skipped=skipped_total)
+        if not movies:
+            self.logger.info("沒有新影片需要爬取")
+            return results
+        
+        # profile 名稱 -> 導出檔（依月份輪替，當天第一次寫入前寫日期標題）
+        outputs: Dict[str, UrlListStore] = {}
+        try:
+            with tracer.span('url_list_scan'):
+                for profile in profiles:
+                    outputs[profile.name] = UrlListStore(profile.output,
+                                                         use_history=os.path.exists(profile.tracker_file))
+            
+            for i, movie in enumerate(movies, 1):
+                # 同時執行的其他爬蟲（共用記錄文件）可能已處理這部影片
+                applicable = [profile for profile in pending[movie['detail_url']]
+                              if not trackers[profile.name].is_already_scraped(movie.get('code', ''), refresh=True)]
+                if not applicable:
+                    self.logger.info(f"跳過第 {i}/{len(movies)} 部: {movie['code']} 已由其他程序爬取")
+                    _emit_progress(on_progress, 'skipped', count=1, rank=i, code=movie['code'])
+                    continue
+                self.logger.info(f"處理第 {i}/{len(movies)} 部新影片: {movie['title']}"
+                                 f"（{', '.join(profile.name for profile in applicable)}）")
+                
+                html = self.crawler.fetch_movie_page(movie['detail_url'])
+                magnet_links = []
+                if html is not None:
+                    _emit_progress(on_progress, 'fetched', rank=i, code=movie.get('code', ''))
+                    with tracer.span('detail_parse'):
+                        magnet_links = self.crawler._parse_magnet_links_page(html, movie['detail_url'])
+                    _emit_progress(on_progress, 'parsed', rank=i, magnets=len(magnet_links))
+                
+                with tracer.span('select'):
+                    selections = {profile.name: profile.select_magnets(self.crawler, magnet_links)
+                                  for profile in applicable}
+                    real_code = None
+                    for selected in selections.values():
+                        real_code = self._resolve_movie_code(movie, selected)
+                        if real_code:
+                            break
+                code_to_record = real_code or movie.get('code', '')
+                
+                for profile in applicable:
+                    selected = selections[profile.name]
+                    results[profile.name].append({
+                        'rank': i,
+                        'movie': movie,
+                        'magnet_links': selected,
+                        'total_magnets': len(magnet_links),
+                        'filtered_magnets': len(selected)
+                    })
+                    with tracer.span('url_list_write'):
+                        for magnet in selected:
+                            outputs[profile.name].write(magnet.copy_url or magnet.magnet_url)
+                    if code_to_record and trackers[profile.name]._is_valid_code(code_to_record):
+                        with tracer.span('mark_and_save'):
+                            trackers[profile.name].mark_and_save(code_to_record)
+                
+                if html is None:
+                    _emit_progress(on_progress, 'failed', rank=i, code=code_to_record, reason='fetch')
+                else:
+                    _emit_progress(on_progress, 'written', rank=i, code=code_to_record,
+                                   selected=sum(len(selected) for selected in selections.values()))
+                
+                with tracer.span('delay'):
+                    if not magnet_links:
+                        random_delay(5, 8, clock=self.crawler.clock)
+                    else:
+                        random_delay(3, 6, clock=self.crawler.clock)
+        finally:
+            for store in outputs.values():
+                store.close()
+        
+        for profile in profiles:
+            found = sum(1 for result in results[profile.name] if result['magnet_links'])
+            self.logger.info(f"[{profile.name}] {found}/{len(results[profile.name])} 部選出磁力鏈接，"
+                             f"已保存到: {outputs[profile.name].segment}")
+        return results
+    
+    def enqueue_rankings(self, queue: WorkQueue, limit: int = 30,
+                         sources: Optional[List[RankingSource]] = None) -> Dict[str, int]:
+        """coordinator：抓取排行榜（可多個來源），把未爬取過的影片詳情頁放入工作佇列"""
+        tracer = self.crawler.tracer
+        all_movies = self._fetch_rankings_plan(sources or [DEFAULT_SOURCE], limit)
+        if all_movies is None:
+            return {'ranked': 0, 'skipped': 0, 'enqueued': 0}
+        with tracer.span('dedup'):
+            new_movies, skipped_count = self.tracker.get_new_movies(all_movies)
+        enqueued = sum(1 for movie in new_movies if queue.enqueue(movie['detail_url'], movie))
+        self.logger.info(f"已放入佇列 {enqueued} 部影片（跳過 {skipped_count} 部已爬取、"
+                         f"{len(new_movies) - enqueued} 部已在佇列中）")
+        return {'ranked': len(all_movies), 'skipped': skipped_count, 'enqueued': enqueued}
+    
+    def run_queue_worker(self, queue: WorkQueue, worker_id: Optional[str] = None,
+                         filter_tags: Optional[List[str]] = None, wait: bool = False, poll_interval: float = 5.0,
+                         on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+        """worker：租用項目、抓取並解析詳情頁、回報選出的磁力鏈接，返回完成的項目數
+
+        佇列清空即結束；wait=True 時持續輪詢等待新項目（以 Ctrl+C 結束）
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        tracer = self.crawler.tracer
+        completed = 0
+        while True:
+            items = queue.lease(worker_id)
+            if not items:
+                if not wait and queue.is_drained():
+                    break
+                # 其他 worker 的租約仍未結束（或等待新項目）；與其他程序協調，使用真實時間
+                time.sleep(poll_interval)
+                continue
+            item = items[0]
+            movie = item.payload
+            self.logger.info(f"[{worker_id}] 處理 {movie.get('code', '')} {item.url}（第 {item.attempts} 次）")
+            try:
+                html = self.crawler.fetch_movie_page(item.url)
+                if html is None:
+                    queue.fail(item, '無法獲取詳情頁')
+                    _emit_progress(on_progress, 'failed', rank=item.id, code=movie.get('code', ''), reason='fetch')
+                    continue
+                # 抓取的重試與退避可能耗掉大半租約，解析前先延長；已被其他 worker 接手時放棄此項目
+                if not queue.extend(item):
+                    self.logger.warning(f"[{worker_id}] {item.url} 的租約已逾時並由其他 worker 接手，略過")
+                    continue
+                _emit_progress(on_progress, 'fetched', rank=item.id, code=movie.get('code', ''))
+                with tracer.span('detail_parse'):
+                    magnet_links = self.crawler._parse_magnet_links_page(html, item.url)
+                with tracer.span('select'):
+                    selected = _select_magnets(self.crawler, magnet_links, filter_tags)
+                    real_code = self._resolve_movie_code(movie, selected)
+            except LayoutChangedError:
+                queue.fail(item, '頁面版面已變更')
+                raise
+            except Exception as e:
+                self.logger.warning(f"[{worker_id}] 處理 {item.url} 失敗: {e}")
+                queue.fail(item, str(e))
+                _emit_progress(on_progress, 'failed', rank=item.id, code=movie.get('code', ''), reason='error')
+                continue
+            result = {
+                'code': real_code or movie.get('code', ''),
+                'total_magnets': len(magnet_links),
+                'magnet_links': [magnet.to_dict() for magnet in selected],
+            }
+            if queue.complete(item, result):
+                completed += 1
+                _emit_progress(on_progress, 'written', rank=item.id, code=result['code'], selected=len(selected))
+            else:
+                self.logger.warning(f"[{worker_id}] {item.url} 的租約已逾時並由其他 worker 接手，結果未被採用")
+            with tracer.span('delay'):
+                random_delay(3, 6, clock=self.crawler.clock)
+        self.logger.info(f"[{worker_id}] 佇列已清空，本 worker 完成 {completed} 個項目")
+        return completed
+    
+    def collect_queue_results(self, queue: WorkQueue, filename: str = "magnet/url_list_monthly.txt",
+                              on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """coordinator：套用 worker 回報的結果（寫入 url_list、標記已爬取），每個項目只套用一次"""
+        pending = queue.unapplied_results()
+        results = []
+        if not pending:
+            return results
+        with UrlListStore(filename) as store:
+            for entry in pending:
+                data = entry['result']
+                selected = [MagnetLink.from_dict(magnet) for magnet in data['magnet_links']]
+                for magnet in selected:
+                    store.write(magnet.copy_url or magnet.magnet_url)
+                code = data['code']
+                if code and self.tracker._is_valid_code(code):
+                    self.tracker.mark_and_save(code)
+                # 寫檔與標記完成後才標記已套用：中途中斷時下次會重新套用（URL 與番號皆已去重）
+                queue.mark_applied(entry['id'])
+                movie = entry['payload']
+                movie['code'] = code or movie.get('code', '')
+                result = {
+                    'rank': movie.get('rank', 0),
+                    'movie': movie,
+                    'magnet_links': selected,
+                    'total_magnets': data['total_magnets'],
+                    'filtered_magnets': len(selected)
+                }
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        self.logger.info(f"已套用 {len(results)} 個佇列結果到 {store.segment}")
+        return results
+    
+    def refresh_tracked(self, days: float = 7, budget: int = 30, filter_tags: Optional[List[str]] = None,
+                        filename: str = "magnet/url_list_monthly.txt",
+                        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """refresh 模式：重新檢查最近 days 天內爬取過的影片，只輸出比原本選出的更好的磁力（升級）
+        
+        只檢查已到排程時間的影片（間隔依過去的變動情況指數調整），依變動率與排名排序後
+        以條件請求抓取詳情頁（304 表示未變動），選出評分（magnet_score）最高的磁力與先前比較；
+        budget 計算實際發出的 HTTP 請求（含重試、對沖與以番號搜尋詳情頁），用盡後不再開始下一部，
+        正在檢查的影片仍會完成，因此最後一部的重試可能使總數略超過 budget；
+        on_progress 事件: planned（total）、checked（rank, code, status）、upgraded（rank, code, score, previous）
+        返回升級的結果列表（格式同 top30，另含 previous_score）
+        """
+        tracer = self.crawler.tracer
+        tracer.reset()
+        try:
+            return self._refresh_tracked(days, budget, filter_tags, filename, on_progress)
+        finally:
+            self.logger.info("各階段耗時:\n" + tracer.format_report())
+    
+    def _refresh_tracked(self, days: float, budget: int, filter_tags: Optional[List[str]], filename: str,
+                         on_progress: Optional[Callable[[Dict[str, Any]], None]]) -> List[Dict[str, Any]]:
+        tracer = self.crawler.tracer
+        recent = self.tracker.scraped_since(days)
+        states = self.movie_state.states(code for code, _ in recent)
+        # 有狀態的影片只取已到期的，依重新檢查優先度排序；沒有狀態的（需先搜尋詳情頁）排在最後
+        candidates = [state['code'] for state in self.movie_state.due(states.values())]
+        candidates += [code for code, _ in recent if code not in states]
+        self.logger.info(f"refresh：最近 {days:g} 天內爬取 {len(recent)} 部，{len(candidates)} 部已到檢查時間，"
+                         f"本次請求上限 {budget}")
+        _emit_progress(on_progress, 'planned', total=len(candidates))
+        
+        upgrades = []
+        sent_before = self.crawler.requests_sent
+        requests_used = 0
+        with UrlListStore(filename) as store:
+            for i, code in enumerate(candidates, 1):
+                state = states.get(code)
+                requests_used = self.crawler.requests_sent - sent_before
+                if requests_used >= budget or (state is None and requests_used + 2 > budget):
+                    break
+                if state is not None and state.get('detail_url'):
+                    detail_url = state['detail_url']
+                    movie = {'code': code, 'title': state.get('title') or '', 'detail_url': detail_url,
+                             'rank': state.get('rank')}
+                else:
+                    # 加入狀態記錄前爬取的影片：先以番號搜尋詳情頁，本次只建立基準
+                    detail_url = self.crawler.search_movie_by_code(code)
+                    if not detail_url:
+                        _emit_progress(on_progress, 'checked', rank=i, code=code, status=0)
+                        continue
+                    movie = {'code': code, 'title': '', 'detail_url': detail_url, 'rank': None}
+                
+                status, html, validators = self.crawler.fetch_movie_page_conditional(
+                    detail_url, (state or {}).get('etag'), (state or {}).get('last_modified'))
+                _emit_progress(on_progress, 'checked', rank=i, code=code, status=status)
+                if status == 304:
+                    self.movie_state.touch(code)
+                    continue
+                if html is None:
+                    continue
+                with tracer.span('detail_parse'):
+                    magnet_links = self.crawler._parse_magnet_links_page(html, detail_url)
+                with tracer.span('select'):
+                    selected = _select_best_scored(magnet_links, filter_tags)
+                self.movie_state.record(code, movie, magnet_links, selected, **validators)
+                
+                if state is not None and selected:
+                    best = selected[0]
+                    score = magnet_score(best)
+                    if score > state['best_score'] and infohash_of(best) != state.get('best_hash'):
+                        with tracer.span('url_list_write'):
+                            store.write(best.copy_url or best.magnet_url)
+                        self.logger.info(f"⬆ {code} 有更好的磁力（評分 {state['best_score']} -> {score}）: {best.title}")
+                        upgrades.append({
+                            'rank': i,
+                            'movie': movie,
+                            'magnet_links': selected,
+                            'total_magnets': len(magnet_links),
+                            'filtered_magnets': len(selected),
+                            'previous_score': state['best_score'],
+                        })
+                        _emit_progress(on_progress, 'upgraded', rank=i, code=code, score=score,
+                                       previous=state['best_score'])
+                
+                with tracer.span('delay'):
+                    random_delay(3, 6, clock=self.crawler.clock)
+        
+        requests_used = self.crawler.requests_sent - sent_before
+        self.logger.info(f"refresh 完成：使用 {requests_used}/{budget} 個請求，{len(upgrades)} 部有更好的磁力")
+        return upgrades
+    
     def get_magnets_by_code(self, movie_code: str) -> List[MagnetLink]:
         """根據番號獲取磁力鏈接"""
         # 先通過搜索找到正確的影片 URL（包含正確的 ID）
@@ -1028,7 +1774,133 @@ class JavDBMagnetManager:
             return []
         
         return self.crawler.get_movie_magnet_links(movie_url)
-    
+
+    def normalize_codes(self, raw_codes: Iterable[str]) -> List[str]:
+        """將輸入的番號正規化為基礎番號並去重（保留輸入順序）
+
+        每行可包含多個以逗號或空白分隔的番號，# 開頭的行視為註解
+        """
+        codes = []
+        seen = set()
+        for line in raw_codes:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            for token in re.split(r'[\s,]+', line):
+                if not token:
+                    continue
+                base = self.tracker._to_base_code(token.upper())
+                if base not in seen:
+                    seen.add(base)
+                    codes.append(base)
+        return codes
+
+    def _resolve_code(self, movie_code: str, filter_tags: Optional[List[str]] = None) -> Dict[str, Any]:
+        """單一番號的處理流程：搜索 -> 詳情頁 -> 選擇最佳磁力鏈接"""
+        result = {
+            'code': movie_code,
+            'detail_url': '',
+            'magnet_links': [],
+            'total_magnets': 0,
+            'filtered_magnets': 0,
+            'error': ''
+        }
+
+        # 版面已判定變更時不再發送請求（其餘番號直接以錯誤結束）
+        if self.crawler.layout_monitor is not None:
+            self.crawler.layout_monitor.ensure_ok()
+        movie_url = self.crawler.search_movie_by_code(movie_code)
+        if not movie_url:
+            result['error'] = '找不到影片'
+            return result
+        result['detail_url'] = movie_url
+
+        magnet_links = self.crawler.get_movie_magnet_links(movie_url)
+        result['total_magnets'] = len(magnet_links)
+        selected = _select_magnets(self.crawler, magnet_links, filter_tags)
+        result['magnet_links'] = selected
+        result['filtered_magnets'] = len(selected)
+        if not selected:
+            result['error'] = '沒有符合條件的磁力鏈接'
+        return result
+
+    def get_magnets_by_codes(self, movie_codes: List[str], max_workers: int = 3,
+                             filter_tags: Optional[List[str]] = None,
+                             on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """批量根據番號獲取磁力鏈接（有上限的並發處理，所有請求共用全域速率限制）
+
+        Args:
+            movie_codes: 已正規化、去重後的番號列表
+            max_workers: 最大並發數
+            filter_tags: 選擇前先套用的標籤過濾
+            on_result: 每完成一部影片即回呼（依完成順序），用於串流寫入導出檔
+        """
+        results = []
+        if not movie_codes:
+            return results
+
+        max_workers = max(1, min(max_workers, len(movie_codes)))
+        self.logger.info(f"開始批量處理 {len(movie_codes)} 個番號（並發數: {max_workers}）")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._resolve_code, code, filter_tags): code
+                for code in movie_codes
+            }
+            for future in as_completed(futures):
+                code = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.logger.warning(f"處理番號 {code} 失敗: {e}")
+                    result = {
+                        'code': code, 'detail_url': '', 'magnet_links': [],
+                        'total_magnets': 0, 'filtered_magnets': 0, 'error': str(e)
+                    }
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        found = sum(1 for r in results if r['magnet_links'])
+        self.logger.info(f"批量處理完成：{found}/{len(results)} 個番號取得磁力鏈接")
+        return results
+
+    def reparse_archive(self, archive: HtmlArchive, date: Optional[str] = None,
+                        max_workers: Optional[int] = None, filter_tags: Optional[List[str]] = None,
+                        on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """以封存的詳情頁重新解析並選擇磁力鏈接，不發送任何請求
+
+        解析為 CPU 密集工作，以多個子程序並行（max_workers 預設為 CPU 核心數）；
+        每個 URL 只取最新一份封存，date 可指定只處理某一天（YYYY-MM-DD）的封存
+        """
+        entries = [e for e in archive.entries(date=date) if endpoint_of(e['url']) == 'detail']
+        self.logger.info(f"從封存重新解析 {len(entries)} 個詳情頁")
+        results = []
+        if not entries:
+            return results
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_reparse_worker) as executor:
+            futures = {
+                executor.submit(_reparse_entry, archive.directory, entry, filter_tags): entry
+                for entry in entries
+            }
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.logger.warning(f"重新解析 {entry['url']} 失敗: {e}")
+                    result = {
+                        'code': '', 'detail_url': entry['url'], 'archived_date': entry['date'],
+                        'magnet_links': [], 'total_magnets': 0, 'filtered_magnets': 0, 'error': str(e)
+                    }
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        found = sum(1 for r in results if r['magnet_links'])
+        self.logger.info(f"重新解析完成：{found}/{len(results)} 個詳情頁取得磁力鏈接")
+        return results
+
     def export_magnets_to_file(self, results: List[Dict[str, Any]], 
                               filename: str = None) -> str:
         """導出磁力鏈接到文件"""
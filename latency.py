@@ -0,0 +1,87 @@
+"""
+延遲追蹤
+依端點（排行榜、搜索、詳情頁）記錄最近的回應時間，計算 p50/p95，
+用於依實際表現設定逾時，以及決定何時送出對沖（hedged）請求
+"""
+import threading
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+def endpoint_of(url: str) -> str:
+    """將 URL 歸類為端點名稱：rankings / search / detail / other"""
+    path = urlparse(url).path
+    if path.startswith('/rankings'):
+        return 'rankings'
+    if path.startswith('/search'):
+        return 'search'
+    if path.startswith('/v/'):
+        return 'detail'
+    return 'other'
+
+
+class LatencyTracker:
+    """各端點的延遲統計（滑動視窗）"""
+
+    def __init__(self, window: int = 50, min_samples: int = 5, default_timeout: float = 30.0,
+                 min_timeout: float = 5.0, timeout_multiplier: float = 3.0):
+        self.window = window
+        self.min_samples = min_samples
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, latency: float):
+        """記錄一次成功回應的耗時（秒）"""
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def percentile(self, endpoint: str, q: float) -> Optional[float]:
+        """端點延遲的第 q 百分位（0~100），樣本不足時回傳 None"""
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def overall_percentile(self, q: float) -> Optional[float]:
+        """所有端點合併後的第 q 百分位，無樣本時回傳 None"""
+        with self._lock:
+            ordered = sorted(x for samples in self._samples.values() for x in samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+    def timeout_for(self, endpoint: str) -> float:
+        """依 p95 設定逾時（p95 × 倍數，介於 min_timeout 與 default_timeout 之間）"""
+        p95 = self.percentile(endpoint, 95)
+        if p95 is None:
+            return self.default_timeout
+        return max(self.min_timeout, min(self.default_timeout, p95 * self.timeout_multiplier))
+
+    def hedge_delay(self, endpoint: str) -> Optional[float]:
+        """超過此秒數仍未回應即送出對沖請求（p95），樣本不足時不對沖"""
+        return self.percentile(endpoint, 95)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各端點的 p50 / p95 / 樣本數"""
+        with self._lock:
+            endpoints = list(self._samples.keys())
+        result = {}
+        for endpoint in endpoints:
+            with self._lock:
+                count = len(self._samples[endpoint])
+            result[endpoint] = {
+                'p50': self.percentile(endpoint, 50) or 0.0,
+                'p95': self.percentile(endpoint, 95) or 0.0,
+                'samples': count
+            }
+        return result
@@ -0,0 +1,249 @@
+"""
+請求與解析指標
+以計數器與直方圖記錄每次抓取（端點、狀態、位元組、延遲、重試、Playwright 備援、快取命中）
+與解析耗時、每頁項目數，輸出為 Prometheus 文字格式：
+  METRICS_TEXTFILE=路徑  執行結束時寫入文字檔（供 node_exporter textfile collector 讀取）
+  METRICS_PORT=埠號      啟動本地 HTTP 伺服器，於 /metrics 提供即時指標
+"""
+import functools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1024, 8192, 32768, 131072, 524288, 2097152)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0)
+ITEMS_BUCKETS = (0, 1, 5, 10, 20, 30, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不減的計數器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """所有標籤組合的合計"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """累積分桶的直方圖（與 Prometheus histogram 相同的 _bucket/_sum/_count 輸出）"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # key -> [各桶計數（非累積）, 總和, 次數]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(e[0]), e[1], e[2])) for key, e in self._values.items())
+        for key, (counts, total, count) in items:
+            base = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _format_labels(base + [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(base)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(base)} {count}"
+
+
+class MetricsRegistry:
+    """指標集合，負責輸出文字格式、寫入文字檔與提供 /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指標已存在: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文字格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """原子寫入文字檔（先寫 .tmp 再改名，避免 collector 讀到一半的內容）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """在背景執行緒啟動 /metrics 伺服器（重複呼叫回傳同一個伺服器）"""
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        thread.start()
+        return self._server
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.counter(
+    'javdb_requests_total', 'HTTP 請求次數（status 為 HTTP 狀態碼，無回應時為 error）', ('endpoint', 'status'))
+REQUEST_LATENCY = REGISTRY.histogram(
+    'javdb_request_latency_seconds', '單次 HTTP 請求延遲（秒）', ('endpoint',), LATENCY_BUCKETS)
+RESPONSE_BYTES = REGISTRY.histogram(
+    'javdb_response_bytes', '回應內容大小（位元組）', ('endpoint',), BYTES_BUCKETS)
+RETRIES = REGISTRY.counter(
+    'javdb_retries_total', '失敗後重試的次數', ('endpoint',))
+FAILURES = REGISTRY.counter(
+    'javdb_request_failures_total', '重試用盡仍失敗的請求數', ('endpoint',))
+PLAYWRIGHT_FALLBACKS = REGISTRY.counter(
+    'javdb_playwright_fallback_total', 'Playwright 備援次數（result 為 success/failure）', ('result',))
+CACHE_LOOKUPS = REGISTRY.counter(
+    'javdb_cache_lookups_total', '快取查詢（cache: tracker 已爬取記錄 / clearance 通關憑證；result: hit/miss）',
+    ('cache', 'result'))
+PARSE_SECONDS = REGISTRY.histogram(
+    'javdb_parse_seconds', '頁面解析耗時（秒）', ('page',), PARSE_BUCKETS)
+ITEMS_PER_PAGE = REGISTRY.histogram(
+    'javdb_items_per_page', '每頁解析出的項目數（影片或磁力鏈接）', ('page',), ITEMS_BUCKETS)
+
+
+def timed_parse(page: str) -> Callable:
+    """裝飾解析函式：記錄解析耗時與回傳列表的長度"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            PARSE_SECONDS.observe(time.perf_counter() - start, page=page)
+            ITEMS_PER_PAGE.observe(len(result) if result is not None else 0, page=page)
+            return result
+        return wrapper
+    return decorator
+
+
+def start_from_env() -> Optional[ThreadingHTTPServer]:
+    """METRICS_PORT 有設定時啟動 /metrics 伺服器"""
+    port = os.getenv('METRICS_PORT', '').strip()
+    if not port:
+        return None
+    return REGISTRY.serve(int(port), os.getenv('METRICS_HOST', '127.0.0.1'))
+
+
+def write_textfile_from_env() -> Optional[str]:
+    """METRICS_TEXTFILE 有設定時寫入文字檔，回傳路徑"""
+    path = os.getenv('METRICS_TEXTFILE', '').strip()
+    if not path:
+        return None
+    REGISTRY.write_textfile(path)
+    return path
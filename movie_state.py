@@ -0,0 +1,210 @@
+"""
+已爬取影片的磁力狀態（SQLite）
+記錄每部影片（基礎番號）的詳情頁 URL、目前所有磁力的 infohash、選出磁力的評分與詳情頁的快取驗證標頭
+（ETag / Last-Modified），供 refresh 模式重新檢查時以條件請求抓取，並只輸出比原本更好的磁力
+
+評分（magnet_score）：高清 +2、字幕 +1，同時有高清與字幕（3 分）比只有高清（2 分）更好；
+記錄的基準評分一律取可選磁力中的最高分（best_magnet），與首次爬取實際寫入哪一個無關，
+refresh 也依同一規則選出磁力，因此未變動的頁面不會被誤判為升級
+（_filter_magnets_by_priority 只取第一個高清，不看字幕）
+
+重新檢查排程：每次檢查後依是否變動調整間隔（變動時回到最短間隔，未變動時加倍，直到最長間隔），
+到期的影片再依變動率、排名與逾期程度排序，請求額度優先給最近常變動、排名高的影片
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+HD_TAGS = ('高清', 'HD', '4K', '1080p', '720p')
+SUBTITLE_TAGS = ('字幕', 'Subtitle')
+
+_BTIH = re.compile(r'btih:([0-9a-fA-F]{40}|[A-Za-z2-7]{32})')
+
+RANK_HORIZON = 30  # 排名加權只作用在前幾名
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    code TEXT PRIMARY KEY,
+    detail_url TEXT,
+    title TEXT,
+    rank INTEGER,
+    infohashes TEXT NOT NULL DEFAULT '[]',
+    best_score INTEGER NOT NULL DEFAULT -1,
+    best_hash TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    first_seen REAL NOT NULL,
+    last_checked REAL NOT NULL,
+    last_changed REAL NOT NULL,
+    checks INTEGER NOT NULL DEFAULT 1,
+    changes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS movies_checked ON movies (last_checked);
+"""
+# 後來加入的欄位（舊的狀態文件開啟時補上）
+_COLUMNS = {
+    'check_interval': "REAL NOT NULL DEFAULT 0",
+    'next_check': "REAL NOT NULL DEFAULT 0",
+}
+
+
+def magnet_score(magnet) -> int:
+    """磁力的選擇評分（高清 +2、字幕 +1）"""
+    tags = magnet.tags or []
+    return 2 * any(tag in tags for tag in HD_TAGS) + any(tag in tags for tag in SUBTITLE_TAGS)
+
+
+def best_magnet(magnets: List) -> Optional[Any]:
+    """評分最高的磁力（同分取列表中較前者），沒有磁力時返回 None"""
+    return max(magnets, key=magnet_score) if magnets else None
+
+
+def next_interval(interval: float, changed: bool, min_interval: float, max_interval: float) -> float:
+    """下次檢查的間隔：變動時（或尚無間隔）回到最短間隔，未變動時加倍，不超過最長間隔"""
+    if changed or interval <= 0:
+        return min_interval
+    return min(interval * 2, max_interval)
+
+
+def recrawl_priority(state: Dict[str, Any], now: float) -> float:
+    """到期影片的重新檢查優先度：變動率（平滑後）× 排名加權（第 1 名約 2 倍）× 逾期倍數"""
+    change_rate = (state['changes'] + 1) / (state['checks'] + 2)
+    rank = state.get('rank') or RANK_HORIZON
+    rank_weight = 1 + max(0, RANK_HORIZON - rank) / RANK_HORIZON
+    overdue = (now - state['last_checked']) / max(state['check_interval'], 1.0)
+    return change_rate * rank_weight * overdue
+
+
+def infohash_of(magnet) -> str:
+    """磁力鏈接的 infohash（小寫），取不到時以 URL 代替"""
+    url = magnet.magnet_url or magnet.copy_url or ''
+    match = _BTIH.search(url)
+    return match.group(1).lower() if match else url.strip()
+
+
+class MovieStateStore:
+    """以 SQLite 文件保存各影片的磁力狀態（多程序可共用）"""
+
+    def __init__(self, path: str, min_interval: float = 12 * 3600.0, max_interval: float = 7 * 86400.0):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+            existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(movies)")}
+            for column, definition in _COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE movies ADD COLUMN {column} {definition}")
+
+    @classmethod
+    def from_env(cls, path: Optional[str] = None) -> "MovieStateStore":
+        """MOVIE_STATE_DB（預設 movie_state.db）、REFRESH_MIN_INTERVAL / REFRESH_MAX_INTERVAL（小時，預設 12 / 168）"""
+        try:
+            min_hours = float(os.getenv('REFRESH_MIN_INTERVAL', '12'))
+        except ValueError:
+            min_hours = 12.0
+        try:
+            max_hours = float(os.getenv('REFRESH_MAX_INTERVAL', '168'))
+        except ValueError:
+            max_hours = 168.0
+        return cls(path or os.getenv('MOVIE_STATE_DB', 'movie_state.db'), min_hours * 3600, max_hours * 3600)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM movies WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            return None
+        state = dict(row)
+        state['infohashes'] = json.loads(state['infohashes'])
+        return state
+
+    def states(self, codes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """多部影片的狀態（沒有記錄的番號不在結果中）"""
+        result = {}
+        for code in codes:
+            state = self.get(code)
+            if state is not None:
+                result[code] = state
+        return result
+
+    def due(self, states: Iterable[Dict[str, Any]], now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """已到下次檢查時間的影片，依重新檢查優先度由高到低排序"""
+        now = time.time() if now is None else now
+        due = [state for state in states if state['next_check'] <= now]
+        due.sort(key=lambda state: recrawl_priority(state, now), reverse=True)
+        return due
+
+    def record(self, code: str, movie: Dict[str, Any], magnet_links: List, candidates: List,
+               etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """記錄一次抓取結果（首次爬取或重新檢查），返回磁力集合是否與上次不同
+
+        candidates 為可選的磁力（已套用標籤過濾），基準評分取其中最高分者（best_magnet）
+        """
+        now = time.time()
+        hashes = sorted({infohash_of(magnet) for magnet in magnet_links})
+        best = best_magnet(candidates)
+        score = magnet_score(best) if best is not None else -1
+        best_hash = infohash_of(best) if best is not None else None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT infohashes, check_interval FROM movies WHERE code = ?",
+                                         (code,)).fetchone()
+                if row is None:
+                    changed = False
+                    self._conn.execute(
+                        "INSERT INTO movies (code, detail_url, title, rank, infohashes, best_score, best_hash, "
+                        "etag, last_modified, first_seen, last_checked, last_changed, check_interval, next_check) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (code, movie.get('detail_url'), movie.get('title'), movie.get('rank'), json.dumps(hashes),
+                         score, best_hash, etag, last_modified, now, now, now,
+                         self.min_interval, now + self.min_interval))
+                else:
+                    changed = json.loads(row['infohashes']) != hashes
+                    interval = next_interval(row['check_interval'], changed, self.min_interval, self.max_interval)
+                    self._conn.execute(
+                        "UPDATE movies SET detail_url = COALESCE(?, detail_url), title = COALESCE(?, title), "
+                        "rank = COALESCE(?, rank), infohashes = ?, etag = ?, last_modified = ?, last_checked = ?, "
+                        "checks = checks + 1, check_interval = ?, next_check = ?, "
+                        "last_changed = CASE WHEN ? THEN ? ELSE last_changed END, changes = changes + ?, "
+                        "best_score = CASE WHEN ? > best_score THEN ? ELSE best_score END, "
+                        "best_hash = CASE WHEN ? > best_score THEN ? ELSE best_hash END "
+                        "WHERE code = ?",
+                        (movie.get('detail_url'), movie.get('title'), movie.get('rank'), json.dumps(hashes),
+                         etag, last_modified, now, interval, now + interval, changed, now, int(changed),
+                         score, score, score, best_hash, code))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return changed
+
+    def touch(self, code: str) -> None:
+        """條件請求回應 304（頁面未變動）時只更新檢查時間，並拉長下次檢查的間隔"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT check_interval FROM movies WHERE code = ?", (code,)).fetchone()
+                if row is not None:
+                    interval = next_interval(row['check_interval'], False, self.min_interval, self.max_interval)
+                    self._conn.execute(
+                        "UPDATE movies SET last_checked = ?, checks = checks + 1, check_interval = ?, next_check = ? "
+                        "WHERE code = ?", (now, interval, now + interval, code))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
@@ -0,0 +1,134 @@
+"""
+頁面版面指紋
+以排行榜/詳情頁主要容器與第一個項目的標籤與 class 骨架計算雜湊，與已知正常的指紋比較；
+網站改版時解析器會返回空結果或悄悄落入全頁正則回退，連續數頁指紋異常且沒有以選擇器解析出項目
+即停止（或警告）爬取，避免整次執行浪費請求與等待時間
+（經由備用選擇器或舊版表格取得項目的頁面視為正常，只能以正則回退取得項目的頁面仍計為異常）
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional, Set
+
+MISSING = 'missing'
+
+# 各頁面類型的主要容器與項目選擇器（與解析器的第一優先選擇器一致）
+_ANCHORS = {
+    'detail': ('div.magnet-links', 'div[class*="item"]'),
+    'rankings': ('div.movie-list', 'div.item'),
+}
+
+
+class LayoutChangedError(RuntimeError):
+    """連續多頁的版面指紋不符，網站可能已改版"""
+
+
+def _skeleton(element, depth: int, max_children: int = 4) -> str:
+    """標籤與排序後 class 的巢狀骨架（忽略文字與屬性值）"""
+    classes = ".".join(sorted(element.get('class') or []))
+    node = f"{element.name}.{classes}" if classes else element.name
+    if depth <= 0:
+        return node
+    children = [child for child in element.find_all(True, recursive=False)][:max_children]
+    if not children:
+        return node
+    return node + "(" + ",".join(_skeleton(child, depth - 1, max_children) for child in children) + ")"
+
+
+def page_fingerprint(soup, kind: str) -> str:
+    """計算頁面指紋；找不到主要容器時返回 'missing'"""
+    anchor_selector, item_selector = _ANCHORS[kind]
+    anchor = soup.select_one(anchor_selector)
+    if anchor is None:
+        return MISSING
+    item = anchor.select_one(item_selector)
+    skeleton = _skeleton(anchor, 0) + "|" + (_skeleton(item, 3) if item is not None else "-")
+    return hashlib.sha1(skeleton.encode('utf-8')).hexdigest()[:16]
+
+
+class LayoutMonitor:
+    """比對頁面指紋與已知正常的指紋
+
+    - 指紋已知：正常（即使沒有項目，例如影片尚無磁力鏈接）
+    - 指紋未知但解析出項目：視為新的正常版面並記錄到文件
+    - 找不到主要容器但解析出項目（備用選擇器或舊版表格）：正常，不記錄指紋
+    - 只能以全頁正則回退取得項目（degraded）、找不到主要容器且沒有項目，或指紋未知且沒有項目：計為一次異常
+    同一頁面類型連續 tolerance 次異常時：mode=halt 拋出 LayoutChangedError，mode=warn 只記錄錯誤
+    """
+
+    def __init__(self, path: str, tolerance: int = 3, mode: str = 'halt'):
+        self.path = path
+        self.tolerance = max(1, tolerance)
+        self.mode = mode
+        self.logger = logging.getLogger("bt_crawler")
+        self._lock = threading.Lock()
+        self._known: Dict[str, Set[str]] = {}
+        self._misses: Dict[str, int] = {}
+        self.tripped: Optional[str] = None
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional["LayoutMonitor"]:
+        """LAYOUT_CHECK=0 時停用；LAYOUT_FINGERPRINTS、LAYOUT_TOLERANCE、LAYOUT_ON_CHANGE（halt/warn）"""
+        if os.getenv('LAYOUT_CHECK', '1').strip().lower() in ('0', 'false', 'no'):
+            return None
+        try:
+            tolerance = int(os.getenv('LAYOUT_TOLERANCE', '3'))
+        except ValueError:
+            tolerance = 3
+        mode = os.getenv('LAYOUT_ON_CHANGE', 'halt').strip().lower()
+        return cls(os.getenv('LAYOUT_FINGERPRINTS', 'page_fingerprints.json'), tolerance,
+                   'warn' if mode == 'warn' else 'halt')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._known = {kind: set(fps) for kind, fps in data.items()}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"讀取版面指紋文件失敗: {e}")
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({kind: sorted(fps) for kind, fps in self._known.items()}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"保存版面指紋文件失敗: {e}")
+
+    def observe(self, kind: str, soup, items: int, degraded: bool = False) -> str:
+        """記錄一頁的解析結果，返回該頁指紋；degraded 表示項目只能經由正則回退取得"""
+        fingerprint = page_fingerprint(soup, kind)
+        with self._lock:
+            known = self._known.setdefault(kind, set())
+            if fingerprint in known and not degraded:
+                self._misses[kind] = 0
+                return fingerprint
+            if items > 0 and not degraded:
+                self._misses[kind] = 0
+                if fingerprint != MISSING:
+                    known.add(fingerprint)
+                    self._save()
+                    self.logger.info(f"記錄新的{kind}頁版面指紋: {fingerprint}")
+                return fingerprint
+            misses = self._misses.get(kind, 0) + 1
+            self._misses[kind] = misses
+            how = "只能以正則回退解析出" if degraded else "解析出"
+            self.logger.warning(
+                f"{kind}頁版面指紋異常（{fingerprint}，{how} {items} 個項目），連續 {misses}/{self.tolerance} 頁"
+            )
+            if misses >= self.tolerance and self.tripped is None:
+                self.tripped = kind
+                self.logger.error(f"連續 {misses} 個{kind}頁版面不符，網站可能已改版，請更新解析器")
+        self.ensure_ok()
+        return fingerprint
+
+    def ensure_ok(self) -> None:
+        """halt 模式下版面已判定變更時拋出 LayoutChangedError（用於在發送請求前提早停止）"""
+        if self.tripped is not None and self.mode == 'halt':
+            raise LayoutChangedError(f"{self.tripped}頁版面已變更，停止爬取（LAYOUT_ON_CHANGE=warn 可改為只警告）")
@@ -0,0 +1,199 @@
+"""
+效能剖析
+--profile 模式使用：
+  SamplingProfiler     以背景執行緒定時取樣所有執行緒的呼叫堆疊，輸出 collapsed stack 格式
+                       （flamegraph.pl、speedscope、inferno 皆可讀取）
+  cProfile             確定性剖析，輸出 .prof（snakeviz、pstats 可讀取）
+  StageMemoryProfiler  掛在 Tracer 上，以 tracemalloc 記錄每個階段的淨增記憶體、峰值與前幾名配置位置
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+
+_OWN_FILES = (tracemalloc.__file__, __file__)
+
+
+class SamplingProfiler:
+    """取樣剖析器：每 interval 秒擷取一次各執行緒的堆疊並累計次數
+
+    只取樣非 daemon 執行緒（主執行緒、並發查詢與對沖請求的工作執行緒），略過 /metrics 等背景服務；
+    落在剖析器自身（記憶體快照）內的取樣計入 overhead_samples，不寫入火焰圖
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.overhead_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {t.ident: t for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                thread = threads.get(tid)
+                if tid == own or thread is None or thread.daemon:
+                    continue
+                stack = []
+                overhead = False
+                while frame is not None:
+                    # 只在快照期間 StageMemoryProfiler.stage 的框架才會出現在堆疊上
+                    overhead = overhead or (frame.f_code.co_filename == __file__
+                                            and frame.f_code.co_name == 'stage')
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                if overhead:
+                    self.overhead_samples += 1
+                    continue
+                stack.append(thread.name)
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write_collapsed(self, path: str) -> None:
+        """輸出 collapsed stack：每行「frame;frame;... 次數」"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, limit: int = 15) -> List[tuple]:
+        """以堆疊最內層（self time）統計取樣次數最多的函式"""
+        leaf = Counter()
+        for stack, count in self.samples.items():
+            leaf[stack.rsplit(';', 1)[-1]] += count
+        return leaf.most_common(limit)
+
+
+class StageMemoryProfiler:
+    """每個階段前後各取一次 tracemalloc 快照，累計淨增配置最多的程式位置
+
+    快照成本不低（數毫秒至數十毫秒），只在剖析模式使用；並發執行時各階段的數字會互相混入，僅供參考
+    """
+
+    def __init__(self, top: int = 10, frames: int = 1):
+        self.top = top
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+
+    @contextmanager
+    def stage(self, name: str):
+        before = tracemalloc.take_snapshot()
+        current_before, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current_after, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            diffs = after.compare_to(before, 'lineno')
+            with self._lock:
+                entry = self._stages.setdefault(name, {'count': 0, 'net': 0, 'peak': 0, 'sites': Counter()})
+                entry['count'] += 1
+                entry['net'] += current_after - current_before
+                entry['peak'] = max(entry['peak'], peak - current_before)
+                kept = 0
+                for diff in diffs:
+                    frame = diff.traceback[0]
+                    # 排除快照本身與剖析器的配置
+                    if diff.size_diff <= 0 or frame.filename in _OWN_FILES:
+                        continue
+                    entry['sites'][f"{frame.filename}:{frame.lineno}"] += diff.size_diff
+                    kept += 1
+                    if kept >= self.top * 2:
+                        break
+
+    def format_report(self) -> str:
+        lines = []
+        with self._lock:
+            stages = sorted(self._stages.items(), key=lambda item: item[1]['peak'], reverse=True)
+            for name, entry in stages:
+                lines.append(f"[{name}] 次數 {entry['count']}，淨增 {entry['net'] / 1024:.1f} KB，"
+                             f"單次峰值 {entry['peak'] / 1024:.1f} KB")
+                for site, size in entry['sites'].most_common(self.top):
+                    lines.append(f"  {size / 1024:>10.1f} KB  {site}")
+        return "\n".join(lines)
+
+
+def profile_call(func: Callable[[], Any], output_dir: str, mode: str = "sampling",
+                 tracer=None, interval: float = 0.005) -> Dict[str, str]:
+    """在剖析器下執行 func，結果寫入 output_dir，回傳 {種類: 路徑}
+
+    mode: sampling（取樣，輸出 cpu.collapsed）或 cprofile（確定性，輸出 cpu.prof）
+    tracer: 若提供 Tracer，會掛上 StageMemoryProfiler 並輸出 memory.txt
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {}
+    memory = None
+    if tracer is not None:
+        memory = StageMemoryProfiler()
+        memory.start()
+        tracer.observer = memory
+
+    sampler = None
+    profiler = None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        sampler = SamplingProfiler(interval)
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        func()
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            outputs['cpu'] = os.path.join(output_dir, 'cpu.prof')
+            profiler.dump_stats(outputs['cpu'])
+        if sampler is not None:
+            sampler.stop()
+            outputs['cpu'] = os.path.join(output_dir, 'cpu.collapsed')
+            sampler.write_collapsed(outputs['cpu'])
+            outputs['top'] = os.path.join(output_dir, 'top_functions.txt')
+            with open(outputs['top'], 'w', encoding='utf-8') as f:
+                f.write(f"取樣 {sampler.sample_count} 次，耗時 {elapsed:.2f} 秒，"
+                        f"剖析器自身開銷 {sampler.overhead_samples} 次（已排除）\n")
+                for name, count in sampler.top_functions():
+                    f.write(f"{count:>8}  {name}\n")
+        if memory is not None:
+            tracer.observer = None
+            outputs['memory'] = os.path.join(output_dir, 'memory.txt')
+            with open(outputs['memory'], 'w', encoding='utf-8') as f:
+                f.write(memory.format_report() + "\n")
+            memory.stop()
+    return outputs
@@ -0,0 +1,99 @@
+"""
+排行榜爬取計畫
+以多個 (類別, 期間) 排行榜來源組成一次爬取：各排行榜頁並發抓取，依番號合併去重後才排程詳情頁，
+同一部影片出現在日榜/週榜/月榜或不同類別時只抓取一次詳情頁
+
+來源格式: 類別:期間（逗號分隔），例如 censored:monthly,censored:weekly,uncensored:daily
+"""
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+CATEGORIES = ('censored', 'uncensored', 'western')
+PERIODS = ('daily', 'weekly', 'monthly')
+
+CATEGORY_NAMES = {'censored': '有碼', 'uncensored': '無碼', 'western': '歐美'}
+PERIOD_NAMES = {'daily': '日榜', 'weekly': '週榜', 'monthly': '月榜'}
+
+
+class RankingSource:
+    """一個排行榜來源（對應 /rankings/movies?t=<category>&p=<period>）"""
+
+    def __init__(self, category: str = 'censored', period: str = 'monthly'):
+        if category not in CATEGORIES:
+            raise ValueError(f"未知的排行榜類別: {category}（可用: {', '.join(CATEGORIES)}）")
+        if period not in PERIODS:
+            raise ValueError(f"未知的排行榜期間: {period}（可用: {', '.join(PERIODS)}）")
+        self.category = category
+        self.period = period
+
+    @property
+    def key(self) -> str:
+        return f"{self.category}:{self.period}"
+
+    @property
+    def display_name(self) -> str:
+        return CATEGORY_NAMES[self.category] + PERIOD_NAMES[self.period]
+
+    def params(self, page: int = 1) -> Dict[str, Any]:
+        return {"p": self.period, "t": self.category, "page": page}
+
+    def __eq__(self, other):
+        return isinstance(other, RankingSource) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"RankingSource({self.key!r})"
+
+
+DEFAULT_SOURCE = RankingSource('censored', 'monthly')
+
+
+def parse_sources(value: str) -> List[RankingSource]:
+    """解析來源字串（類別:期間，逗號分隔；只寫期間時類別預設為 censored），重複的來源只保留一個"""
+    sources: List[RankingSource] = []
+    for token in value.split(','):
+        token = token.strip().lower()
+        if not token:
+            continue
+        category, _, period = token.rpartition(':')
+        source = RankingSource(category or 'censored', period)
+        if source not in sources:
+            sources.append(source)
+    return sources
+
+
+def merge_rankings(ranked_lists: List[tuple], key_of: Callable[[Dict[str, Any]], str]) -> List[Dict[str, Any]]:
+    """合併多個排行榜並依番號去重
+
+    ranked_lists: [(RankingSource, 影片列表), ...]，依來源順序
+    key_of: 影片的去重鍵（基礎番號，無有效番號時用詳情頁 URL）
+    同一部影片保留第一次出現的資料，movie['sources'] 記錄出現的來源與名次；
+    結果依最佳名次排序（同名次依來源順序），rank 重新編號
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    order: Dict[str, tuple] = {}
+    for source_index, (source, movies) in enumerate(ranked_lists):
+        for movie in movies:
+            key = key_of(movie)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = dict(movie)
+                entry['sources'] = []
+                order[key] = (movie['rank'], source_index)
+            else:
+                order[key] = min(order[key], (movie['rank'], source_index))
+            entry['sources'].append(f"{source.key}#{movie['rank']}")
+    result = [merged[key] for key in sorted(merged, key=order.get)]
+    for rank, movie in enumerate(result, 1):
+        movie['rank'] = rank
+    return result
+
+
+def sources_from_env(default: Optional[List[RankingSource]] = None) -> List[RankingSource]:
+    """讀取 RANKING_SOURCES（未設定時使用 default，預設為有碼月榜）"""
+    value = os.getenv('RANKING_SOURCES', '').strip()
+    if value:
+        return parse_sources(value)
+    return list(default or [DEFAULT_SOURCE])
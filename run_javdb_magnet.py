@@ -86,7 +86,8 @@ def main():
     print(f"\n正在獲取有碼月榜前{top_count}的磁力鏈接...")
     print("這可能需要幾分鐘時間，請耐心等待...\n")
     
-    cmd_args = ['javdb_magnet_cli.py', 'top30', '--rank-type', 'monthly']
+    # 不指定 --rank-type，讓配置文件的 RANKING_SOURCES 生效（未設定時為有碼月榜）
+    cmd_args = ['javdb_magnet_cli.py', 'top30']
     if filter_tags:
         cmd_args.extend(['--filter', ','.join(filter_tags)])
     
@@ -0,0 +1,62 @@
+"""多個 DuplicateTracker 共用同一記錄文件：刪除不應被其他程序的舊資料復活"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from duplicate_tracker import DuplicateTracker
+
+
+def _days_ago(days: float) -> str:
+    return (datetime.now() - timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / 'scraped_movies.json')
+    seed = DuplicateTracker(path)
+    seed.mark_as_scraped('ABC-001', _days_ago(30))
+    seed.mark_as_scraped('XYZ-002', _days_ago(20))
+    seed.mark_as_scraped('OTH-200', _days_ago(2))
+    seed.mark_as_scraped('MOR-300', _days_ago(1))
+    seed.save_data()
+    return path
+
+
+def _codes(path):
+    return set(DuplicateTracker(path).scraped_data['scraped_movies'])
+
+
+def test_delete_then_save_from_stale_tracker(db_file):
+    stale = DuplicateTracker(db_file)
+    stale.scraped_data  # 載入完整記錄後才由另一個程序刪除
+    cleaner = DuplicateTracker(db_file)
+    assert cleaner.clear_old_records(days=7) == 2
+    cleaner._auto_cleanup(max_records=1)
+    assert _codes(db_file) == {'MOR-300'}
+
+    stale.mark_and_save('NEW-100')
+
+    assert _codes(db_file) == {'MOR-300', 'NEW-100'}
+    assert not stale.is_already_scraped('ABC-001')
+    assert stale.is_already_scraped('NEW-100')
+
+
+def test_remark_after_delete_survives_merge(db_file):
+    cleaner = DuplicateTracker(db_file)
+    cleaner.clear_old_records(days=7)
+    other = DuplicateTracker(db_file)
+    other.mark_and_save('ABC-001')  # 刪除後重新爬取，時間比墓碑新
+
+    cleaner.mark_and_save('NEW-100')
+
+    assert _codes(db_file) == {'ABC-001', 'OTH-200', 'MOR-300', 'NEW-100'}
+
+
+def test_tombstones_are_capped(db_file):
+    tracker = DuplicateTracker(db_file)
+    tracker.max_records = 2
+    for i in range(5):
+        tracker.mark_as_scraped(f"CAP-{i:03d}", _days_ago(10 - i))
+    tracker.save_data()
+    tracker._auto_cleanup(max_records=2)
+    assert len(tracker.scraped_data['removed']) <= 2
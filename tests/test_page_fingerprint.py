@@ -0,0 +1,56 @@
+"""版面指紋監控：備用選擇器取得項目的頁面視為正常，只能以正則回退取得項目的頁面視為改版"""
+import os
+
+import pytest
+
+from javdb_magnet_crawler import JavDBMagnetCrawler
+from page_fingerprint import LayoutChangedError, LayoutMonitor
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'corpus')
+
+
+def _corpus(name: str) -> str:
+    with open(os.path.join(CORPUS_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    crawler = JavDBMagnetCrawler()
+    crawler.layout_monitor = LayoutMonitor(str(tmp_path / 'fingerprints.json'), tolerance=2)
+    return crawler
+
+
+def test_legacy_table_pages_do_not_trip(crawler):
+    html = _corpus('detail_legacy_table.html')
+    for _ in range(crawler.layout_monitor.tolerance + 2):
+        magnets = crawler._parse_magnet_links_page(html, 'https://javdb.com/v/test')
+        assert magnets
+    assert crawler.layout_monitor.tripped is None
+
+
+def test_regex_fallback_pages_trip(crawler):
+    html = _corpus('detail_regex_only.html')
+    with pytest.raises(LayoutChangedError):
+        for _ in range(crawler.layout_monitor.tolerance):
+            crawler._parse_magnet_links_page(html, 'https://javdb.com/v/test')
+    assert crawler.layout_monitor.tripped == 'detail'
+
+
+def test_regex_fallback_does_not_reset_misses(crawler):
+    """正則回退的頁面夾在異常頁面之間時不能重置連續異常計數"""
+    error_html = _corpus('error_login.html')
+    regex_html = _corpus('detail_regex_only.html')
+    crawler.layout_monitor.mode = 'warn'
+    crawler._parse_magnet_links_page(error_html, 'https://javdb.com/v/test')
+    assert crawler._parse_magnet_links_page(regex_html, 'https://javdb.com/v/test')
+    assert crawler.layout_monitor.tripped == 'detail'
+
+
+def test_pages_without_items_still_trip(crawler):
+    html = _corpus('error_login.html')
+    with pytest.raises(LayoutChangedError):
+        for _ in range(crawler.layout_monitor.tolerance):
+            crawler._parse_magnet_links_page(html, 'https://javdb.com/v/test')
+    assert crawler.layout_monitor.tripped == 'detail'
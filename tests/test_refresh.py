@@ -0,0 +1,55 @@
+"""refresh 與首次爬取使用同一評分基準：未變動的頁面不應被判定為升級"""
+import pytest
+
+from javdb_magnet_crawler import JavDBMagnetManager, MagnetLink
+
+
+def _magnet(infohash: str, tags):
+    magnet = MagnetLink()
+    magnet.title = f"ABC-001 {infohash[:4]}"
+    magnet.tags = list(tags)
+    magnet.magnet_url = f"magnet:?xt=urn:btih:{infohash}"
+    return magnet
+
+
+HD = _magnet('a' * 40, ['高清'])
+HD_SUB = _magnet('b' * 40, ['高清', '字幕'])
+MOVIE = {'rank': 1, 'code': 'ABC-001', 'title': 'ABC-001 test', 'detail_url': 'https://javdb.com/v/abc'}
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    monkeypatch.setenv('DELAY_SCALE', '0')
+    monkeypatch.setenv('REFRESH_MIN_INTERVAL', '0')
+    monkeypatch.setenv('LAYOUT_CHECK', '0')
+    manager = JavDBMagnetManager()
+    crawler = manager.crawler
+    monkeypatch.setattr(manager, '_fetch_rankings_plan', lambda sources, limit: [dict(MOVIE)])
+    monkeypatch.setattr(crawler, 'fetch_movie_page_conditional',
+                        lambda url, etag=None, last_modified=None: (200, '<html></html>', {}))
+    return manager
+
+
+def _serve(manager, monkeypatch, magnets):
+    monkeypatch.setattr(manager.crawler, '_parse_magnet_links_page', lambda html, url: list(magnets))
+
+
+def test_unchanged_page_is_not_an_upgrade(manager, monkeypatch):
+    # 首次爬取寫入第一個高清磁力，但字幕高清版已在列表中
+    _serve(manager, monkeypatch, [HD, HD_SUB])
+    results = manager.get_top30_magnets(limit=1)
+    assert [r['magnet_links'][0] for r in results] == [HD]
+
+    assert manager.refresh_tracked(days=1, budget=10, filename='magnet/url_list_refresh.txt') == []
+
+
+def test_new_subtitled_release_is_an_upgrade(manager, monkeypatch):
+    _serve(manager, monkeypatch, [HD])
+    manager.get_top30_magnets(limit=1)
+
+    _serve(manager, monkeypatch, [HD, HD_SUB])
+    upgrades = manager.refresh_tracked(days=1, budget=10, filename='magnet/url_list_refresh.txt')
+    assert [u['magnet_links'][0] for u in upgrades] == [HD_SUB]
+    assert upgrades[0]['previous_score'] == 2
@@ -0,0 +1,43 @@
+"""工作佇列重新加入：已完成但尚未套用的結果不能被覆蓋"""
+import pytest
+
+from work_queue import WorkQueue
+
+URL = 'https://javdb.com/v/abc'
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = WorkQueue(str(tmp_path / 'queue.db'), max_attempts=1)
+    yield q
+    q.close()
+
+
+def _finish(queue, result):
+    item, = queue.lease('w1')
+    assert queue.complete(item, result)
+
+
+def test_reenqueue_keeps_unapplied_result(queue):
+    assert queue.enqueue(URL, {'code': 'ABC-001'})
+    _finish(queue, {'magnets': ['m1']})
+
+    assert not queue.enqueue(URL, {'code': 'ABC-001'})
+
+    results = queue.unapplied_results()
+    assert [r['result'] for r in results] == [{'magnets': ['m1']}]
+    assert queue.stats()['done'] == 1
+
+
+def test_reenqueue_after_apply_or_failure(queue):
+    queue.enqueue(URL, {'code': 'ABC-001'})
+    _finish(queue, {'magnets': ['m1']})
+    assert queue.mark_applied(queue.unapplied_results()[0]['id'])
+    assert queue.enqueue(URL, {'code': 'ABC-001'})
+
+    item, = queue.lease('w1')
+    assert queue.fail(item, 'timeout')
+    assert queue.stats()['failed'] == 1
+    assert queue.enqueue(URL, {'code': 'ABC-001'})
+    assert queue.stats()['pending'] == 1
+    assert queue.unapplied_results() == []
@@ -0,0 +1,202 @@
+"""
+自適應並發控制
+以 AIMD（加法增、乘法減）根據所有進行中請求的錯誤率與延遲調整並發上限，
+錯誤率突增時啟動斷路器暫停全部請求一段時間，讓爬取維持在網站可承受的最高速率
+"""
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+from clock import Clock, get_clock
+
+
+def is_throttle_signal(status: Optional[int]) -> bool:
+    """是否為網站限流訊號：403/429/5xx 或無回應（逾時、連線錯誤）"""
+    return status is None or status in (403, 429) or status >= 500
+
+
+class CircuitBreaker:
+    """斷路器：closed（正常）-> open（暫停）-> half_open（放行一個探測請求）"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window: int = 20, min_samples: int = 8, error_threshold: float = 0.5,
+                 cooldown: float = 60.0, max_cooldown: float = 600.0):
+        self.window = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self.window:
+            return 0.0
+        return sum(1 for ok in self.window if not ok) / len(self.window)
+
+    def remaining(self, now: float) -> float:
+        """open 狀態剩餘的冷卻秒數"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - now)
+
+    def allow(self, now: float) -> bool:
+        """是否允許發出請求（呼叫端需持有控制器的鎖）"""
+        if self.state == self.OPEN and self.remaining(now) <= 0:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, success: bool, now: float, min_cooldown: float = 0.0) -> bool:
+        """記錄結果，回傳是否因此跳閘（呼叫端需持有控制器的鎖）"""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if success:
+                self.state = self.CLOSED
+                self.cooldown = self.base_cooldown
+                self.window.clear()
+                return False
+            # 探測失敗：冷卻時間加倍後重新開啟
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open(now, min_cooldown)
+            return True
+
+        self.window.append(success)
+        if (self.state == self.CLOSED and len(self.window) >= self.min_samples
+                and self.error_rate >= self.error_threshold):
+            self._open(now, min_cooldown)
+            return True
+        return False
+
+    def _open(self, now: float, min_cooldown: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.cooldown = max(self.cooldown, min_cooldown)
+        self.window.clear()
+
+
+class AdaptiveConcurrency:
+    """AIMD 並發控制器
+
+    - 成功且延遲未明顯上升：每累積 limit 次成功，上限 +1
+    - 403/429/5xx/逾時：上限乘以 decrease_factor（同一時間窗只減一次）
+    - 錯誤率超過門檻：斷路器開啟，所有請求等待冷卻
+    """
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 8,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 3.0,
+                 breaker: Optional[CircuitBreaker] = None, clock: Optional[Clock] = None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.breaker = breaker or CircuitBreaker()
+        self.clock = clock or get_clock()
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.latency_floor = None
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveConcurrency":
+        """從環境變數建立控制器（MAX_CONCURRENCY、INITIAL_CONCURRENCY、BREAKER_COOLDOWN）"""
+        def _env(name, default, cast):
+            try:
+                return cast(os.getenv(name, str(default)))
+            except ValueError:
+                return default
+        return cls(
+            initial=_env('INITIAL_CONCURRENCY', 2, int),
+            max_limit=_env('MAX_CONCURRENCY', 8, int),
+            breaker=CircuitBreaker(cooldown=_env('BREAKER_COOLDOWN', 60.0, float))
+        )
+
+    def acquire(self) -> None:
+        """等待直到斷路器允許且進行中請求數低於目前上限"""
+        with self._cond:
+            while True:
+                now = self.clock.monotonic()
+                if self.in_flight < int(self.limit) and self.breaker.allow(now):
+                    self.in_flight += 1
+                    return
+                remaining = self.breaker.remaining(now)
+                if remaining > 0:
+                    # 斷路器冷卻：經由時鐘等待（虛擬時鐘直接推進時間）
+                    self.clock.wait(self._cond, remaining)
+                else:
+                    # 等待其他請求釋放名額，需要實際的通知
+                    self._cond.wait(timeout=1.0)
+
+    def try_acquire(self) -> bool:
+        """不等待地取得名額：斷路器關閉且進行中請求數低於上限時返回 True（用於對沖請求）"""
+        with self._cond:
+            if self.breaker.state == CircuitBreaker.CLOSED and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def cancel(self) -> None:
+        """釋放已取得但未發出請求的名額（不計入結果）"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    def release(self, status: Optional[int], latency: float, retry_after: float = 0.0) -> bool:
+        """回報請求結果並釋放名額，回傳斷路器是否因此跳閘"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = self.clock.monotonic()
+            throttled = is_throttle_signal(status)
+            tripped = self.breaker.record(not throttled, now, min_cooldown=retry_after)
+
+            if throttled:
+                self._successes = 0
+                # 同一批進行中的請求可能同時失敗，約一個延遲週期內只減一次
+                window = self.latency_ewma or 1.0
+                if tripped or now - self._last_decrease >= window:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self._observe_latency(latency)
+                if self.latency_ewma <= self.latency_floor * self.latency_tolerance:
+                    self._successes += 1
+                    if self._successes >= int(self.limit):
+                        self.limit = min(float(self.max_limit), self.limit + 1)
+                        self._successes = 0
+            self._cond.notify_all()
+            return tripped
+
+    def _observe_latency(self, latency: float):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+        if self.latency_floor is None or latency < self.latency_floor:
+            self.latency_floor = max(latency, 1e-3)
+
+    def snapshot(self) -> dict:
+        """目前狀態（供日誌與進度顯示）"""
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'breaker': self.breaker.state,
+                'error_rate': self.breaker.error_rate,
+                'cooldown_remaining': self.breaker.remaining(self.clock.monotonic()),
+                'latency_ewma': self.latency_ewma or 0.0
+            }
@@ -0,0 +1,105 @@
+"""
+階段追蹤
+以輕量的 span 記錄一次爬取中各階段（排行榜抓取、解析、去重、詳情頁抓取/解析、篩選、寫檔、標記保存、延遲）的耗時，
+結束時輸出每階段的總計、平均、p95 與佔總耗時比例，也可匯出 Chrome trace JSON（chrome://tracing、Perfetto 可開啟）
+"""
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from clock import Clock, get_clock
+
+
+class Tracer:
+    """收集 (階段, 開始, 耗時, 執行緒) 紀錄；時間取自時鐘，虛擬時鐘下延遲會以虛擬時間計入"""
+
+    def __init__(self, clock: Optional[Clock] = None):
+        self.clock = clock or get_clock()
+        self._lock = threading.Lock()
+        self._spans: List[Tuple[str, float, float, int]] = []
+        self._start = self.clock.monotonic()
+        # 剖析模式時掛上的觀察者（提供 stage(name) 情境管理器，如 profiling.StageMemoryProfiler）
+        self.observer = None
+
+    def reset(self) -> None:
+        """清除紀錄並以現在作為本次執行的起點"""
+        with self._lock:
+            self._spans.clear()
+            self._start = self.clock.monotonic()
+
+    @contextmanager
+    def span(self, name: str):
+        """記錄一個階段的耗時（例外時仍會記錄）"""
+        observer = self.observer
+        start = self.clock.monotonic()
+        try:
+            if observer is None:
+                yield
+            else:
+                with observer.stage(name):
+                    yield
+        finally:
+            end = self.clock.monotonic()
+            with self._lock:
+                self._spans.append((name, start, end - start, threading.get_ident()))
+
+    def wall_time(self) -> float:
+        """自 reset 起經過的時間"""
+        return self.clock.monotonic() - self._start
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """每階段的次數、總計、平均、p95 與佔總耗時比例（依總計排序）"""
+        with self._lock:
+            spans = list(self._spans)
+        wall = self.wall_time()
+        durations: Dict[str, List[float]] = {}
+        for name, _, duration, _ in spans:
+            durations.setdefault(name, []).append(duration)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            total = sum(values)
+            rows.append({
+                'stage': name,
+                'count': len(values),
+                'total': total,
+                'mean': total / len(values),
+                'p95': values[min(len(values) - 1, math.ceil(0.95 * len(values)) - 1)],
+                'share': total / wall if wall > 0 else 0.0,
+            })
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def format_report(self) -> str:
+        """文字格式的階段耗時表"""
+        lines = [f"{'階段':<16}{'次數':>6}{'總計(s)':>10}{'平均(ms)':>11}{'p95(ms)':>10}{'佔比':>8}"]
+        for row in self.breakdown():
+            lines.append(
+                f"{row['stage']:<16}{row['count']:>6}{row['total']:>10.2f}"
+                f"{row['mean'] * 1000:>11.1f}{row['p95'] * 1000:>10.1f}{row['share'] * 100:>7.1f}%"
+            )
+        lines.append(f"總耗時 {self.wall_time():.2f} 秒")
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path: str) -> None:
+        """匯出 Chrome trace event 格式（complete event，時間單位為微秒）"""
+        with self._lock:
+            spans = list(self._spans)
+            origin = self._start
+        pid = os.getpid()
+        events = [{
+            'name': name,
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': round((start - origin) * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': pid,
+            'tid': tid,
+        } for name, start, duration, tid in spans]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,144 @@
+"""
+已爬取記錄快照（跨主機同步）
+每台主機各自的 scraped_movies.json 可匯出為精簡的二進位快照，複製到其他主機後匯入合併；
+合併規則為「同一基礎番號取較新的時間」，與匯入順序無關、重複匯入也不會改變結果，
+因此多台主機只需互相交換快照，不需要中央服務
+
+快照格式: MAGIC | 標頭長度 (uint32 LE) | 標頭 JSON | zlib(記錄...)
+記錄: 時間 (int64 LE，epoch 微秒) | 番號長度 (uint16 LE) | 番號 (UTF-8)
+
+增量同步：匯出時可只包含某個時間點之後的記錄，標頭的 until 為本次包含的最新時間。
+標記只在對方確認收到後才推進：每個快照的標頭 acks 帶有本機已連續收到的各節點記錄時間，
+匯入對方的快照時以其中給本機的確認更新標記；快照在傳送途中遺失時，下次匯出會重新包含那些記錄
+（重複匯入無副作用）。標記以節點名稱記錄在 <記錄文件>.sync.json
+（標記依記錄時間判斷，從其他主機匯入的較舊記錄不會出現在增量快照中：各主機應兩兩交換，或定期完整匯出）
+
+時間一律以 UTC 的 epoch 微秒保存，匯入後寫回記錄的是帶時區的 UTC 時間字串，不同時區的主機互不影響
+"""
+import json
+import os
+import socket
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+SNAPSHOT_MAGIC = b'JDBTSNP1'
+_RECORD = struct.Struct('<qH')
+
+
+def to_micros(epoch: float) -> int:
+    return int(round(epoch * 1_000_000))
+
+
+def from_micros(micros: int) -> str:
+    """epoch 微秒轉回 ISO 時間字串（UTC，帶時區）"""
+    seconds, micro = divmod(micros, 1_000_000)
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(microsecond=micro).isoformat()
+
+
+def write_snapshot(path: str, records: Iterable[Tuple[str, int]], header: Dict[str, Any]) -> Dict[str, Any]:
+    """寫入快照（records 為 (基礎番號, epoch 微秒)），返回實際寫入的標頭"""
+    body = bytearray()
+    count = 0
+    until = header.get('since', 0)
+    for code, micros in sorted(records):
+        encoded = code.encode('utf-8')
+        body += _RECORD.pack(micros, len(encoded))
+        body += encoded
+        count += 1
+        until = max(until, micros)
+    header = dict(header, version=1, count=count, until=until)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC + len(header_bytes).to_bytes(4, 'little') + header_bytes)
+        f.write(zlib.compress(bytes(body), 6))
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """讀取快照，返回 (標頭, {基礎番號: epoch 微秒})；格式不符時拋出 ValueError"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if raw[:8] != SNAPSHOT_MAGIC:
+        raise ValueError(f"不是已爬取記錄快照: {path}")
+    header_len = int.from_bytes(raw[8:12], 'little')
+    header = json.loads(raw[12:12 + header_len].decode('utf-8'))
+    try:
+        body = zlib.decompress(raw[12 + header_len:])
+    except zlib.error as e:
+        raise ValueError(f"快照已損壞: {path}（{e}）")
+    records: Dict[str, int] = {}
+    offset = 0
+    while offset < len(body):
+        micros, length = _RECORD.unpack_from(body, offset)
+        offset += _RECORD.size
+        code = body[offset:offset + length].decode('utf-8')
+        offset += length
+        # 同一快照內重複的番號也取較新的時間
+        if code not in records or micros > records[code]:
+            records[code] = micros
+    return header, records
+
+
+def node_name() -> str:
+    """本機的節點名稱（SYNC_NODE，預設為主機名）"""
+    return os.getenv('SYNC_NODE') or socket.gethostname()
+
+
+class SyncMarkers:
+    """各同步對象的增量標記（epoch 微秒）
+
+    acked: 對方已確認收到的本機記錄時間，下次匯出給該對象時從這裡繼續
+    received: 已從對方連續收到的記錄時間，匯出時放在快照標頭的 acks 作為給對方的確認
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> Dict[str, Dict[str, int]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        # 舊格式（匯出時即推進、未經確認的標記）捨棄，下次匯出完整重送
+        acked = data.get('acked') if isinstance(data.get('acked'), dict) else {}
+        received = data.get('received') if isinstance(data.get('received'), dict) else {}
+        return {'acked': acked, 'received': received}
+
+    def _write(self, markers: Dict[str, Dict[str, int]]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(markers, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def acked(self, peer: str) -> int:
+        return int(self._read()['acked'].get(peer, 0))
+
+    def received(self) -> Dict[str, int]:
+        return {peer: int(until) for peer, until in self._read()['received'].items()}
+
+    def confirm(self, peer: str, until: int) -> None:
+        """記錄對方確認收到的時間"""
+        markers = self._read()
+        markers['acked'][peer] = max(int(markers['acked'].get(peer, 0)), int(until))
+        self._write(markers)
+
+    def receive(self, peer: str, since: int, until: int) -> bool:
+        """記錄已收到對方 since ~ until 的記錄；與先前收到的範圍不連續時不推進，返回是否推進"""
+        markers = self._read()
+        current = int(markers['received'].get(peer, 0))
+        if since > current:
+            return False
+        markers['received'][peer] = max(current, int(until))
+        self._write(markers)
+        return True
+
+
+def default_snapshot_name(node: Optional[str] = None) -> str:
+    return f"tracker_{node or node_name()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jdbsnap"
@@ -0,0 +1,183 @@
+"""
+url_list 分段儲存
+導出檔依月份輪替為分段文件（magnet/url_list_monthly.txt -> magnet/url_list_monthly.2026-10.txt），
+旁邊的 SQLite 索引（<導出檔>.idx）記錄所有已寫入 URL 的 64-bit 雜湊、各分段的大小與最後寫入的日期標題；
+每次執行的去重查詢走索引、日期標題只讀文件尾端，I/O 與歷史長度無關
+
+輪替前的舊文件（不含月份的原檔名）保留不動，第一次建立索引時一併納入去重
+分段大小與索引記錄不符（手動編輯、寫入中途中斷）時只重新掃描該分段
+"""
+import glob
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (hash INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_header TEXT
+);
+"""
+_TAIL_BYTES = 4096
+
+
+def _url_hash(url: str) -> int:
+    """URL 的 64-bit 雜湊（SQLite INTEGER 為有號整數）"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def _is_header(line: str) -> bool:
+    return line.startswith('20')
+
+
+def _iter_urls(path: str, offset: int = 0) -> Iterable[str]:
+    """讀取分段中 offset 之後的 URL（過濾掉日期標題行）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        f.seek(offset)
+        for line in f:
+            line = line.strip()
+            if line and not _is_header(line):
+                yield line
+
+
+def _last_line(path: str) -> Optional[str]:
+    """只讀取文件尾端，返回最後一個非空行"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - _TAIL_BYTES))
+            tail = f.read()
+    except OSError:
+        return None
+    for line in reversed(tail.decode('utf-8', errors='ignore').splitlines()):
+        if line.strip():
+            return line.strip()
+    return None
+
+
+class UrlListStore:
+    """依月份輪替的 url_list 導出檔與其去重索引
+
+    use_history=False 時不以過去寫入的 URL 去重（已爬取記錄不存在時，避免舊導出檔造成誤判），
+    但仍會把本次寫入的 URL 記錄到索引
+    """
+
+    def __init__(self, path: str, use_history: bool = True, now: Optional[datetime] = None):
+        self.path = path
+        self.use_history = use_history
+        now = now or datetime.now()
+        self.current_date = now.strftime('%Y/%m/%d')
+        stem, ext = os.path.splitext(path)
+        self.segment = f"{stem}.{now.strftime('%Y-%m')}{ext or '.txt'}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._session: Set[int] = set()  # 本次寫入的 URL
+        self._file = None
+        self._needs_header = True
+        self._conn = sqlite3.connect(f"{path}.idx", timeout=30.0, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+        self._sync_segments()
+        self._needs_header = self._header_needed()
+
+    def _segment_files(self):
+        stem, ext = os.path.splitext(self.path)
+        files = glob.glob(glob.escape(stem) + '.[0-9][0-9][0-9][0-9]-[0-9][0-9]' + glob.escape(ext or '.txt'))
+        if os.path.exists(self.path):
+            files.append(self.path)  # 輪替前的舊文件
+        if os.path.exists(self.segment) and self.segment not in files:
+            files.append(self.segment)
+        return files
+
+    def _sync_segments(self) -> None:
+        """讓索引追上分段文件：只掃描大小與記錄不符的分段（通常只有 stat，不讀取內容）"""
+        known = {row[0]: row[1] for row in self._conn.execute("SELECT name, size FROM segments")}
+        for path in self._segment_files():
+            name = os.path.basename(path)
+            size = os.path.getsize(path)
+            recorded = known.get(name)
+            if recorded == size:
+                continue
+            # 變長時只讀新增的部分；變短（被編輯過）時重新掃描整個分段（索引只會多不會少，不影響正確性）
+            offset = recorded if recorded is not None and recorded < size else 0
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR IGNORE INTO urls (hash) VALUES (?)",
+                                       ((_url_hash(url),) for url in _iter_urls(path, offset)))
+                self._conn.execute(
+                    "INSERT INTO segments (name, size, last_header) VALUES (?, ?, NULL) "
+                    "ON CONFLICT(name) DO UPDATE SET size = excluded.size, last_header = NULL", (name, size))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _header_needed(self) -> bool:
+        """目前分段的最後一個非空行不是今天的日期標題時需要寫入（優先使用索引記錄，否則只讀文件尾端）"""
+        if not os.path.exists(self.segment) or os.path.getsize(self.segment) == 0:
+            return True
+        row = self._conn.execute("SELECT size, last_header FROM segments WHERE name = ?",
+                                 (os.path.basename(self.segment),)).fetchone()
+        if row and row[0] == os.path.getsize(self.segment) and row[1]:
+            return row[1] != self.current_date
+        return _last_line(self.segment) != self.current_date
+
+    def contains(self, url: str) -> bool:
+        key = _url_hash(url)
+        if key in self._session:
+            return True
+        if not self.use_history:
+            return False
+        return self._conn.execute("SELECT 1 FROM urls WHERE hash = ?", (key,)).fetchone() is not None
+
+    def write(self, url: str) -> bool:
+        """寫入一個 URL（已寫入過時略過），當天第一次寫入前先寫日期標題；返回是否有寫入"""
+        url = (url or '').strip()
+        if not url or self.contains(url):
+            return False
+        key = _url_hash(url)
+        if self._file is None:
+            self._file = open(self.segment, 'a', encoding='utf-8')
+        # 在索引的寫入鎖內追加文件：共用同一分段的其他程序依序追加，索引更新失敗時截回追加前的大小，
+        # 文件與索引保持一致，連線也不會停留在未結束的交易中
+        self._conn.execute("BEGIN IMMEDIATE")
+        start = None
+        try:
+            self._conn.execute("INSERT OR IGNORE INTO urls (hash) VALUES (?)", (key,))
+            self._file.seek(0, os.SEEK_END)
+            start = self._file.tell()
+            if self._needs_header:
+                self._file.write(f"\n{self.current_date}\n")
+            self._file.write(f"{url}\n")
+            self._file.flush()
+            self._conn.execute(
+                "INSERT INTO segments (name, size, last_header) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET size = excluded.size, last_header = excluded.last_header",
+                (os.path.basename(self.segment), os.path.getsize(self.segment), self.current_date))
+            self._conn.execute("COMMIT")
+        except BaseException:
+            if start is not None:
+                self._file.truncate(start)
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+        self._needs_header = False
+        self._session.add(key)
+        return True
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
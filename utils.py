@@ -1,23 +1,129 @@
 """
 BT網站爬蟲工具 - 工具函數
 """
+import os
 import re
-import time
 import random
 import logging
+import logging.handlers
 import sys
 import io
+import json
+import queue
+import atexit
+import threading
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from fake_useragent import UserAgent
 
-def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> logging.Logger:
-    """設置日誌記錄"""
+from clock import Clock, get_clock
+
+class UTF8StreamHandler(logging.StreamHandler):
+    """控制台處理器 - 確保使用 UTF-8 編碼輸出"""
+
+    def emit(self, record):
+        try:
+            msg = self.format(record)
+            stream = self.stream
+            # 確保編碼正確
+            if hasattr(stream, 'buffer'):
+                stream.buffer.write(msg.encode('utf-8', errors='replace'))
+                stream.buffer.write(b'\n')
+                stream.buffer.flush()
+            else:
+                stream.write(msg)
+                stream.write('\n')
+                stream.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆記錄輸出一行 JSON（LOG_FORMAT=json）"""
+
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """DEBUG（含）以下的記錄依訊息模板取樣：同一模板每 rate 筆只保留 1 筆（第一筆必保留）"""
+
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counts: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate <= 1 or record.levelno > logging.DEBUG:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.rate == 0
+
+
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+def _immutable_args(args) -> bool:
+    """%-參數是否都是不可變的純量（可安全延後格式化）"""
+    if isinstance(args, tuple):
+        return all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args)
+    return isinstance(args, _IMMUTABLE_ARGS)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """將記錄放入佇列，訊息格式化（%-參數代入、例外堆疊）延到背景執行緒進行
+
+    佇列只在本程序內使用，不需要像預設的 prepare 一樣先格式化成可序列化的字串；
+    參數含 dict/list 等可變物件時先在呼叫端格式化，避免背景執行緒讀到已被修改的狀態
+    """
+
+    def prepare(self, record):
+        if record.args and not _immutable_args(record.args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_logging_config: Optional[tuple] = None
+
+
+def _stop_queue_listener():
+    """停止背景寫入執行緒並寫出佇列中剩餘的記錄"""
+    global _queue_listener, _logging_config
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.close()
+        _queue_listener = None
+        _logging_config = None
+
+
+def setup_logging(log_level: Optional[str] = None, log_file: Optional[str] = None,
+                  log_format: Optional[str] = None) -> logging.Logger:
+    """設置日誌記錄
+
+    記錄經由佇列交給背景執行緒寫出，呼叫端不會因編碼與 flush 阻塞。
+    未指定的參數從環境變數讀取：LOG_LEVEL（預設 INFO）、LOG_FILE、LOG_FORMAT（text/json）、
+    LOG_DEBUG_SAMPLE（DEBUG 記錄依模板每 N 筆保留 1 筆，預設 1 全部保留）
+    """
     # 確保控制台支持 UTF-8 編碼
     try:
         if sys.platform == 'win32':
             # Windows 上設置控制台代碼頁為 UTF-8
-            import os
             os.system('chcp 65001 >nul 2>&1')
         
         # 重新配置 stdout/stderr 為 UTF-8
@@ -28,47 +134,57 @@ def setup_logging(log_level: str = "INFO", log_file: Optional[str] = None) -> lo
     except Exception:
         pass  # 如果設置失敗，繼續執行
     
+    log_level = log_level or os.getenv('LOG_LEVEL', 'INFO')
+    log_file = log_file or os.getenv('LOG_FILE') or None
+    log_format = (log_format or os.getenv('LOG_FORMAT', 'text')).lower()
+    try:
+        sample_rate = int(os.getenv('LOG_DEBUG_SAMPLE', '1'))
+    except ValueError:
+        sample_rate = 1
+    
     logger = logging.getLogger("bt_crawler")
-    logger.setLevel(getattr(logging, log_level.upper()))
+    logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
+    
+    # 設定未改變時沿用運作中的背景寫入執行緒
+    global _queue_listener, _logging_config
+    config = (log_file, log_format, sample_rate)
+    if _queue_listener is not None and _logging_config == config and logger.handlers:
+        return logger
     
-    # 清除現有的處理器
+    # 清除現有的處理器（設定改變時先寫完舊佇列）
+    _stop_queue_listener()
     logger.handlers.clear()
     
     # 創建格式化器
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # 控制台處理器 - 確保使用 UTF-8 編碼輸出
-    class UTF8StreamHandler(logging.StreamHandler):
-        def emit(self, record):
-            try:
-                msg = self.format(record)
-                stream = self.stream
-                # 確保編碼正確
-                if hasattr(stream, 'buffer'):
-                    stream.buffer.write(msg.encode('utf-8', errors='replace'))
-                    stream.buffer.write(b'\n')
-                    stream.buffer.flush()
-                else:
-                    stream.write(msg)
-                    stream.write('\n')
-                    stream.flush()
-            except Exception:
-                self.handleError(record)
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
     
     console_handler = UTF8StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # 文件處理器
     if log_file:
         file_handler = logging.FileHandler(log_file, encoding='utf-8')
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    logger.addHandler(queue_handler)
+    _queue_listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _queue_listener.start()
+    _logging_config = config
     
     return logger
 
+atexit.register(_stop_queue_listener)
+
 def get_random_user_agent() -> str:
     """獲取隨機User-Agent"""
     try:
@@ -85,10 +201,55 @@ def get_random_user_agent() -> str:
         ]
         return random.choice(user_agents)
 
-def random_delay(min_delay: float = 1.0, max_delay: float = 3.0) -> None:
-    """隨機延遲"""
-    delay = random.uniform(min_delay, max_delay)
-    time.sleep(delay)
+def random_delay(min_delay: float = 1.0, max_delay: float = 3.0, clock: Optional[Clock] = None) -> None:
+    """隨機延遲（DELAY_SCALE 環境變數可整體縮放，0 表示不延遲，用於本地基準測試）
+
+    睡眠經由時鐘進行（預設為全域時鐘），虛擬時鐘下不會實際等待
+    """
+    try:
+        scale = float(os.environ.get('DELAY_SCALE', '1'))
+    except ValueError:
+        scale = 1.0
+    delay = random.uniform(min_delay, max_delay) * scale
+    if delay > 0:
+        (clock or get_clock()).sleep(delay)
+
+class RateLimiter:
+    """全域請求速率限制器（執行緒安全），確保所有執行緒合計的請求間隔不低於 1/rate 秒"""
+
+    def __init__(self, rate: float = 0.5, clock: Optional[Clock] = None):
+        # rate 為每秒請求數，<= 0 表示不限制
+        self.min_interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.clock = clock or get_clock()
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def pending_delay(self) -> float:
+        """距離下一個可用時段的秒數（不預約）"""
+        with self._lock:
+            return max(0.0, self._next_time - self.clock.monotonic())
+
+    def try_acquire(self) -> bool:
+        """目前已有可用時段時預約並返回 True，否則不等待直接返回 False"""
+        if self.min_interval <= 0:
+            return True
+        with self._lock:
+            now = self.clock.monotonic()
+            if self._next_time > now:
+                return False
+            self._next_time = now + self.min_interval
+            return True
+
+    def wait(self) -> None:
+        """等待直到允許發出下一個請求（先預約時段再睡眠，避免持鎖睡眠）"""
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = self.clock.monotonic()
+            wait_time = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.min_interval
+        if wait_time > 0:
+            self.clock.sleep(wait_time)
 
 def parse_size(size_str: str) -> Optional[int]:
     """解析文件大小字符串為字節數"""
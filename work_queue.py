@@ -0,0 +1,218 @@
+"""
+分散式爬取工作佇列（SQLite）
+coordinator 將排行榜中的詳情頁 URL 放入佇列，任意數量的 worker（同一台或透過共享磁碟的其他主機）
+租用（lease）工作項目、抓取並解析後回報結果；租約逾時的項目會被其他 worker 重新租用，
+失敗的項目重試到 max_attempts 為止
+
+每個項目只接受持有目前租約（token）的 worker 回報一次結果；coordinator 套用結果（寫檔、標記已爬取）
+後將項目標記為 applied，因此即使 worker 逾時後才回報，也不會重複標記
+
+狀態: pending -> leased -> done（-> applied）/ 回到 pending 重試 / failed
+已失敗或結果已套用（applied）的 URL 再次加入佇列時重置為 pending，重新計算重試次數；
+已完成但 coordinator 尚未套用的結果保留，不會被重新加入覆蓋
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    applied INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_expires);
+"""
+
+
+class WorkItem:
+    """一個已租用的工作項目"""
+
+    def __init__(self, item_id: int, url: str, payload: Dict[str, Any], token: str, attempts: int):
+        self.id = item_id
+        self.url = url
+        self.payload = payload
+        self.token = token
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"WorkItem({self.id}, {self.url!r}, attempts={self.attempts})"
+
+
+class WorkQueue:
+    """以 SQLite 文件實作的租約式工作佇列（多程序、多主機共用同一文件）
+
+    時間使用牆上時鐘（time.time），各主機需大致對時；租約長度應明顯大於單一項目的處理時間
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None：自行以 BEGIN IMMEDIATE 控制交易，租用時先取得寫入鎖避免兩個 worker 拿到同一項目
+        self._conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls, path: Optional[str] = None) -> "WorkQueue":
+        """QUEUE_DB（預設 crawl_queue.db）、QUEUE_LEASE_SECONDS、QUEUE_MAX_ATTEMPTS"""
+        try:
+            lease_seconds = float(os.getenv('QUEUE_LEASE_SECONDS', '300'))
+        except ValueError:
+            lease_seconds = 300.0
+        try:
+            max_attempts = int(os.getenv('QUEUE_MAX_ATTEMPTS', '3'))
+        except ValueError:
+            max_attempts = 3
+        return cls(path or os.getenv('QUEUE_DB', 'crawl_queue.db'), lease_seconds, max_attempts)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, func):
+        """在 BEGIN IMMEDIATE 交易中執行 func(conn)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, url: str, payload: Dict[str, Any]) -> bool:
+        """加入一個項目，返回是否有加入
+
+        同一 URL 待處理、租用中或已完成但結果尚未套用時略過；已失敗或結果已套用時重置為 pending 重新爬取
+        """
+        now = time.time()
+        def insert(conn):
+            cursor = conn.execute(
+                "INSERT INTO items (url, payload, enqueued_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET payload = excluded.payload, status = 'pending', attempts = 0, "
+                "lease_owner = NULL, lease_token = NULL, lease_expires = NULL, result = NULL, error = NULL, "
+                "applied = 0, enqueued_at = excluded.enqueued_at, updated_at = excluded.updated_at "
+                "WHERE items.status = 'failed' OR (items.status = 'done' AND items.applied = 1)",
+                (url, json.dumps(payload, ensure_ascii=False), now, now))
+            return cursor.rowcount == 1
+        return self._transaction(insert)
+
+    def lease(self, worker_id: str, limit: int = 1) -> List[WorkItem]:
+        """租用最多 limit 個項目（待處理或租約已逾時），依加入順序"""
+        now = time.time()
+        def take(conn):
+            self._expire(conn, now)
+            rows = conn.execute(
+                "SELECT id, url, payload, attempts FROM items "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT ?", (now, limit)).fetchall()
+            items = []
+            for row in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE items SET status = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                    "lease_token = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, token, now + self.lease_seconds, now, row['id']))
+                items.append(WorkItem(row['id'], row['url'], json.loads(row['payload']), token,
+                                      row['attempts'] + 1))
+            return items
+        return self._transaction(take)
+
+    def _expire(self, conn, now: float) -> None:
+        """租約逾時且已用盡重試次數的項目標記為失敗"""
+        conn.execute(
+            "UPDATE items SET status = 'failed', error = COALESCE(error, '租約逾時'), lease_token = NULL, "
+            "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts))
+
+    def extend(self, item: WorkItem) -> bool:
+        """延長租約（抓取重試耗時較長時呼叫），租約已被其他 worker 取走時返回 False"""
+        now = time.time()
+        def touch(conn):
+            cursor = conn.execute(
+                "UPDATE items SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, item.id, item.token))
+            return cursor.rowcount == 1
+        return self._transaction(touch)
+
+    def complete(self, item: WorkItem, result: Dict[str, Any]) -> bool:
+        """回報結果；只有持有目前租約的 worker 能完成項目，返回是否被接受"""
+        now = time.time()
+        def finish(conn):
+            cursor = conn.execute(
+                "UPDATE items SET status = 'done', result = ?, error = NULL, lease_token = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                (json.dumps(result, ensure_ascii=False), now, item.id, item.token))
+            return cursor.rowcount == 1
+        return self._transaction(finish)
+
+    def fail(self, item: WorkItem, error: str) -> bool:
+        """回報失敗：未達重試上限時回到 pending，否則標記為 failed；返回是否被接受"""
+        now = time.time()
+        def release(conn):
+            status = 'failed' if item.attempts >= self.max_attempts else 'pending'
+            cursor = conn.execute(
+                "UPDATE items SET status = ?, error = ?, lease_token = NULL, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ? AND lease_token = ? AND status = 'leased'",
+                (status, error, now, item.id, item.token))
+            return cursor.rowcount == 1
+        return self._transaction(release)
+
+    def unapplied_results(self) -> List[Dict[str, Any]]:
+        """已完成但 coordinator 尚未套用的結果（依加入順序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, payload, result FROM items WHERE status = 'done' AND applied = 0 ORDER BY id"
+            ).fetchall()
+        return [{'id': row['id'], 'url': row['url'], 'payload': json.loads(row['payload']),
+                 'result': json.loads(row['result'])} for row in rows]
+
+    def mark_applied(self, item_id: int) -> bool:
+        """標記結果已套用；已標記過時返回 False（避免重複寫檔與標記）"""
+        def apply(conn):
+            cursor = conn.execute("UPDATE items SET applied = 1 WHERE id = ? AND applied = 0", (item_id,))
+            return cursor.rowcount == 1
+        return self._transaction(apply)
+
+    def failed_items(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, attempts, error FROM items WHERE status = 'failed' ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """各狀態的項目數（applied 另計）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM items GROUP BY status").fetchall()
+            applied = self._conn.execute("SELECT COUNT(*) FROM items WHERE applied = 1").fetchone()[0]
+        stats = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        stats.update({row['status']: row['n'] for row in rows})
+        stats['applied'] = applied
+        return stats
+
+    def is_drained(self) -> bool:
+        """沒有待處理或租用中的項目"""
+        stats = self.stats()
+        return stats['pending'] == 0 and stats['leased'] == 0